@@ -1,4 +1,14 @@
+import importlib
+
 from .models import *
-from .views import *
 from .controllers import *
-from .main import *
\ No newline at end of file
+
+
+def __getattr__(name):
+    # The views and the app factory bring in the web extensions, so they are
+    # only imported when something asks for one of their names
+    for module_name in ('App.views', 'App.main'):
+        module = importlib.import_module(module_name)
+        if hasattr(module, name):
+            return getattr(module, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,5 +1,12 @@
 import os
 
+from App.database import REPLICA_BIND, postgres_engine_options, site_bind
+
+# gunicorn_config.py reads the same variables, so the pool is sized for the
+# workers and greenlets gunicorn actually starts
+WEB_CONCURRENCY = 4
+WORKER_CONNECTIONS = 1000
+
 def load_config(app, overrides):
     if os.path.exists(os.path.join('./App', 'custom_config.py')):
         app.config.from_object('App.custom_config')
@@ -16,4 +23,38 @@ def load_config(app, overrides):
     app.config["JWT_COOKIE_CSRF_PROTECT"] = False
     app.config['FLASK_ADMIN_SWATCH'] = 'darkly'
     for key in overrides:
-        app.config[key] = overrides[key]
\ No newline at end of file
+        app.config[key] = overrides[key]
+    configure_engine(app)
+
+def _database_uri(uri):
+    # Render and Heroku hand out postgres:// URLs, which SQLAlchemy does not
+    # accept; requirements.txt ships psycopg2, so name it as the driver
+    for scheme in ('postgres://', 'postgresql://'):
+        if uri.startswith(scheme):
+            return 'postgresql+psycopg2://' + uri[len(scheme):]
+    return uri
+
+def configure_engine(app):
+    uri = app.config['SQLALCHEMY_DATABASE_URI'] = _database_uri(app.config.get('SQLALCHEMY_DATABASE_URI', ''))
+    options = None
+    if uri.startswith('postgresql') and 'SQLALCHEMY_ENGINE_OPTIONS' not in app.config:
+        options = app.config['SQLALCHEMY_ENGINE_OPTIONS'] = postgres_engine_options(
+            app.config,
+            int(os.environ.get('WEB_CONCURRENCY', WEB_CONCURRENCY)),
+            int(os.environ.get('WORKER_CONNECTIONS', WORKER_CONNECTIONS))
+        )
+    binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+    # Read-only controllers query REPLICA_DATABASE_URI when it is set
+    replica = app.config.get('REPLICA_DATABASE_URI')
+    if replica:
+        binds[REPLICA_BIND] = _bind(replica, options)
+    # Large sites keep their rows in a database of their own: {site id: uri}
+    for site_id, site_uri in (app.config.get('SITE_DATABASE_URIS') or {}).items():
+        binds[site_bind(site_id)] = _bind(site_uri, options)
+    if binds:
+        app.config['SQLALCHEMY_BINDS'] = binds
+
+def _bind(uri, options):
+    # Another Postgres database gets the same pool settings as the primary
+    uri = _database_uri(uri)
+    return dict(options, url=uri) if options and uri.startswith('postgresql') else uri
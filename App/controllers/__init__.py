@@ -1,3 +1,22 @@
 from .user import *
+from .site import *
 from .auth import *
 from .initialize import *
+from .shift import *
+from .shift_import import *
+from .roster import *
+from .pagination import *
+from .report import *
+from .stats import *
+from .timesheet import *
+from .explain import *
+from .autogenerate import *
+from .leave import *
+from .availability import *
+from .swap import *
+from .time_log import *
+from .idempotency import *
+from .roster_cache import *
+from .conditional import *
+from .events import *
+from .jobs import *
@@ -1,17 +1,164 @@
+import time
+from collections import OrderedDict, namedtuple
+from threading import Lock
+from flask import g, current_app, has_request_context
 from flask_jwt_extended import create_access_token, jwt_required, JWTManager, get_jwt_identity, verify_jwt_in_request
+from sqlalchemy import event
+from werkzeug.security import check_password_hash
 
-from App.models import User
-from App.database import db
+from App.models import User, DEFAULT_SITE_ID, password_hash_method
+from App.database import db, set_site
+from .site import get_site_by_name
 
-def login(username, password):
+# What authentication needs to know about a user; cheap to cache and share.
+# current_user in views and templates is one of these, not a User: load the
+# User (get_user(current_user.id)) for anything beyond these fields.
+Identity = namedtuple('Identity', ['id', 'username', 'role', 'site_id'])
+
+
+class IdentityCache:
+  """Process-local LRU of (site id, user id) -> Identity whose entries expire after a TTL.
+
+  Sites with a database of their own number their users independently, so
+  the user id alone is not enough.
+  """
+
+  def __init__(self, maxsize=1024):
+    self.maxsize = maxsize
+    self._entries = OrderedDict()
+    self._lock = Lock()
+
+  def get(self, key, ttl):
+    with self._lock:
+      entry = self._entries.get(key)
+      if entry is None:
+        return None
+      identity, stored_at = entry
+      if time.monotonic() - stored_at > ttl:
+        del self._entries[key]
+        return None
+      self._entries.move_to_end(key)
+      return identity
+
+  def set(self, identity):
+    key = (identity.site_id, identity.id)
+    with self._lock:
+      self._entries[key] = (identity, time.monotonic())
+      self._entries.move_to_end(key)
+      while len(self._entries) > self.maxsize:
+        self._entries.popitem(last=False)
+
+  def invalidate(self, key):
+    with self._lock:
+      self._entries.pop(key, None)
+
+  def clear(self):
+    with self._lock:
+      self._entries.clear()
+
+
+identity_cache = IdentityCache()
+
+
+_hash_pool = None
+
+def _offload(func, *args):
+  """Run CPU-bound password hashing on a native thread when serving under gevent.
+
+  Hashing holds the worker's only OS thread for its whole duration, which
+  would stall every other greenlet; hashlib releases the GIL, so a native
+  thread lets them keep running. Outside gevent this just calls func.
+  """
+  global _hash_pool
+  try:
+    from gevent import monkey
+  except ImportError:
+    return func(*args)
+  if not monkey.is_module_patched('threading'):
+    return func(*args)
+  if _hash_pool is None:
+    from gevent.threadpool import ThreadPool
+    _hash_pool = ThreadPool(current_app.config.get('PASSWORD_HASH_THREADS', 4))
+  return _hash_pool.apply(func, args)
+
+
+def verify_password(user, password):
+  """Check a user's password, upgrading the stored hash when the configured method or cost has changed"""
+  if not _offload(check_password_hash, user.password, password):
+    return False
+  if user.needs_rehash():
+    user.password = _offload(User.hash_password, password, password_hash_method())
+    db.session.commit()
+  return True
+
+
+def login(username, password, site=None):
+  """A token for the user, or None; users of a site with a database of its own must name the site"""
+  if site is not None:
+    found = get_site_by_name(site)
+    if not found:
+      return None
+    set_site(found.id)
   result = db.session.execute(db.select(User).filter_by(username=username))
   user = result.scalar_one_or_none()
-  if user and user.check_password(password):
-    # Store ONLY the user id as a string in JWT 'sub'
-    return create_access_token(identity=str(user.id))
+  if user and verify_password(user, password):
+    # Store ONLY the user id as a string in JWT 'sub'; the site rides alongside
+    return create_access_token(identity=str(user.id), additional_claims={'site': user.site_id})
   return None
 
 
+def load_identity(user_id, site_id=DEFAULT_SITE_ID):
+  """Identity for a user of a site, looked up at most once per request.
+
+  The session is scoped to the site first, so the lookup goes to the
+  site's own database when it has one.
+
+  With IDENTITY_CACHE_TTL set (seconds), identities are also kept in a
+  process-local LRU so repeat requests skip the database entirely.
+  """
+  set_site(site_id)
+  key = (site_id, user_id)
+  loaded = g.setdefault('_identities', {}) if has_request_context() else {}
+  if key in loaded:
+    return loaded[key]
+  ttl = current_app.config.get('IDENTITY_CACHE_TTL', 0)
+  identity = identity_cache.get(key, ttl) if ttl else None
+  if identity is None:
+    row = db.session.execute(db.select(User.id, User.username, User.role, User.site_id).filter_by(id=user_id)).first()
+    identity = Identity(*row) if row else None
+    if identity and ttl:
+      identity_cache.set(identity)
+  loaded[key] = identity
+  return identity
+
+
+def get_request_identity():
+  """Identity of the user making this request, or None.
+
+  The JWT user loader records the identity when @jwt_required verifies the
+  token, so the token is decoded and the user loaded once however many
+  callers ask.
+  """
+  if '_request_identity' not in g:
+    try:
+      verify_jwt_in_request(optional=True)
+    except Exception as e:
+      # A bad or expired token only means nobody is logged in on pages that allow that
+      current_app.logger.debug("Ignoring request token: %s", e)
+    g.setdefault('_request_identity', None)
+  return g._request_identity
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _invalidate_identity(mapper, connection, user):
+  # Renames, role changes and deletions must not be served from a cache
+  identity_cache.invalidate((user.site_id, user.id))
+  if has_request_context():
+    g.pop('_identities', None)
+    g.pop('_request_identity', None)
+
+
 def setup_jwt(app):
   jwt = JWTManager(app)
 
@@ -30,23 +177,23 @@ def setup_jwt(app):
       user_id = int(identity)
     except (TypeError, ValueError):
       return None
-    return db.session.get(User, user_id)
+    # Tokens from before sites existed belong to the default site
+    g._request_identity = load_identity(user_id, jwt_data.get('site', DEFAULT_SITE_ID))
+    return g._request_identity
 
   return jwt
 
 
 # Context processor to make 'is_authenticated' available to all templates
 def add_auth_context(app):
+  # create_app pushes an app context that can outlive a request, so g is
+  # not guaranteed to start empty
+  @app.before_request
+  def reset_request_identity():
+    g.pop('_request_identity', None)
+    g.pop('_identities', None)
+
   @app.context_processor
   def inject_user():
-      try:
-          verify_jwt_in_request()
-          identity = get_jwt_identity()
-          user_id = int(identity) if identity is not None else None
-          current_user = db.session.get(User, user_id) if user_id is not None else None
-          is_authenticated = current_user is not None
-      except Exception as e:
-          print(e)
-          is_authenticated = False
-          current_user = None
-      return dict(is_authenticated=is_authenticated, current_user=current_user)
\ No newline at end of file
+      current_user = get_request_identity()
+      return dict(is_authenticated=current_user is not None, current_user=current_user)
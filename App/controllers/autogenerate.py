@@ -0,0 +1,257 @@
+from bisect import bisect_left, insort
+from datetime import datetime, date, timedelta
+
+from App.models import User, Shift, LeaveRequest
+from App.database import db
+from .shift_import import insert_shifts
+
+MAX_WEEKLY_HOURS = 40
+MIN_REST_HOURS = 11
+WEEKDAYS = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')
+
+def parse_coverage_requirements(items):
+    """Validate coverage requirements, returning (weekdays, start, end, role, count) tuples.
+
+    Each requirement is a dict with start_time and end_time (HH:MM), and
+    optionally role (default staff), count (default 1) and days, a list of
+    weekday names (default every day).
+    """
+    requirements = []
+    for number, item in enumerate(items, start=1):
+        if not isinstance(item, dict):
+            raise ValueError(f"Requirement {number}: expected an object with start_time and end_time")
+        try:
+            start_time = datetime.strptime(str(item['start_time']), '%H:%M').time()
+            end_time = datetime.strptime(str(item['end_time']), '%H:%M').time()
+            count = int(item.get('count', 1))
+            days = [str(day).lower()[:3] for day in item.get('days') or WEEKDAYS]
+        except KeyError as e:
+            raise ValueError(f"Requirement {number}: missing field {e}")
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"Requirement {number}: {e}")
+        if start_time >= end_time:
+            raise ValueError(f"Requirement {number}: start time must be before end time")
+        if count < 1:
+            raise ValueError(f"Requirement {number}: count must be at least 1")
+        unknown = [day for day in days if day not in WEEKDAYS]
+        if unknown:
+            raise ValueError(f"Requirement {number}: unknown day {unknown[0]}")
+        role = item.get('role') or 'staff'
+        if not isinstance(role, str):
+            raise ValueError(f"Requirement {number}: role must be a string")
+        weekdays = {WEEKDAYS.index(day) for day in days}
+        requirements.append((weekdays, start_time, end_time, role, count))
+    return requirements
+
+
+class _Roster:
+    """Everything the solver knows about each candidate's week, with O(log n) feasibility checks"""
+
+    def __init__(self, week_start, week_end, max_seconds, min_rest):
+        self.week_start = week_start
+        self.week_end = week_end
+        self.max_seconds = max_seconds
+        self.min_rest = min_rest
+        self.starts = {}     # user_id -> sorted shift starts (stored and generated)
+        self.ends = {}       # user_id -> ends, parallel to starts
+        self.seconds = {}    # user_id -> seconds rostered this week
+        self.leave = {}      # user_id -> dates on approved leave
+        self.assigned = {}   # user_id -> generated (start, end) in this run
+
+    def add_user(self, user_id):
+        self.starts[user_id] = []
+        self.ends[user_id] = []
+        self.seconds[user_id] = 0
+        self.leave[user_id] = set()
+        self.assigned[user_id] = []
+
+    def add(self, user_id, start_time, end_time, generated=True):
+        starts = self.starts[user_id]
+        index = bisect_left(starts, start_time)
+        starts.insert(index, start_time)
+        self.ends[user_id].insert(index, end_time)
+        if self.week_start <= start_time < self.week_end:
+            self.seconds[user_id] += (end_time - start_time).total_seconds()
+        if generated:
+            insort(self.assigned[user_id], (start_time, end_time))
+
+    def remove(self, user_id, start_time, end_time):
+        starts = self.starts[user_id]
+        index = bisect_left(starts, start_time)
+        del starts[index]
+        del self.ends[user_id][index]
+        self.seconds[user_id] -= (end_time - start_time).total_seconds()
+        self.assigned[user_id].remove((start_time, end_time))
+
+    def fits(self, user_id, start_time, end_time):
+        """Whether the user can take the shift without breaking leave, overlap, rest or hours"""
+        if start_time.date() in self.leave[user_id]:
+            return False
+        if self.seconds[user_id] + (end_time - start_time).total_seconds() > self.max_seconds:
+            return False
+        starts = self.starts[user_id]
+        index = bisect_left(starts, start_time)
+        # Shifts never overlap, so only the neighbours either side can be too close
+        if index > 0 and self.ends[user_id][index - 1] + self.min_rest > start_time:
+            return False
+        if index < len(starts) and end_time + self.min_rest > starts[index]:
+            return False
+        return True
+
+
+def _load_roster(roles, week_start, max_hours, min_rest_hours):
+    window_start = datetime.combine(week_start, datetime.min.time())
+    window_end = window_start + timedelta(days=7)
+    roster = _Roster(window_start, window_end, max_hours * 3600, timedelta(hours=min_rest_hours))
+    users = db.session.execute(db.select(User.id, User.role).filter(User.role.in_(roles)).order_by(User.id)).all()
+    for user_id, _ in users:
+        roster.add_user(user_id)
+    user_ids = [user_id for user_id, _ in users]
+
+    # Shifts close enough to the week to affect rest, and leave touching it
+    rows = db.session.execute(
+        db.select(Shift.user_id, Shift.start_time, Shift.end_time)
+        .filter(Shift.user_id.in_(user_ids),
+                Shift.start_time < window_end + roster.min_rest,
+                Shift.end_time > window_start - roster.min_rest)
+    )
+    for user_id, start_time, end_time in rows:
+        roster.add(user_id, start_time, end_time, generated=False)
+    rows = db.session.execute(
+        db.select(LeaveRequest.requester_id, LeaveRequest.start_date, LeaveRequest.end_date)
+        .filter(LeaveRequest.requester_id.in_(user_ids), LeaveRequest.status == 'approved',
+                LeaveRequest.start_date <= week_start + timedelta(days=6), LeaveRequest.end_date >= week_start)
+    )
+    for user_id, start_date, end_date in rows:
+        day = start_date
+        while day <= end_date:
+            roster.leave[user_id].add(day)
+            day += timedelta(days=1)
+
+    by_role = {}
+    for user_id, role in users:
+        by_role.setdefault(role, []).append(user_id)
+    return roster, by_role
+
+
+def _expand_slots(requirements, week_start):
+    """One slot per requirement per matching day, in chronological order"""
+    slots = []
+    for offset in range(7):
+        day = week_start + timedelta(days=offset)
+        for weekdays, start_time, end_time, role, count in requirements:
+            if day.weekday() in weekdays:
+                slots.append([datetime.combine(day, start_time), datetime.combine(day, end_time), role, count, []])
+    slots.sort(key=lambda slot: (slot[0], slot[1]))
+    return slots
+
+
+def _greedy_fill(roster, by_role, slots):
+    """Seed: each slot takes the least-loaded staff of its role who can still work it"""
+    for slot in slots:
+        start_time, end_time, role, count, filled = slot
+        candidates = sorted(by_role.get(role, []), key=roster.seconds.__getitem__)
+        for user_id in candidates:
+            if len(filled) == count:
+                break
+            if roster.fits(user_id, start_time, end_time):
+                roster.add(user_id, start_time, end_time)
+                filled.append(user_id)
+
+
+def _repair(roster, by_role, slots, max_passes):
+    """Local search: fill a gap by handing one of a candidate's shifts to someone else.
+
+    For an unfilled slot, a staff member blocked by rest, overlap or hours
+    may take it if one of their generated shifts moves to a colleague who
+    is free for it. Repeats until a pass makes no progress.
+    """
+    owners = {}
+    for slot in slots:
+        for user_id in slot[4]:
+            owners[(user_id, slot[0], slot[1])] = slot
+    for _ in range(max_passes):
+        improved = False
+        free_for = {}  # (start, end, role) -> users who can take it as things stand
+        for slot in slots:
+            start_time, end_time, role, count, filled = slot
+            staff = by_role.get(role, [])
+            for user_id in staff:
+                if len(filled) == count:
+                    break
+                if user_id in filled:
+                    continue
+                for moved_start, moved_end in list(roster.assigned[user_id]):
+                    roster.remove(user_id, moved_start, moved_end)
+                    if roster.fits(user_id, start_time, end_time):
+                        moved_slot = owners[(user_id, moved_start, moved_end)]
+                        key = (moved_start, moved_end, moved_slot[2])
+                        if key not in free_for:
+                            free_for[key] = [other for other in by_role.get(moved_slot[2], [])
+                                             if roster.fits(other, moved_start, moved_end)]
+                        taker = next((other for other in free_for[key]
+                                      if other != user_id and other not in moved_slot[4]
+                                      and roster.fits(other, moved_start, moved_end)), None)
+                        if taker is not None:
+                            roster.add(taker, moved_start, moved_end)
+                            moved_slot[4][moved_slot[4].index(user_id)] = taker
+                            del owners[(user_id, moved_start, moved_end)]
+                            owners[(taker, moved_start, moved_end)] = moved_slot
+                            roster.add(user_id, start_time, end_time)
+                            filled.append(user_id)
+                            owners[(user_id, start_time, end_time)] = slot
+                            free_for.clear()
+                            improved = True
+                            break
+                    roster.add(user_id, moved_start, moved_end)
+        if not improved:
+            break
+
+
+def check_roster_request(week_start, requirements):
+    """Parsed requirements for a week that can still be scheduled, or ValueError; cheap enough to run before queueing"""
+    if week_start < date.today():
+        raise ValueError("Cannot schedule shifts in the past")
+    return parse_coverage_requirements(requirements)
+
+
+def autogenerate_roster(week_start, requirements, max_hours=MAX_WEEKLY_HOURS, min_rest_hours=MIN_REST_HOURS,
+                        dry_run=False, max_passes=3, progress=None):
+    """Build a week of shifts that meets the coverage requirements as far as possible.
+
+    Approved leave, existing shifts (no overlaps), max_hours per week and
+    min_rest_hours between shifts are hard constraints. A greedy pass seeds
+    the roster and a local search repairs the gaps it left. Returns a dict
+    with the generated shifts, how many were created, and the shortfall per
+    slot that could not be filled.
+    """
+    requirements = check_roster_request(week_start, requirements)
+    roles = {role for _, _, _, role, _ in requirements}
+    roster, by_role = _load_roster(roles, week_start, max_hours, min_rest_hours)
+    slots = _expand_slots(requirements, week_start)
+    _greedy_fill(roster, by_role, slots)
+    _repair(roster, by_role, slots, max_passes)
+
+    mappings = []
+    shortfall = []
+    for start_time, end_time, role, count, filled in slots:
+        for user_id in filled:
+            mappings.append({'user_id': user_id, 'start_time': start_time, 'end_time': end_time, 'status': 'scheduled'})
+        if len(filled) < count:
+            shortfall.append({
+                'date': start_time.date().isoformat(),
+                'start_time': start_time.strftime('%H:%M'),
+                'end_time': end_time.strftime('%H:%M'),
+                'role': role,
+                'required': count,
+                'filled': len(filled),
+                'missing': count - len(filled)
+            })
+    if not dry_run:
+        insert_shifts(mappings, progress=progress)
+    return {
+        'required': sum(slot[3] for slot in slots),
+        'created': 0 if dry_run else len(mappings),
+        'shifts': mappings,
+        'shortfall': shortfall
+    }
@@ -0,0 +1,125 @@
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+from threading import Lock
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from App.models import User, Shift, LeaveRequest, UserShiftStats
+from App.database import db, site_scope
+from App.controllers.roster_cache import get_roster_cache
+
+SLOT = timedelta(minutes=15)
+SLOTS_PER_WEEK = 7 * 24 * 4
+SWAP_SUGGESTION_LIMIT = 10
+AVAILABILITY_CACHE_TTL = 60
+
+# One bit per 15-minute slot of the week; bit 0 is Monday 00:00
+WeekAvailability = namedtuple('WeekAvailability', ['users', 'shifts', 'leave'])
+
+_weeks = {}
+_weeks_lock = Lock()
+
+
+def _slot_mask(week_start, start_time, end_time):
+    """Bits for every slot the period touches, rounded outwards and clipped to the week"""
+    first = max(int((start_time - week_start) / SLOT), 0)
+    last = min(-int(-(end_time - week_start) // SLOT), SLOTS_PER_WEEK)
+    if last <= first:
+        return 0
+    return ((1 << (last - first)) - 1) << first
+
+
+def _popcount(bits):
+    return bin(bits).count('1')
+
+
+def build_week_availability(week_start):
+    """Busy bitmaps of every user of the session's site for the week starting Monday week_start, in three queries"""
+    window_start = datetime.combine(week_start, datetime.min.time())
+    window_end = window_start + timedelta(days=7)
+    users = {user_id: (username, role) for user_id, username, role in
+             db.session.execute(db.select(User.id, User.username, User.role))}
+    shifts = dict.fromkeys(users, 0)
+    leave = dict.fromkeys(users, 0)
+    rows = db.session.execute(
+        db.select(Shift.user_id, Shift.start_time, Shift.end_time)
+        .filter(Shift.start_time >= window_start - timedelta(days=1), Shift.start_time < window_end, Shift.end_time > window_start)
+    )
+    for user_id, start_time, end_time in rows:
+        shifts[user_id] = shifts.get(user_id, 0) | _slot_mask(window_start, start_time, end_time)
+    rows = db.session.execute(
+        db.select(LeaveRequest.requester_id, LeaveRequest.start_date, LeaveRequest.end_date)
+        .filter(LeaveRequest.status == 'approved', LeaveRequest.start_date < window_end.date(), LeaveRequest.end_date >= week_start)
+    )
+    for user_id, start_date, end_date in rows:
+        leave[user_id] = leave.get(user_id, 0) | _slot_mask(
+            window_start, datetime.combine(start_date, datetime.min.time()), datetime.combine(end_date + timedelta(days=1), datetime.min.time())
+        )
+    return WeekAvailability(users, shifts, leave)
+
+
+def get_week_availability(week_start, site_id):
+    """Availability of a site's staff for a week, kept for up to AVAILABILITY_CACHE_TTL seconds (0 turns it off).
+
+    A cached week is tied to the roster cache's generation for it, so it is
+    rebuilt once any worker sharing that cache changes the week's shifts or
+    leave. The TTL bounds what the generations do not cover, such as new
+    staff added by another worker.
+    """
+    ttl = current_app.config.get('AVAILABILITY_CACHE_TTL', AVAILABILITY_CACHE_TTL)
+    if not ttl:
+        with site_scope(site_id):
+            return build_week_availability(week_start)
+    key = (site_id, week_start)
+    roster_cache = get_roster_cache()
+    # Taken before the rows are read, like a roster snapshot's
+    token = roster_cache.token(key) if roster_cache else None
+    with _weeks_lock:
+        entry = _weeks.get(key)
+    if entry and entry[2] == token and time.monotonic() - entry[1] <= ttl:
+        return entry[0]
+    with site_scope(site_id):
+        availability = build_week_availability(week_start)
+    with _weeks_lock:
+        _weeks[key] = (availability, time.monotonic(), token)
+    return availability
+
+
+def clear_availability_cache():
+    with _weeks_lock:
+        _weeks.clear()
+
+
+@event.listens_for(Session, 'after_flush')
+def _invalidate_availability(session, flush_context):
+    if _weeks and any(isinstance(obj, (User, Shift, LeaveRequest)) for obj in (*session.new, *session.dirty, *session.deleted)):
+        clear_availability_cache()
+
+
+def suggest_swap_candidates(shift, limit=SWAP_SUGGESTION_LIMIT):
+    """Colleagues at the shift's site with the owner's role who are free for the whole shift, least worked first.
+
+    Each candidate costs a couple of bitwise operations on the week's
+    precomputed bitmaps; hours already rostered that week come from the
+    number of busy shift slots.
+    """
+    week_start = UserShiftStats.week_of(shift.start_time)
+    availability = get_week_availability(week_start, shift.site_id)
+    mask = _slot_mask(datetime.combine(week_start, datetime.min.time()), shift.start_time, shift.end_time)
+    role = availability.users[shift.user_id][1]
+    candidates = []
+    for user_id, (username, user_role) in availability.users.items():
+        if user_id == shift.user_id or user_role != role:
+            continue
+        if (availability.shifts[user_id] | availability.leave[user_id]) & mask:
+            continue
+        candidates.append({
+            'user_id': user_id,
+            'username': username,
+            'role': user_role,
+            'week_hours': _popcount(availability.shifts[user_id]) * SLOT.total_seconds() / 3600
+        })
+    candidates.sort(key=lambda candidate: (candidate['week_hours'], candidate['username']))
+    return candidates[:limit]
@@ -0,0 +1,59 @@
+from functools import wraps
+from flask import Response, make_response, request
+
+from App.models import TableVersion
+from App.database import db, current_site_id
+
+
+def get_table_versions(*models):
+    """(weak ETag, Last-Modified) for the current contents of these models' tables, from one small query
+
+    Read from the primary: a lagging replica would still report the old
+    versions and answer 304 to a client that has already seen the change.
+    """
+    names = [model.__tablename__ for model in models]
+    stored = dict((name, (version, changed_at)) for name, version, changed_at in db.session.execute(
+        db.select(TableVersion.name, TableVersion.version, TableVersion.changed_at).where(TableVersion.name.in_(names))
+    ))
+    # A table never written since the counters were added has no row yet
+    etag = '-'.join(str(stored.get(name, (0, None))[0]) for name in names)
+    # The counters are shared by every site on the database, the responses are not
+    site_id = current_site_id()
+    if site_id is not None:
+        etag = f'{site_id}:{etag}'
+    changed = [changed_at for _, changed_at in stored.values()]
+    return etag, max(changed) if changed else None
+
+
+def _not_modified(etag, last_modified):
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    # HTTP dates have whole seconds only
+    since = request.if_modified_since
+    return bool(since and last_modified and last_modified.replace(microsecond=0) <= since.replace(tzinfo=None))
+
+
+def conditional_get(*models):
+    """Answer GETs whose If-None-Match/If-Modified-Since still hold with a 304, before the view loads anything.
+
+    The view's response can only change when one of models' tables does;
+    put this below any login or role check so a 304 is never a way round it.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            etag, last_modified = get_table_versions(*models)
+            if _not_modified(etag, last_modified):
+                response = Response(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag, weak=True)
+            if last_modified:
+                response.last_modified = last_modified
+            # Polling clients keep the copy but check it every time
+            response.cache_control.no_cache = True
+            return response
+        return wrapper
+    return decorator
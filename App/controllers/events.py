@@ -0,0 +1,306 @@
+import json
+import os
+import queue
+import select
+import threading
+import time
+from datetime import timedelta
+from flask import current_app
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+from App.models import ChangeEvent, TableVersion, utcnow
+from App.database import db, current_site_id
+
+# Seconds between keepalive comments on an idle stream, so proxies keep it open
+EVENTS_HEARTBEAT = 15
+# How often, in seconds, a worker without LISTEN/NOTIFY checks the signal file
+EVENTS_POLL_INTERVAL = 0.5
+# How long events are kept for clients to resume from, in seconds
+EVENTS_RETENTION = 24 * 3600
+EVENTS_PRUNE_INTERVAL = 300
+# Most missed events replayed to a reconnecting client; one further behind
+# is told to reload instead
+EVENTS_BACKLOG = 500
+# Events waiting for one slow client before it is cut off to resume later
+EVENTS_QUEUE_SIZE = 1000
+# Milliseconds EventSource clients wait before reconnecting
+EVENTS_RETRY_MS = 3000
+EVENTS_CHANNEL = 'roster_events'
+
+
+def publish_event(kind, **payload):
+    """Send a change event to the session's site's /api/events streams once its transaction commits; dropped on rollback"""
+    db.session.info.setdefault('change_events', []).append((kind, payload, current_site_id()))
+    TableVersion.changed(db.session, ChangeEvent)
+
+
+def _signal_path(app):
+    return app.config.get('EVENTS_SIGNAL_PATH') or os.path.join(app.instance_path, 'events.signal')
+
+
+def _signal_mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+# Runs after the TableVersion hook (App.models is imported first), which has
+# locked the change_event counter row by now, so on Postgres event ids are
+# handed out in commit order and a client resuming from an id misses nothing
+@event.listens_for(Session, 'before_commit')
+def _write_change_events(session):
+    events = session.info.pop('change_events', None)
+    if not events:
+        return
+    # The primary's, even while the session is scoped to a site with a database of its own
+    connection = session.connection(bind_arguments={'mapper': ChangeEvent})
+    now = utcnow()
+    if connection is not session.connection():
+        # The hook bumped the site database's counter; lock the primary's too
+        TableVersion.bump(connection, [ChangeEvent.__tablename__], now)
+    connection.execute(db.insert(ChangeEvent.__table__), [
+        dict(kind=kind, payload=ChangeEvent.dumps(payload), site_id=site_id, created_at=now) for kind, payload, site_id in events
+    ])
+    if connection.dialect.name == 'postgresql':
+        # Delivered to every worker's listener when, and only if, this commits
+        connection.execute(text(f"NOTIFY {EVENTS_CHANNEL}"))
+    session.info['change_events_written'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _signal_change_events(session):
+    if not session.info.pop('change_events_written', None):
+        return
+    app = current_app._get_current_object()
+    broker = app.extensions.get('event_broker')
+    if broker:
+        broker.wake()
+    if session.get_bind().dialect.name != 'postgresql':
+        # Other workers watch this file's mtime instead of a NOTIFY
+        path = _signal_path(app)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'a'):
+            os.utime(path)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_change_events(session):
+    session.info.pop('change_events', None)
+    session.info.pop('change_events_written', None)
+
+
+class EventBroker:
+    """Fans committed change events out to this worker's open streams.
+
+    One listener per worker reads new events from the database when woken
+    (by NOTIFY on Postgres, by the signal file's mtime otherwise, or by a
+    commit in this worker) and queues them for every subscriber, so a
+    thousand open streams cost one query per change rather than a thousand.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.last_id = 0
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def subscribe(self, site_id=None, user_id=None):
+        """A queue of the events of site_id, or of every site with None; with user_id, only that user's leave events"""
+        subscription = queue.Queue(self.app.config.get('EVENTS_QUEUE_SIZE', EVENTS_QUEUE_SIZE))
+        subscription.dropped = False
+        subscription.site_id = site_id
+        subscription.user_id = user_id
+        with self._lock:
+            if self._thread is None:
+                self.last_id = db.session.scalar(db.select(db.func.max(ChangeEvent.id))) or 0
+                self._thread = threading.Thread(target=self._run, name='event-listener', daemon=True)
+                self._thread.start()
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, events):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        owners = _leave_owners(events)
+        for subscription in subscribers:
+            try:
+                for change_event in events:
+                    if _visible(change_event, subscription.site_id, subscription.user_id, owners):
+                        subscription.put_nowait(change_event)
+            except queue.Full:
+                # Too far behind; its stream ends and the client resumes from its last id
+                subscription.dropped = True
+                self.unsubscribe(subscription)
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(5)
+
+    def _fetch(self):
+        try:
+            while True:
+                events = db.session.execute(
+                    db.select(ChangeEvent.id, ChangeEvent.kind, ChangeEvent.payload, ChangeEvent.site_id)
+                    .where(ChangeEvent.id > self.last_id).order_by(ChangeEvent.id).limit(EVENTS_BACKLOG)
+                ).all()
+                if not events:
+                    return
+                self.last_id = events[-1][0]
+                self.publish(events)
+        finally:
+            # Hand the connection back between wake-ups
+            db.session.remove()
+
+    def _prune(self):
+        cutoff = utcnow() - timedelta(seconds=self.app.config.get('EVENTS_RETENTION', EVENTS_RETENTION))
+        try:
+            db.session.execute(db.delete(ChangeEvent).where(ChangeEvent.created_at < cutoff))
+            db.session.commit()
+        finally:
+            db.session.remove()
+
+    def _run(self):
+        with self.app.app_context():
+            pruned = 0
+            while not self._stopped.is_set():
+                try:
+                    waits = self._notifications() if db.engine.dialect.name == 'postgresql' else self._signal_changes()
+                    for woken in waits:
+                        if self._stopped.is_set():
+                            return
+                        if woken:
+                            self._fetch()
+                        if time.monotonic() - pruned > EVENTS_PRUNE_INTERVAL:
+                            self._prune()
+                            pruned = time.monotonic()
+                except Exception:
+                    # A dropped connection or a locked database; start over shortly
+                    self.app.logger.exception("Event listener failed, restarting")
+                    self._stopped.wait(1)
+
+    def _signal_changes(self):
+        path = _signal_path(self.app)
+        seen = _signal_mtime(path)
+        yield True
+        while True:
+            woken = self._wake.wait(self.app.config.get('EVENTS_POLL_INTERVAL', EVENTS_POLL_INTERVAL))
+            self._wake.clear()
+            mtime = _signal_mtime(path)
+            yield woken or mtime != seen
+            seen = mtime
+
+    def _notifications(self):
+        # A connection of its own, outside the pool, for as long as the worker lives
+        connection = db.engine.raw_connection()
+        connection.detach()
+        dbapi_connection = connection.dbapi_connection
+        dbapi_connection.autocommit = True
+        dbapi_connection.cursor().execute(f"LISTEN {EVENTS_CHANNEL}")
+        try:
+            # Catch up on anything committed while not listening
+            yield True
+            while True:
+                # select() yields to other greenlets under the gevent workers
+                ready = select.select([dbapi_connection], [], [], EVENTS_HEARTBEAT)[0]
+                if ready:
+                    dbapi_connection.poll()
+                    dbapi_connection.notifies.clear()
+                yield bool(ready) or self._wake.is_set()
+                self._wake.clear()
+        finally:
+            connection.close()
+
+
+def get_event_broker():
+    """This worker's broker; its listener starts with the first subscriber"""
+    app = current_app._get_current_object()
+    if 'event_broker' not in app.extensions:
+        app.extensions['event_broker'] = EventBroker(app)
+    return app.extensions['event_broker']
+
+
+def _leave_owners(events):
+    # Parsed once per batch rather than once per subscriber
+    return {id: json.loads(payload).get('user_id') for id, kind, payload, _ in events if kind.startswith('leave.')}
+
+
+def _visible(change_event, site_id, user_id, owners):
+    if site_id is not None and change_event[3] not in (None, site_id):
+        return False
+    # Leave events name the requester and the kind of leave, e.g. sick; staff only see their own
+    return user_id is None or change_event[0] not in owners or owners[change_event[0]] == user_id
+
+
+def _event_message(id, kind, payload, site_id=None):
+    return f"id: {id}\nevent: {kind}\ndata: {payload}\n\n"
+
+
+def _iter_event_stream(broker, subscription, backlog, reset, last_id, heartbeat):
+    try:
+        yield f"retry: {EVENTS_RETRY_MS}\n\n"
+        if reset:
+            yield "event: reset\ndata: {}\n\n"
+        for change_event in backlog:
+            yield _event_message(*change_event)
+            last_id = change_event[0]
+        while not (subscription.dropped and subscription.empty()):
+            try:
+                change_event = subscription.get(timeout=heartbeat)
+            except queue.Empty:
+                yield ": keepalive\n\n"
+                continue
+            # The backlog and the live queue can overlap at the seam
+            if change_event[0] > last_id:
+                yield _event_message(*change_event)
+                last_id = change_event[0]
+    finally:
+        broker.unsubscribe(subscription)
+
+
+def open_event_stream(last_event_id=None, user_id=None):
+    """Subscribe to the session's site's change events and return the text/event-stream body.
+
+    With last_event_id, the events committed since are replayed first; a
+    client too far behind (or older than EVENTS_RETENTION) gets a reset
+    event and should reload. With user_id, other users' leave events are
+    left out, live and replayed. All database work happens here, before
+    the body is streamed, so an open stream holds no connection.
+    """
+    site_id = current_site_id()
+    broker = get_event_broker()
+    subscription = broker.subscribe(site_id, user_id)
+    backlog, reset = [], False
+    try:
+        if last_event_id is not None:
+            query = (
+                db.select(ChangeEvent.id, ChangeEvent.kind, ChangeEvent.payload, ChangeEvent.site_id)
+                .where(ChangeEvent.id > last_event_id).order_by(ChangeEvent.id).limit(EVENTS_BACKLOG + 1)
+            )
+            if site_id is not None:
+                query = query.where(db.or_(ChangeEvent.site_id == site_id, ChangeEvent.site_id.is_(None)))
+            backlog = db.session.execute(query).all()
+            oldest = db.session.scalar(db.select(db.func.min(ChangeEvent.id)))
+            reset = len(backlog) > EVENTS_BACKLOG or (oldest is not None and oldest > last_event_id + 1)
+            if reset:
+                backlog = []
+            owners = _leave_owners(backlog)
+            backlog = [change_event for change_event in backlog if _visible(change_event, site_id, user_id, owners)]
+    except Exception:
+        broker.unsubscribe(subscription)
+        raise
+    heartbeat = current_app.config.get('EVENTS_HEARTBEAT', EVENTS_HEARTBEAT)
+    return _iter_event_stream(broker, subscription, backlog, reset, last_event_id or 0, heartbeat)
@@ -0,0 +1,37 @@
+from datetime import datetime, date, timedelta
+
+from App.models import User, Shift, TimeLog, LeaveRequest, SwapRequest, UserShiftStats, DEFAULT_SITE_ID
+from App.database import db
+from .shift import _conflict_query
+
+def _hot_queries():
+    """(label, statement) for the queries the CLI and API run most, with representative parameters.
+
+    Site-wide queries carry the site_id condition the session's site filter adds.
+    """
+    now = datetime.now().replace(microsecond=0)
+    today = date.today()
+    site = DEFAULT_SITE_ID
+    return [
+        ("Shift conflict check", _conflict_query(1, now)),
+        ("Roster / report date range", db.select(Shift).filter(Shift.site_id == site, Shift.start_time >= now, Shift.start_time < now + timedelta(days=7)).order_by(Shift.start_time, Shift.id)),
+        ("Clock in/out time log lookup", db.select(TimeLog).filter_by(shift_id=1, user_id=1).limit(1)),
+        ("Leave requests by status", db.select(LeaveRequest).filter_by(site_id=site, status='pending')),
+        ("Requester leave overlapping a range", db.select(LeaveRequest).filter(LeaveRequest.requester_id == 1, LeaveRequest.start_date <= today, LeaveRequest.end_date >= today)),
+        ("Swap requests by status", db.select(SwapRequest).filter_by(site_id=site, status='pending')),
+        ("User listing page", db.select(User).filter(User.site_id == site, User.id > 1).order_by(User.id).limit(100)),
+        ("Staff stats rollup", db.select(db.func.sum(UserShiftStats.total_shifts)).filter(UserShiftStats.user_id == 1)),
+    ]
+
+def explain_hot_queries():
+    """Return (label, sql, plan_lines) for each hot query, as planned by the connected database"""
+    connection = db.session.connection()
+    dialect = connection.dialect
+    prefix = 'EXPLAIN QUERY PLAN ' if dialect.name == 'sqlite' else 'EXPLAIN '
+    plans = []
+    for label, statement in _hot_queries():
+        sql = str(statement.compile(dialect=dialect, compile_kwargs={'literal_binds': True}))
+        rows = connection.exec_driver_sql(prefix + sql).all()
+        # SQLite returns (id, parent, notused, detail); Postgres one text column per line
+        plans.append((label, sql, [row[-1] for row in rows]))
+    return plans
@@ -0,0 +1,65 @@
+import json
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy.dialects import postgresql, sqlite
+
+from App.models import IdempotencyKey
+from App.database import db
+
+DEFAULT_IDEMPOTENCY_KEY_TTL = 24 * 3600
+# A claim still without a response after this many seconds lost its request
+# (a crashed worker) and is given to the next retry
+IDEMPOTENCY_PENDING_TIMEOUT = 60
+
+def _key_cutoff():
+    return datetime.now() - timedelta(seconds=current_app.config.get('IDEMPOTENCY_KEY_TTL', DEFAULT_IDEMPOTENCY_KEY_TTL))
+
+def get_idempotent_response(user_id, key):
+    """(request_path, status_code, body) stored for the user's key, or None if unseen or expired"""
+    return db.session.execute(
+        db.select(IdempotencyKey.request_path, IdempotencyKey.status_code, IdempotencyKey.response_body)
+        .filter(IdempotencyKey.user_id == user_id, IdempotencyKey.key == key, IdempotencyKey.created_at >= _key_cutoff())
+    ).first()
+
+def claim_idempotency_key(user_id, key, request_path):
+    """Claim the user's key for a request that is about to run, committing at once so racing requests see it.
+
+    Returns None when this caller holds the claim and should run the
+    request, then save_idempotent_response() or release_idempotency_key().
+    Otherwise returns what get_idempotent_response() does for the key; its
+    status_code and body are None while the claiming request still runs.
+    """
+    values = dict(user_id=user_id, key=key, request_path=request_path, created_at=datetime.now())
+    # Expired keys and abandoned claims are dropped as the user makes new ones
+    abandoned = datetime.now() - timedelta(seconds=IDEMPOTENCY_PENDING_TIMEOUT)
+    db.session.execute(db.delete(IdempotencyKey).where(
+        IdempotencyKey.user_id == user_id,
+        db.or_(IdempotencyKey.created_at < _key_cutoff(), db.and_(IdempotencyKey.status_code.is_(None), IdempotencyKey.created_at < abandoned))
+    ))
+    dialect = {'sqlite': sqlite, 'postgresql': postgresql}.get(db.session.get_bind().dialect.name)
+    if dialect:
+        claimed = db.session.execute(dialect.insert(IdempotencyKey).values(**values).on_conflict_do_nothing()).rowcount == 1
+    else:
+        claimed = not get_idempotent_response(user_id, key)
+        if claimed:
+            db.session.execute(db.insert(IdempotencyKey).values(**values))
+    db.session.commit()
+    return None if claimed else get_idempotent_response(user_id, key)
+
+def save_idempotent_response(user_id, key, status_code, body):
+    """Store the response of the request holding the user's key; returns the stored body"""
+    response_body = json.dumps(body)
+    db.session.execute(
+        db.update(IdempotencyKey).where(IdempotencyKey.user_id == user_id, IdempotencyKey.key == key)
+        .values(status_code=status_code, response_body=response_body)
+    )
+    db.session.commit()
+    return response_body
+
+def release_idempotency_key(user_id, key):
+    """Give up a claim whose request failed without a response worth replaying, so a retry runs it again"""
+    db.session.rollback()
+    db.session.execute(
+        db.delete(IdempotencyKey).where(IdempotencyKey.user_id == user_id, IdempotencyKey.key == key, IdempotencyKey.status_code.is_(None))
+    )
+    db.session.commit()
@@ -3,7 +3,8 @@ from App.database import db
 
 
 def initialize():
-    db.drop_all()
+    # The job queue survives, so an initialize run as a job can report back
+    db.metadata.drop_all(db.engine, tables=[table for table in db.metadata.sorted_tables if table.name != 'job'])
     db.create_all()
     create_user('admin', 'admin123', 'admin')
     create_user('bob', 'bobpass', 'staff')
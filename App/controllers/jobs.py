@@ -0,0 +1,242 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import date, timedelta
+from flask import current_app
+
+from App.models import Job, utcnow
+from App.database import db, current_site_id, set_site
+from .autogenerate import autogenerate_roster
+from .initialize import initialize
+from .report import get_report_summary, iter_report_rows, write_report_csv
+from .shift_import import import_shifts, read_shift_rows
+
+# Jobs a worker runs at once, one process each
+JOBS_PROCESSES = 2
+# Seconds an idle worker waits before looking for queued jobs again
+JOBS_POLL_INTERVAL = 1.0
+# A running job with no progress for this long lost its worker and is queued again
+JOBS_STALE_AFTER = 30 * 60
+# Seconds between progress writes from one job
+JOBS_PROGRESS_INTERVAL = 1.0
+# Bytes copied at a time from an uploaded request body to its job's file
+JOBS_UPLOAD_CHUNK = 64 * 1024
+# Settings a worker process needs to reach the same databases and wake the same event listeners
+JOBS_PROCESS_CONFIG = ('SQLALCHEMY_DATABASE_URI', 'REPLICA_DATABASE_URI', 'SITE_DATABASE_URIS', 'EVENTS_SIGNAL_PATH', 'JOBS_RESULT_PATH', 'TESTING')
+
+JOB_HANDLERS = {}
+
+def job_handler(kind):
+    """Register a function(job_id, params, progress) to run jobs of this kind; its return value is the job's result"""
+    def decorator(func):
+        JOB_HANDLERS[kind] = func
+        return func
+    return decorator
+
+
+@job_handler('import_shifts')
+def _import_shifts_job(job_id, params, progress):
+    if 'path' not in params:
+        created, errors = import_shifts(params['rows'], progress=progress)
+    else:
+        # An upload saved by save_job_upload(), read a row at a time
+        try:
+            with open(params['path'], newline='', encoding='utf-8') as stream:
+                created, errors = import_shifts(read_shift_rows(stream, params['format']), progress=progress)
+        finally:
+            os.remove(params['path'])
+    return {'created': created, 'errors': [{'row': row, 'error': error} for row, error in errors]}
+
+@job_handler('autogenerate')
+def _autogenerate_job(job_id, params, progress):
+    options = {key: params[key] for key in ('max_hours', 'min_rest_hours') if key in params}
+    result = autogenerate_roster(date.fromisoformat(params['week_start']), params['requirements'],
+                                 dry_run=params.get('dry_run', False), progress=progress, **options)
+    result['shifts'] = [
+        dict(shift, start_time=shift['start_time'].isoformat(), end_time=shift['end_time'].isoformat())
+        for shift in result['shifts']
+    ]
+    return result
+
+@job_handler('report')
+def _report_job(job_id, params, progress):
+    start_date, end_date = date.fromisoformat(params['start_date']), date.fromisoformat(params['end_date'])
+    summary = get_report_summary(start_date, end_date)
+    progress(1, 2)
+    # The shifts stream to a CSV file rather than into the job row, however long the range
+    path = job_result_path(job_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f'{path}.tmp', 'w', newline='') as stream:
+        write_report_csv(iter_report_rows(start_date, end_date), stream)
+    os.replace(f'{path}.tmp', path)
+    return {'summary': summary}
+
+@job_handler('initialize')
+def _initialize_job(job_id, params, progress):
+    initialize()
+    return {'message': 'db initialized!'}
+
+
+def enqueue_job(kind, params, user_id=None):
+    """Queue a job for `flask jobs worker` and return it; it runs scoped to the session's site.
+
+    With JOBS_EAGER set (tests, or a single-process setup) the job runs
+    here and now instead.
+    """
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f"Unknown job kind {kind}")
+    job = Job(kind, params, user_id, current_site_id())
+    db.session.add(job)
+    db.session.commit()
+    if current_app.config.get('JOBS_EAGER'):
+        if _claim_job(job.id):
+            run_job(job.id)
+        db.session.refresh(job)
+    return job
+
+def enqueue_initialize():
+    """Queue initialize(); the queue table is created first, in case the database predates it"""
+    Job.__table__.create(db.engine, checkfirst=True)
+    return enqueue_job('initialize', {})
+
+def get_job(job_id):
+    return db.session.get(Job, job_id)
+
+def _job_files():
+    # Shared with the workers, which must see the same filesystem
+    return current_app.config.get('JOBS_RESULT_PATH') or os.path.join(current_app.instance_path, 'job_results')
+
+def job_result_path(job_id):
+    """The file a job writes a result too big for its row to, e.g. a report's shifts as CSV"""
+    return os.path.join(_job_files(), f'{job_id}.csv')
+
+def save_job_upload(stream):
+    """Copy a request body to a file for a job to read, a chunk at a time, and return its path"""
+    directory = _job_files()
+    os.makedirs(directory, exist_ok=True)
+    fd, path = tempfile.mkstemp(prefix='upload-', dir=directory)
+    with os.fdopen(fd, 'wb') as upload:
+        shutil.copyfileobj(stream, upload, JOBS_UPLOAD_CHUNK)
+    return path
+
+def _claim_job(job_id):
+    # Only one worker can move a queued job to running, and initialize, which
+    # drops the tables, never runs alongside another job
+    other = db.aliased(Job)
+    running = db.select(other.id).where(other.status == 'running')
+    result = db.session.execute(
+        db.update(Job).where(
+            Job.id == job_id, Job.status == 'queued',
+            db.or_(
+                db.and_(Job.kind == 'initialize', ~running.exists()),
+                db.and_(Job.kind != 'initialize', ~running.where(other.kind == 'initialize').exists())
+            )
+        )
+        .values(status='running', started_at=utcnow())
+    )
+    db.session.commit()
+    return result.rowcount == 1
+
+def claim_next_job():
+    """The id of the oldest queued job, now marked running for this worker, or None if there is none.
+
+    None too while the oldest has to wait: initialize for the running jobs
+    to finish, or any job for a running initialize.
+    """
+    while True:
+        job_id = db.session.scalar(
+            db.select(Job.id).where(Job.status == 'queued').order_by(Job.id).limit(1)
+        )
+        if job_id is None or _claim_job(job_id):
+            return job_id
+        if db.session.scalar(db.select(Job.status).where(Job.id == job_id)) == 'queued':
+            return None
+
+def requeue_stale_jobs(stale_after=JOBS_STALE_AFTER):
+    """Queue again running jobs that stopped reporting progress, i.e. whose worker died; returns how many"""
+    result = db.session.execute(
+        db.update(Job).where(Job.status == 'running', Job.updated_at < utcnow() - timedelta(seconds=stale_after))
+        .values(status='queued', progress=0, started_at=None)
+    )
+    db.session.commit()
+    return result.rowcount
+
+def _finish_job(job_id, **values):
+    db.session.execute(db.update(Job).where(Job.id == job_id).values(finished_at=utcnow(), **values))
+    db.session.commit()
+    return values['status']
+
+def _progress_reporter(job_id):
+    last = [0.0]
+    def progress(done, total):
+        # Throttled, and only ever between the handler's own commits
+        now = time.monotonic()
+        if now - last[0] >= JOBS_PROGRESS_INTERVAL or done >= total:
+            last[0] = now
+            db.session.execute(db.update(Job).where(Job.id == job_id).values(progress=min(100, int(100 * done / max(total, 1)))))
+            db.session.commit()
+    return progress
+
+def run_job(job_id):
+    """Run a claimed job in this process and record how it ended; returns its final status"""
+    job = db.session.get(Job, job_id)
+    kind, params = job.kind, job.get_params()
+    set_site(job.site_id)
+    try:
+        result = JOB_HANDLERS[kind](job_id, params, _progress_reporter(job_id))
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error("Job %s (%s) failed:\n%s", job_id, kind, traceback.format_exc())
+        return _finish_job(job_id, status='failed', error=f"{type(e).__name__}: {e}")
+    return _finish_job(job_id, status='succeeded', progress=100, result=Job.dumps(result))
+
+
+def _init_job_process(config):
+    # Each pool process builds its own app, and so its own engine and pool
+    from App.main import create_app
+    create_app(config, web=False)
+
+def _run_job_in_process(job_id):
+    try:
+        return run_job(job_id)
+    finally:
+        db.session.remove()
+
+def iter_job_worker(processes=JOBS_PROCESSES, poll_interval=JOBS_POLL_INTERVAL, once=False):
+    """Claim queued jobs and run up to processes of them at a time in a process pool.
+
+    Yields (job_id, kind, status) as each job finishes. Runs until
+    interrupted, or with once until the queue is empty.
+    """
+    app = current_app._get_current_object()
+    config = {key: app.config[key] for key in JOBS_PROCESS_CONFIG if key in app.config}
+    requeue_stale_jobs()
+    # spawn rather than fork: children must not share the parent's database connections
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(processes, mp_context=context, initializer=_init_job_process, initargs=(config,)) as pool:
+        running = {}
+        while True:
+            while len(running) < processes:
+                job_id = claim_next_job()
+                if job_id is None:
+                    break
+                running[pool.submit(_run_job_in_process, job_id)] = job_id
+            db.session.remove()
+            if not running:
+                if once:
+                    return
+                time.sleep(poll_interval)
+                continue
+            finished, _ = wait(running, timeout=poll_interval, return_when=FIRST_COMPLETED)
+            for future in finished:
+                job_id = running.pop(future)
+                try:
+                    status = future.result()
+                except Exception as e:
+                    # The process died under the job (killed, out of memory)
+                    status = _finish_job(job_id, status='failed', error=f"{type(e).__name__}: {e}")
+                yield job_id, db.session.get(Job, job_id).kind, status
@@ -0,0 +1,161 @@
+import heapq
+from collections import namedtuple
+from datetime import datetime, time, timedelta
+
+from App.models import User, Shift, LeaveRequest, SwapRequest
+from App.database import db, read_replica
+from .events import publish_event
+
+# Shifts are scheduled within a single day, so one starting more than a day
+# before a window cannot reach into it; this bounds the index range scans
+MAX_SHIFT_LENGTH = timedelta(days=1)
+# A scheduled shift this close to its start needs cover rather than being dropped
+LEAVE_SWAP_NOTICE = timedelta(hours=48)
+
+UNASSIGN, SWAP, BLOCK = 'unassign', 'swap', 'block'
+LEAVE_IMPACT_COLUMNS = ['leave_id', 'user_id', 'username', 'shift_id', 'start_time', 'end_time', 'status', 'action']
+
+# A shift that collides with leave, and what approving the leave does to it
+LeaveImpact = namedtuple('LeaveImpact', ['shift', 'action'])
+
+def impact_action(status, start_time, now=None):
+    """What approving leave does to an overlapping shift.
+
+    Shifts already worked or in progress block the approval; scheduled
+    shifts starting within LEAVE_SWAP_NOTICE are flagged for swap so
+    someone covers them; later ones are unassigned.
+    """
+    if status in ('in_progress', 'completed'):
+        return BLOCK
+    if start_time - (now or datetime.now()) < LEAVE_SWAP_NOTICE:
+        return SWAP
+    return UNASSIGN
+
+def _date_window(start_date, end_date):
+    return datetime.combine(start_date, time.min), datetime.combine(end_date + timedelta(days=1), time.min)
+
+def find_leave_conflicts(leave_request):
+    """The requester's shifts overlapping the leave, found with one range seek on ix_shift_user_start_end"""
+    window_start, window_end = _date_window(leave_request.start_date, leave_request.end_date)
+    query = (
+        db.select(Shift)
+        .filter(
+            Shift.user_id == leave_request.requester_id,
+            Shift.start_time >= window_start - MAX_SHIFT_LENGTH,
+            Shift.start_time < window_end,
+            Shift.end_time > window_start
+        )
+        .order_by(Shift.start_time)
+    )
+    now = datetime.now()
+    return [LeaveImpact(shift, impact_action(shift.status, shift.start_time, now)) for shift in db.session.scalars(query)]
+
+def _leave_payload(leave_request):
+    return dict(leave_id=leave_request.id, user_id=leave_request.requester_id, start_date=leave_request.start_date,
+                end_date=leave_request.end_date, type=leave_request.type)
+
+def approve_leave(leave_request, approver_id):
+    """Approve leave and resolve the shifts it collides with.
+
+    Returns (approved, impacts). Nothing changes if any shift blocks the
+    approval. Otherwise shifts to unassign are removed from the roster
+    (their pending swap requests are rejected; every swap request is kept,
+    without its shift) and shifts to swap are marked swap_needed so a
+    supervisor can find cover. The whole approval is one transaction and
+    is rolled back on failure.
+    """
+    impacts = find_leave_conflicts(leave_request)
+    if any(impact.action == BLOCK for impact in impacts):
+        return False, impacts
+    try:
+        _reject_pending_swaps([shift.id for shift, action in impacts if action == UNASSIGN])
+        for shift, action in impacts:
+            if action == UNASSIGN:
+                db.session.delete(shift)
+                publish_event('shift.unassigned', shift_id=shift.id, user_id=shift.user_id, start_time=shift.start_time, end_time=shift.end_time)
+            else:
+                shift.status = 'swap_needed'
+                publish_event('shift.status', shift_id=shift.id, user_id=shift.user_id, status=shift.status)
+        leave_request.approve(approver_id)
+        publish_event('leave.approved', **_leave_payload(leave_request))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return True, impacts
+
+def _reject_pending_swaps(shift_ids):
+    # Deleting the shifts then clears shift_id on all their requests, decided ones included
+    if not shift_ids:
+        return
+    pending = db.select(SwapRequest).filter(SwapRequest.shift_id.in_(shift_ids), SwapRequest.status == 'pending')
+    for swap_request in db.session.scalars(pending):
+        swap_request.reject("Shift unassigned for approved leave")
+        publish_event('swap.rejected', swap_id=swap_request.id, shift_id=swap_request.shift_id,
+                      from_user_id=swap_request.from_user_id, to_user_id=swap_request.to_user_id)
+
+def reject_leave(leave_request, approver_id, reason=None):
+    """Reject leave, keeping the reason given"""
+    leave_request.reject(approver_id, reason)
+    publish_event('leave.rejected', **_leave_payload(leave_request))
+    db.session.commit()
+    return leave_request
+
+@read_replica
+def iter_leave_impact(start_date, end_date):
+    """Yield a row per shift in the range that falls on approved leave.
+
+    Shifts and leave both come back sorted by user and start from their
+    composite indexes and are merged in one sweep: leave enters a per-user
+    heap keyed by end date as the shifts reach its start and leaves it once
+    they pass its end, so each row is read once instead of comparing every
+    shift with every leave request.
+    """
+    window_start, window_end = _date_window(start_date, end_date)
+    leaves = db.session.execute(
+        db.select(LeaveRequest.requester_id, LeaveRequest.start_date, LeaveRequest.end_date, LeaveRequest.id)
+        .filter(LeaveRequest.status == 'approved', LeaveRequest.start_date <= end_date, LeaveRequest.end_date >= start_date)
+        .order_by(LeaveRequest.requester_id, LeaveRequest.start_date)
+    ).all()
+    if not leaves:
+        return
+    shifts = db.session.execute(
+        db.select(Shift.user_id, Shift.start_time, Shift.end_time, Shift.id, Shift.status, User.username)
+        .join(User, User.id == Shift.user_id)
+        .filter(
+            Shift.user_id.in_(sorted({leave.requester_id for leave in leaves})),
+            Shift.start_time >= window_start - MAX_SHIFT_LENGTH,
+            Shift.start_time < window_end,
+            Shift.end_time > window_start
+        )
+        .order_by(Shift.user_id, Shift.start_time)
+    )
+    now = datetime.now()
+    next_leave = 0
+    active = []  # (end_date, start_date, leave_id) of the current user's leave that has started
+    current_user = None
+    for user_id, start_time, end_time, shift_id, status, username in shifts:
+        if user_id != current_user:
+            current_user = user_id
+            active = []
+            while next_leave < len(leaves) and leaves[next_leave].requester_id < user_id:
+                next_leave += 1
+        first_day, last_day = start_time.date(), end_time.date()
+        while next_leave < len(leaves) and leaves[next_leave].requester_id == user_id and leaves[next_leave].start_date <= last_day:
+            requester_id, leave_start, leave_end, leave_id = leaves[next_leave]
+            heapq.heappush(active, (leave_end, leave_start, leave_id))
+            next_leave += 1
+        while active and active[0][0] < first_day:
+            heapq.heappop(active)
+        leave = next((entry for entry in active if entry[1] <= last_day), None)
+        if leave:
+            yield {
+                'leave_id': leave[2],
+                'user_id': user_id,
+                'username': username,
+                'shift_id': shift_id,
+                'start_time': start_time.isoformat(),
+                'end_time': end_time.isoformat(),
+                'status': status,
+                'action': impact_action(status, start_time, now)
+            }
@@ -0,0 +1,69 @@
+import base64, binascii, json
+from datetime import date, datetime
+
+from App.database import db
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+def encode_cursor(values):
+    """Opaque cursor for the position just after a row with these key values"""
+    values = [value.isoformat() if isinstance(value, (date, datetime)) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+def decode_cursor(cursor, columns):
+    """Turn a cursor back into key values typed like columns, or raise ValueError"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError
+        return [_from_json(column, value) for column, value in zip(columns, values)]
+    except (ValueError, TypeError, binascii.Error):
+        raise ValueError("Invalid cursor")
+
+def _from_json(column, value):
+    python_type = column.type.python_type
+    if python_type in (datetime, date):
+        return python_type.fromisoformat(value)
+    return python_type(value)
+
+def _after(columns, values):
+    # (c1, c2, ...) > (v1, v2, ...) spelled out so every backend can seek the index
+    column, value = columns[0], values[0]
+    if len(columns) == 1:
+        return column > value
+    return db.or_(column > value, db.and_(column == value, _after(columns[1:], values[1:])))
+
+def keyset_page(query, columns, limit=DEFAULT_PAGE_SIZE, cursor=None):
+    """Return (items, next_cursor) for the page of query following cursor.
+
+    Rows are ordered by columns, the last of which must be unique (the
+    primary key). Only limit + 1 rows are read, however large the table.
+    """
+    limit = max(1, min(limit or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE))
+    if cursor:
+        query = query.filter(_after(columns, decode_cursor(cursor, columns)))
+    query = query.add_columns(*columns).order_by(*columns).limit(limit + 1)
+    rows = db.session.execute(query).all()
+    next_cursor = encode_cursor(rows[limit - 1][1:]) if len(rows) > limit else None
+    return [row[0] for row in rows[:limit]], next_cursor
+
+def page_filters(args):
+    """Keyword arguments for a *_page function from query string args, or raise ValueError"""
+    filters = {'limit': int(args.get('limit', DEFAULT_PAGE_SIZE)), 'cursor': args.get('cursor')}
+    if args.get('user_id'):
+        filters['user_id'] = int(args['user_id'])
+    if args.get('status'):
+        filters['status'] = args['status']
+    if args.get('from'):
+        filters['start_date'] = date.fromisoformat(args['from'])
+    if args.get('to'):
+        filters['end_date'] = date.fromisoformat(args['to'])
+    return filters
+
+def iter_page_json(items, next_cursor):
+    """Serialize a page one item at a time, for streaming responses"""
+    yield '{"items": ['
+    for index, item in enumerate(items):
+        yield (', ' if index else '') + json.dumps(item.get_json())
+    yield '], "next_cursor": ' + json.dumps(next_cursor) + '}'
@@ -0,0 +1,93 @@
+import csv, json
+from datetime import datetime, time, timedelta
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import FunctionElement
+
+from App.models import User, Shift
+from App.database import db, read_replica
+
+REPORT_BATCH_SIZE = 1000
+REPORT_COLUMNS = ['shift_id', 'date', 'start_time', 'end_time', 'username', 'status', 'hours']
+
+class hours_between(FunctionElement):
+    """Hours from the first datetime argument to the second, computed by the database"""
+    type = db.Float()
+    name = 'hours_between'
+    inherit_cache = True
+
+@compiles(hours_between)
+def _hours_between(element, compiler, **kw):
+    start, end = [compiler.process(arg, **kw) for arg in element.clauses]
+    return f"(EXTRACT(EPOCH FROM ({end} - {start})) / 3600.0)"
+
+@compiles(hours_between, 'sqlite')
+def _hours_between_sqlite(element, compiler, **kw):
+    start, end = [compiler.process(arg, **kw) for arg in element.clauses]
+    return f"((strftime('%s', {end}) - strftime('%s', {start})) / 3600.0)"
+
+def _in_range(start_date, end_date):
+    return (
+        Shift.start_time >= datetime.combine(start_date, time.min),
+        Shift.start_time < datetime.combine(end_date + timedelta(days=1), time.min)
+    )
+
+@read_replica
+def get_report_summary(start_date, end_date):
+    """Shift counts and hours for start_date..end_date, per user, per day and per status.
+
+    The database groups by (user, day, status) in a single query, so only one
+    row per group reaches Python however many shifts the range holds.
+    """
+    hours = hours_between(Shift.start_time, Shift.end_time)
+    day = db.func.date(Shift.start_time)
+    rows = db.session.execute(
+        db.select(User.username, day, Shift.status, db.func.count(Shift.id), db.func.sum(hours))
+        .join(Shift.user)
+        .filter(*_in_range(start_date, end_date))
+        .group_by(User.username, day, Shift.status)
+    )
+    summary = {'total_shifts': 0, 'total_hours': 0.0, 'by_user': {}, 'by_day': {}, 'by_status': {}}
+    for username, shift_day, status, count, total in rows:
+        total = float(total or 0)
+        summary['total_shifts'] += count
+        summary['total_hours'] += total
+        for group, key in (('by_user', username), ('by_day', str(shift_day)), ('by_status', status)):
+            shifts, group_hours = summary[group].get(key, (0, 0.0))
+            summary[group][key] = (shifts + count, group_hours + total)
+    for group in ('by_user', 'by_day', 'by_status'):
+        summary[group] = dict(sorted(summary[group].items()))
+    return summary
+
+@read_replica
+def iter_report_rows(start_date, end_date, batch_size=REPORT_BATCH_SIZE):
+    """Yield one dict per shift in the range, fetched from the database in batches"""
+    query = (
+        db.select(Shift.id, Shift.start_time, Shift.end_time, User.username, Shift.status)
+        .join(Shift.user)
+        .filter(*_in_range(start_date, end_date))
+        .order_by(Shift.start_time, Shift.id)
+        .execution_options(yield_per=batch_size)
+    )
+    for shift_id, start_time, end_time, username, status in db.session.execute(query):
+        yield {
+            'shift_id': shift_id,
+            'date': start_time.date().isoformat(),
+            'start_time': start_time.strftime('%H:%M'),
+            'end_time': end_time.strftime('%H:%M'),
+            'username': username,
+            'status': status,
+            'hours': (end_time - start_time).total_seconds() / 3600
+        }
+
+def write_report_csv(rows, stream):
+    writer = csv.DictWriter(stream, fieldnames=REPORT_COLUMNS)
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row)
+
+def iter_report_json(rows, summary):
+    """Serialize the report one shift at a time, ending with the summary"""
+    yield '{"shifts": ['
+    for index, row in enumerate(rows):
+        yield (', ' if index else '') + json.dumps(row)
+    yield '], "summary": ' + json.dumps(summary) + '}'
@@ -0,0 +1,83 @@
+from datetime import datetime, time
+
+from App.models import Shift, LeaveRequest, SwapRequest
+from App.database import db, read_replica
+from .pagination import DEFAULT_PAGE_SIZE, keyset_page
+
+# Listings load the users (and shifts) they display in the same statement,
+# so the number of queries stays constant however many rows are returned.
+
+@read_replica
+def get_roster_shifts():
+    query = db.select(Shift).options(db.joinedload(Shift.user)).order_by(Shift.start_time, Shift.id)
+    return db.session.scalars(query).all()
+
+@read_replica
+def get_leave_requests(status=None):
+    query = db.select(LeaveRequest).options(db.joinedload(LeaveRequest.requester)).order_by(LeaveRequest.id)
+    if status:
+        query = query.filter(LeaveRequest.status == status)
+    return db.session.scalars(query).all()
+
+@read_replica
+def get_swap_requests(status=None):
+    query = (
+        db.select(SwapRequest)
+        .options(
+            db.joinedload(SwapRequest.shift),
+            db.joinedload(SwapRequest.from_user),
+            db.joinedload(SwapRequest.to_user)
+        )
+        .order_by(SwapRequest.id)
+    )
+    if status:
+        query = query.filter(SwapRequest.status == status)
+    return db.session.scalars(query).all()
+
+# Pages for the API are keyset-paginated on (start, id), so each one costs
+# an index seek rather than an OFFSET scan over everything before it.
+
+@read_replica
+def get_shifts_page(limit=DEFAULT_PAGE_SIZE, cursor=None, user_id=None, status=None, start_date=None, end_date=None):
+    query = db.select(Shift)
+    if user_id is not None:
+        query = query.filter(Shift.user_id == user_id)
+    if status:
+        query = query.filter(Shift.status == status)
+    if start_date:
+        query = query.filter(Shift.start_time >= datetime.combine(start_date, time.min))
+    if end_date:
+        query = query.filter(Shift.start_time <= datetime.combine(end_date, time.max))
+    return keyset_page(query, [Shift.start_time, Shift.id], limit, cursor)
+
+@read_replica
+def get_leave_page(limit=DEFAULT_PAGE_SIZE, cursor=None, user_id=None, status=None, start_date=None, end_date=None):
+    """Leave requests overlapping start_date..end_date, if given"""
+    query = db.select(LeaveRequest)
+    if user_id is not None:
+        query = query.filter(LeaveRequest.requester_id == user_id)
+    if status:
+        query = query.filter(LeaveRequest.status == status)
+    if start_date:
+        query = query.filter(LeaveRequest.end_date >= start_date)
+    if end_date:
+        query = query.filter(LeaveRequest.start_date <= end_date)
+    return keyset_page(query, [LeaveRequest.start_date, LeaveRequest.id], limit, cursor)
+
+@read_replica
+def get_swaps_page(limit=DEFAULT_PAGE_SIZE, cursor=None, user_id=None, status=None, start_date=None, end_date=None):
+    """Swap requests ordered by the start of the shift they are for
+
+    Requests whose shift was taken off the roster have no start to page on
+    and are left out; `flask swap list` still shows them.
+    """
+    query = db.select(SwapRequest).join(SwapRequest.shift)
+    if user_id is not None:
+        query = query.filter(db.or_(SwapRequest.from_user_id == user_id, SwapRequest.to_user_id == user_id))
+    if status:
+        query = query.filter(SwapRequest.status == status)
+    if start_date:
+        query = query.filter(Shift.start_time >= datetime.combine(start_date, time.min))
+    if end_date:
+        query = query.filter(Shift.start_time <= datetime.combine(end_date, time.max))
+    return keyset_page(query, [Shift.start_time, SwapRequest.id], limit, cursor)
@@ -0,0 +1,345 @@
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from flask import current_app, render_template
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from App.models import User, Shift, LeaveRequest, SwapRequest, UserShiftStats
+from App.database import db, current_site_id
+
+ROSTER_CACHE_SIZE = 256
+ROSTER_SNAPSHOT_KINDS = ('json', 'html')
+
+
+class RosterCache:
+    """Serialized roster snapshots keyed by (site, week, kind), with this worker's hit and miss counts.
+
+    Every invalidation moves the (site, week) on to a new generation, and
+    clear() moves every week on, so a snapshot built from rows read before
+    an invalidation is never stored after it: fillers take a token() first
+    and set() drops the body if the token is out of date by then.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._counts_lock = threading.Lock()
+
+    def get(self, key):
+        body = self._get(key)
+        with self._counts_lock:
+            if body is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return body
+
+    def token(self, week):
+        """The (site, week)'s current generation; take it before reading the rows a snapshot is built from"""
+        return self._token(week)
+
+    def set(self, key, body, token=None):
+        """Store body unless the week was invalidated since token was taken"""
+        self._set(key, body, token)
+
+    def invalidate(self, weeks):
+        """Drop every kind of snapshot for each (site, week)"""
+        if weeks:
+            self._invalidate(weeks)
+            with self._counts_lock:
+                self.invalidations += len(weeks)
+
+    def clear(self):
+        """Drop every snapshot, e.g. once a username they show has changed"""
+        self._clear()
+        with self._counts_lock:
+            self.invalidations += 1
+
+    def stats(self):
+        with self._counts_lock:
+            return {'backend': self.backend, 'hits': self.hits, 'misses': self.misses, 'invalidations': self.invalidations}
+
+
+class LRURosterCache(RosterCache):
+    """Snapshots kept in this process, least recently used dropped first; for a single worker"""
+
+    backend = 'memory'
+
+    def __init__(self, maxsize=ROSTER_CACHE_SIZE):
+        super().__init__()
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._epoch = 0
+        self._lock = threading.Lock()
+
+    def _get(self, key):
+        with self._lock:
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+            return body
+
+    def _token(self, week):
+        with self._lock:
+            return self._epoch, self._generations.get(week, 0)
+
+    def _set(self, key, body, token):
+        with self._lock:
+            if token is not None and token != (self._epoch, self._generations.get(key[:2], 0)):
+                return
+            self._entries[key] = body
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def _invalidate(self, weeks):
+        with self._lock:
+            for week in weeks:
+                self._generations[week] = self._generations.get(week, 0) + 1
+            for key in [key for key in self._entries if key[:2] in weeks]:
+                del self._entries[key]
+
+    def _clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._generations.clear()
+            self._entries.clear()
+
+
+class SQLiteRosterCache(RosterCache):
+    """Snapshots in a local SQLite file, shared by every worker on the host so one invalidation reaches all"""
+
+    backend = 'sqlite'
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        # One connection per worker, shared by its threads (or greenlets) in turn
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS roster_snapshot ("
+                " site TEXT NOT NULL, week TEXT NOT NULL, kind TEXT NOT NULL, body TEXT NOT NULL,"
+                " PRIMARY KEY (site, week, kind))"
+            )
+            # Generations per (site, week); the row for site and week '*' is the epoch clear() moves on
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS roster_generation ("
+                " site TEXT NOT NULL, week TEXT NOT NULL, generation INTEGER NOT NULL,"
+                " PRIMARY KEY (site, week))"
+            )
+
+    @staticmethod
+    def _site(site):
+        return '' if site is None else str(site)
+
+    def _get(self, key):
+        site, week, kind = key
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT body FROM roster_snapshot WHERE site = ? AND week = ? AND kind = ?", (self._site(site), week.isoformat(), kind)
+            ).fetchone()
+        return row[0] if row else None
+
+    _GENERATION = "COALESCE((SELECT generation FROM roster_generation WHERE site = ? AND week = ?), 0)"
+
+    def _token(self, week):
+        site, week = week
+        with self._lock:
+            return self._conn.execute(
+                f"SELECT {self._GENERATION}, {self._GENERATION}", ('*', '*', self._site(site), week.isoformat())
+            ).fetchone()
+
+    def _set(self, key, body, token):
+        site, week, kind = key
+        site, week = self._site(site), week.isoformat()
+        with self._lock:
+            if token is None:
+                self._conn.execute("INSERT OR REPLACE INTO roster_snapshot VALUES (?, ?, ?, ?)", (site, week, kind, body))
+                return
+            # One statement, so an invalidation from another worker lands wholly before or after it
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO roster_snapshot SELECT ?, ?, ?, ? WHERE {self._GENERATION} = ? AND {self._GENERATION} = ?",
+                (site, week, kind, body, '*', '*', token[0], site, week, token[1])
+            )
+
+    def _bump(self, weeks):
+        self._conn.executemany(
+            "INSERT INTO roster_generation VALUES (?, ?, 1)"
+            " ON CONFLICT (site, week) DO UPDATE SET generation = generation + 1",
+            weeks
+        )
+
+    def _invalidate(self, weeks):
+        weeks = [(self._site(site), week.isoformat()) for site, week in weeks]
+        with self._lock:
+            # Generation first, so a filler that read the old rows can no longer store them
+            self._bump(weeks)
+            self._conn.executemany("DELETE FROM roster_snapshot WHERE site = ? AND week = ?", weeks)
+
+    def _clear(self):
+        with self._lock:
+            self._bump([('*', '*')])
+            self._conn.execute("DELETE FROM roster_snapshot")
+
+
+def get_roster_cache():
+    """The app's snapshot cache, built on first use from ROSTER_CACHE (memory, sqlite or none)"""
+    app = current_app._get_current_object()
+    if 'roster_cache' not in app.extensions:
+        backend = app.config.get('ROSTER_CACHE', 'memory')
+        if backend == 'sqlite':
+            path = app.config.get('ROSTER_CACHE_PATH') or os.path.join(app.instance_path, 'roster_cache.sqlite')
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            cache = SQLiteRosterCache(path)
+        elif backend == 'memory':
+            cache = LRURosterCache(app.config.get('ROSTER_CACHE_SIZE', ROSTER_CACHE_SIZE))
+        else:
+            cache = None
+        app.extensions['roster_cache'] = cache
+    return app.extensions['roster_cache']
+
+
+def get_roster_cache_stats():
+    cache = get_roster_cache()
+    return cache.stats() if cache else None
+
+
+def build_roster_week(week_start):
+    """Every shift of the session's site starting in the week and the approved leave overlapping it, ready to serialize.
+
+    Read from the primary: a snapshot stays cached until the week changes
+    again, so one built from a lagging replica would outlive the lag.
+    """
+    window_start = datetime.combine(week_start, datetime.min.time())
+    window_end = window_start + timedelta(days=7)
+    shifts = db.session.execute(
+        db.select(Shift.id, Shift.user_id, User.username, Shift.start_time, Shift.end_time, Shift.status)
+        .join(User, User.id == Shift.user_id)
+        .filter(Shift.start_time >= window_start, Shift.start_time < window_end)
+        .order_by(Shift.start_time, Shift.id)
+    ).all()
+    leave = db.session.execute(
+        db.select(LeaveRequest.id, LeaveRequest.requester_id, User.username, LeaveRequest.start_date, LeaveRequest.end_date, LeaveRequest.type)
+        .join(User, User.id == LeaveRequest.requester_id)
+        .filter(LeaveRequest.status == 'approved', LeaveRequest.start_date < window_end.date(), LeaveRequest.end_date >= week_start)
+        .order_by(LeaveRequest.start_date, LeaveRequest.id)
+    ).all()
+    return {
+        'site_id': current_site_id(),
+        'week_start': week_start.isoformat(),
+        'shifts': [
+            {'id': id, 'user_id': user_id, 'username': username, 'start_time': start_time.isoformat(),
+             'end_time': end_time.isoformat(), 'status': status}
+            for id, user_id, username, start_time, end_time, status in shifts
+        ],
+        'leave': [
+            {'id': id, 'user_id': user_id, 'username': username, 'start_date': start_date.isoformat(),
+             'end_date': end_date.isoformat(), 'type': type}
+            for id, user_id, username, start_date, end_date, type in leave
+        ]
+    }
+
+
+def _serialize(roster, kind):
+    if kind == 'html':
+        return render_template('roster_week.html', roster=roster)
+    return json.dumps(roster)
+
+
+def get_roster_snapshot(week_start, kind='json'):
+    """The session's site's roster for the week as a JSON document or an HTML fragment, served from the cache when it can be.
+
+    week_start is moved back to its Monday. Snapshots stay cached until a
+    change to one of the week's shifts, an approved swap or leave touching
+    it, or a username change is committed.
+    """
+    week_start = week_start - timedelta(days=week_start.weekday())
+    cache = get_roster_cache()
+    key = (current_site_id(), week_start, kind)
+    body = cache.get(key) if cache else None
+    if body is None:
+        token = cache.token(key[:2]) if cache else None
+        body = _serialize(build_roster_week(week_start), kind)
+        if cache:
+            cache.set(key, body, token)
+    return body
+
+
+def invalidate_roster_weeks(weeks):
+    """Drop the snapshots of these (site, week) pairs; for writes that bypass the flush hooks"""
+    cache = get_roster_cache()
+    if cache:
+        weeks = set(weeks)
+        # An unscoped session's snapshots hold every site's rows
+        cache.invalidate(weeks | {(None, week) for _, week in weeks})
+
+
+def invalidate_shift_week(shift_id):
+    row = db.session.execute(db.select(Shift.site_id, Shift.start_time).filter_by(id=shift_id)).first()
+    if row:
+        invalidate_roster_weeks([(row.site_id, UserShiftStats.week_of(row.start_time))])
+
+
+def _weeks_between(start_date, end_date):
+    week = start_date - timedelta(days=start_date.weekday())
+    while week <= end_date:
+        yield week
+        week += timedelta(days=7)
+
+
+def _changed_weeks(obj):
+    """The (site, week) pairs a flushed object's change shows up in"""
+    state = inspect(obj)
+    if isinstance(obj, Shift):
+        starts = {obj.start_time}
+        # A moved shift also leaves the week it used to be in
+        starts.update(state.attrs.start_time.history.deleted or ())
+        return {(obj.site_id, UserShiftStats.week_of(start)) for start in starts if start is not None}
+    history = state.attrs.status.history
+    if 'approved' not in (history.added or ()) and not (state.deleted and obj.status == 'approved'):
+        return set()
+    if isinstance(obj, SwapRequest):
+        with db.session.no_autoflush:
+            shift = db.session.get(Shift, obj.shift_id) if obj.shift_id is not None else None
+        return {(obj.site_id, UserShiftStats.week_of(shift.start_time))} if shift else set()
+    return {(obj.site_id, week) for week in _weeks_between(obj.start_date, obj.end_date)}
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_roster_changes(session, flush_context):
+    weeks = set()
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, (Shift, SwapRequest, LeaveRequest)):
+            weeks |= _changed_weeks(obj)
+    if weeks:
+        session.info.setdefault('roster_weeks', set()).update(weeks)
+    # Snapshots show usernames; renames are rare enough to drop them all
+    if any(isinstance(obj, User) and inspect(obj).attrs.username.history.added for obj in session.dirty):
+        session.info['roster_renamed'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed_roster_changes(session):
+    # Only once the change is visible to the rebuild that follows
+    weeks = session.info.pop('roster_weeks', None)
+    if weeks:
+        invalidate_roster_weeks(weeks)
+    if session.info.pop('roster_renamed', None):
+        cache = get_roster_cache()
+        if cache:
+            cache.clear()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_roster_changes(session):
+    session.info.pop('roster_weeks', None)
+    session.info.pop('roster_renamed', None)
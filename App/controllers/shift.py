@@ -0,0 +1,34 @@
+from App.models import Shift
+from App.database import db
+
+def get_shift(id):
+    return db.session.get(Shift, id)
+
+def _conflict_query(user_id, end_time, exclude_shift_id=None):
+    query = db.select(Shift).filter(Shift.user_id == user_id, Shift.start_time < end_time)
+    if exclude_shift_id is not None:
+        query = query.filter(Shift.id != exclude_shift_id)
+    return query.order_by(Shift.start_time.desc()).limit(1)
+
+def find_conflicting_shift(user_id, start_time, end_time, exclude_shift_id=None):
+    """Return a shift of the user overlapping [start_time, end_time), or None.
+
+    Uses the same half-open semantics as Shift.overlaps, so back-to-back
+    shifts do not conflict. A user's shifts never overlap one another (this
+    check is what keeps it that way), so they are ordered by end time as well
+    as start time and the only candidate is the latest shift starting before
+    end_time: one seek on ix_shift_user_start_end instead of a scan.
+    """
+    shift = db.session.scalars(_conflict_query(user_id, end_time, exclude_shift_id)).first()
+    if shift and shift.overlaps(start_time, end_time):
+        return shift
+    return None
+
+def schedule_shift(user_id, start_time, end_time):
+    """Create a shift, or return None if it conflicts with one the user already has"""
+    if find_conflicting_shift(user_id, start_time, end_time):
+        return None
+    shift = Shift(user_id=user_id, start_time=start_time, end_time=end_time, status='scheduled')
+    db.session.add(shift)
+    db.session.commit()
+    return shift
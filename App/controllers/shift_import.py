@@ -0,0 +1,151 @@
+import csv, json
+from bisect import bisect_left
+from itertools import chain
+from datetime import datetime, date
+
+from App.models import User, Shift, UserShiftStats, site_id_for
+from App.database import db
+from .availability import clear_availability_cache
+from .roster_cache import invalidate_roster_weeks
+
+IMPORT_CHUNK_SIZE = 500
+
+def read_shift_rows(stream, format='csv'):
+    """Yield row dicts from a CSV (with header) or JSON (array or one object per line) stream.
+
+    CSV and one-object-per-line JSON are read a line at a time; a JSON
+    array has to be parsed whole.
+    """
+    if format == 'csv':
+        yield from csv.DictReader(stream)
+        return
+    head = stream.read(1)
+    while head.isspace():
+        head = stream.read(1)
+    if head == '[':
+        yield from json.loads(head + stream.read())
+        return
+    for line in chain([head + stream.readline()], stream):
+        if line.strip():
+            yield json.loads(line)
+
+def _parse_row(row):
+    """Return (user_ref, start_datetime, end_datetime) for an import row, or raise ValueError"""
+    if not isinstance(row, dict):
+        raise ValueError("Row must be an object")
+    user_ref = row.get('user_id') or row.get('username')
+    if not user_ref:
+        raise ValueError("Missing user_id or username")
+    if row.get('user_id'):
+        user_ref = int(user_ref)
+    shift_date = datetime.strptime(str(row['date']), '%Y-%m-%d').date()
+    start_time = datetime.strptime(str(row['start_time']), '%H:%M').time()
+    end_time = datetime.strptime(str(row['end_time']), '%H:%M').time()
+    if shift_date < date.today():
+        raise ValueError("Cannot schedule shifts in the past")
+    if start_time >= end_time:
+        raise ValueError("Start time must be before end time")
+    return user_ref, datetime.combine(shift_date, start_time), datetime.combine(shift_date, end_time)
+
+def _resolve_users(refs):
+    """Map every user id and username in refs to a user id with a single query"""
+    ids = {ref for ref in refs if isinstance(ref, int)}
+    names = {ref for ref in refs if isinstance(ref, str)}
+    rows = db.session.execute(
+        db.select(User.id, User.username).filter(db.or_(User.id.in_(ids), User.username.in_(names)))
+    )
+    resolved = {}
+    for user_id, username in rows:
+        resolved[user_id] = user_id
+        resolved[username] = user_id
+    return resolved
+
+def _existing_shifts(user_ids, window_start, window_end):
+    """Return {user_id: sorted [(start, end)]} of stored shifts inside the window, in one query"""
+    rows = db.session.execute(
+        db.select(Shift.user_id, Shift.start_time, Shift.end_time)
+        .filter(Shift.user_id.in_(user_ids), Shift.start_time < window_end, Shift.end_time > window_start)
+        .order_by(Shift.user_id, Shift.start_time)
+    )
+    existing = {}
+    for user_id, start_time, end_time in rows:
+        existing.setdefault(user_id, []).append((start_time, end_time))
+    return existing
+
+def _overlaps_existing(intervals, starts, start_time, end_time):
+    # Stored shifts never overlap each other, so only the latest one
+    # starting before end_time can reach past start_time
+    index = bisect_left(starts, end_time) - 1
+    return index >= 0 and intervals[index][1] > start_time
+
+def insert_shifts(mappings, chunk_size=IMPORT_CHUNK_SIZE, progress=None):
+    """Insert already-validated shift dicts in chunks, committing after each.
+
+    The shifts join the session's site. progress, if given, is called with
+    (inserted, total) after every chunk.
+    """
+    site_id = site_id_for(db.session)
+    for offset in range(0, len(mappings), chunk_size):
+        chunk = [dict(mapping, site_id=site_id) for mapping in mappings[offset:offset + chunk_size]]
+        db.session.execute(db.insert(Shift), chunk)
+        # Bulk inserts skip the flush hooks, so roll the chunk into the stats here
+        deltas = {}
+        for mapping in chunk:
+            UserShiftStats.add_shift(deltas, mapping['user_id'], mapping['start_time'], mapping['end_time'], mapping['status'])
+        UserShiftStats.apply(db.session.connection(), deltas)
+        db.session.commit()
+        if progress:
+            progress(offset + len(chunk), len(mappings))
+    # Likewise the flush hooks that drop cached swap availability and roster snapshots
+    clear_availability_cache()
+    invalidate_roster_weeks({(site_id, UserShiftStats.week_of(mapping['start_time'])) for mapping in mappings})
+
+def import_shifts(rows, chunk_size=IMPORT_CHUNK_SIZE, progress=None):
+    """Validate and insert many shifts at once.
+
+    Users are resolved in one query and overlaps are found by sorting and
+    sweeping in memory, both within the batch and against stored shifts.
+    Bad rows are skipped and reported; returns (created_count, errors)
+    where errors is a list of (row_number, message).
+    """
+    errors = []
+    candidates = []
+    for row_number, row in enumerate(rows, start=1):
+        try:
+            candidates.append((row_number, *_parse_row(row)))
+        except (KeyError, TypeError, ValueError) as e:
+            message = f"Missing field {e}" if isinstance(e, KeyError) else str(e)
+            errors.append((row_number, message))
+    if not candidates:
+        return 0, errors
+
+    users = _resolve_users({user_ref for _, user_ref, _, _ in candidates})
+    by_user = {}
+    for row_number, user_ref, start_time, end_time in candidates:
+        user_id = users.get(user_ref)
+        if user_id is None:
+            errors.append((row_number, f"User {user_ref} not found"))
+            continue
+        by_user.setdefault(user_id, []).append((start_time, end_time, row_number))
+
+    window_start = min(c[2] for c in candidates)
+    window_end = max(c[3] for c in candidates)
+    existing = _existing_shifts(list(by_user), window_start, window_end)
+
+    mappings = []
+    for user_id, intervals in by_user.items():
+        stored = existing.get(user_id, [])
+        stored_starts = [start_time for start_time, _ in stored]
+        last_end = None
+        for start_time, end_time, row_number in sorted(intervals):
+            if _overlaps_existing(stored, stored_starts, start_time, end_time):
+                errors.append((row_number, "User already has a shift scheduled during this time"))
+            elif last_end is not None and start_time < last_end:
+                errors.append((row_number, "Overlaps another shift for the same user in this import"))
+            else:
+                last_end = end_time
+                mappings.append({'user_id': user_id, 'start_time': start_time, 'end_time': end_time, 'status': 'scheduled'})
+
+    insert_shifts(mappings, chunk_size, progress)
+    errors.sort()
+    return len(mappings), errors
@@ -0,0 +1,36 @@
+from App.models import Site
+from App.database import db, site_bind
+
+
+def create_site(name):
+    site = Site(name)
+    db.session.add(site)
+    db.session.commit()
+    return site
+
+def get_site(id):
+    return db.session.get(Site, id)
+
+def get_site_by_name(name):
+    return db.session.scalars(db.select(Site).filter_by(name=name)).first()
+
+def get_all_sites():
+    return db.session.scalars(db.select(Site).order_by(Site.id)).all()
+
+def has_own_database(site_id):
+    """Whether SITE_DATABASE_URIS gives the site a database of its own"""
+    return site_bind(site_id) in db.engines
+
+def create_site_database(site):
+    """Create the schema in the site's own database and record the site there, for its foreign keys.
+
+    Safe to run again; existing tables and rows are left alone.
+    """
+    engine = db.engines.get(site_bind(site.id))
+    if engine is None:
+        raise ValueError(f"Site {site.name} has no database in SITE_DATABASE_URIS")
+    db.metadata.create_all(engine)
+    table = Site.__table__
+    with engine.begin() as connection:
+        if connection.scalar(db.select(table.c.id).where(table.c.id == site.id)) is None:
+            connection.execute(table.insert().values(id=site.id, name=site.name, created_at=site.created_at))
@@ -0,0 +1,44 @@
+from App.models import User, Shift, UserShiftStats
+from App.database import db, read_replica, current_site_id
+
+STATS_BATCH_SIZE = 1000
+
+@read_replica
+def get_user_stats(user_id):
+    """Lifetime shift totals for a user, summed from their weekly rollup rows"""
+    total_shifts, completed_shifts, total_seconds = db.session.execute(
+        db.select(
+            db.func.coalesce(db.func.sum(UserShiftStats.total_shifts), 0),
+            db.func.coalesce(db.func.sum(UserShiftStats.completed_shifts), 0),
+            db.func.coalesce(db.func.sum(UserShiftStats.total_seconds), 0)
+        ).filter(UserShiftStats.user_id == user_id)
+    ).one()
+    return {
+        'total_shifts': total_shifts,
+        'completed_shifts': completed_shifts,
+        'total_hours': total_seconds / 3600
+    }
+
+@read_replica
+def get_user_weekly_stats(user_id):
+    query = db.select(UserShiftStats).filter_by(user_id=user_id).order_by(UserShiftStats.week_start)
+    return db.session.scalars(query).all()
+
+def rebuild_user_shift_stats(batch_size=STATS_BATCH_SIZE):
+    """Recompute the rollup of the session's site (or every site) from the shift table; returns the number of rows written"""
+    deltas = {}
+    rows = db.session.execute(
+        db.select(Shift.user_id, Shift.start_time, Shift.end_time, Shift.status)
+        .execution_options(yield_per=batch_size)
+    )
+    for row in rows:
+        UserShiftStats.add_shift(deltas, *row)
+    stale = db.delete(UserShiftStats)
+    site_id = current_site_id()
+    if site_id is not None:
+        # The rollup has no site of its own; its rows go with their users'
+        stale = stale.where(UserShiftStats.user_id.in_(db.select(User.id).filter_by(site_id=site_id)))
+    db.session.execute(stale)
+    UserShiftStats.apply(db.session.connection(), deltas)
+    db.session.commit()
+    return len(deltas)
@@ -0,0 +1,68 @@
+from sqlalchemy.orm.exc import StaleDataError
+
+from App.models import User, Shift, SwapRequest
+from App.database import db
+from .shift import find_conflicting_shift
+from .events import publish_event
+
+def _claim_swap_request(request_id, status):
+    """Move a pending request to status in one conditional UPDATE; False if it was not pending.
+
+    Only one of any number of concurrent callers can match the pending row,
+    and on SQLite the UPDATE also takes the write lock for the rest of the
+    transaction.
+    """
+    result = db.session.execute(
+        db.update(SwapRequest)
+        .where(SwapRequest.id == request_id, SwapRequest.status == 'pending')
+        .values(status=status, version=SwapRequest.version + 1)
+    )
+    return result.rowcount == 1
+
+def approve_swap(request_id):
+    """Approve a swap request and reassign its shift atomically, or raise ValueError.
+
+    The request is claimed first, then the shift and the new assignee are
+    locked (SELECT ... FOR UPDATE where supported) so the ownership and
+    conflict checks still hold when the shift is reassigned; the shift's
+    version column catches any writer that got in between.
+    """
+    swap_request = db.session.get(SwapRequest, request_id)
+    if not swap_request:
+        raise ValueError("Swap request not found")
+    try:
+        if not _claim_swap_request(request_id, 'approved'):
+            raise ValueError("Swap request already processed")
+        shift = db.session.get(Shift, swap_request.shift_id, with_for_update=True, populate_existing=True)
+        db.session.execute(db.select(User.id).filter_by(id=swap_request.to_user_id).with_for_update())
+        if shift.user_id != swap_request.from_user_id:
+            raise ValueError("Shift is no longer assigned to the requester")
+        if find_conflicting_shift(swap_request.to_user_id, shift.start_time, shift.end_time, exclude_shift_id=shift.id):
+            raise ValueError("Target user has conflicting shift")
+        shift.user_id = swap_request.to_user_id
+        publish_event('swap.approved', swap_id=request_id, shift_id=shift.id,
+                      from_user_id=swap_request.from_user_id, to_user_id=swap_request.to_user_id)
+        publish_event('shift.reassigned', shift_id=shift.id, user_id=shift.user_id, start_time=shift.start_time, end_time=shift.end_time)
+        db.session.commit()
+    except StaleDataError:
+        db.session.rollback()
+        raise ValueError("Shift was changed by someone else; try again")
+    except Exception:
+        db.session.rollback()
+        raise
+    return swap_request
+
+def reject_swap(request_id, reason=None):
+    """Reject a pending swap request, or raise ValueError"""
+    swap_request = db.session.get(SwapRequest, request_id)
+    if not swap_request:
+        raise ValueError("Swap request not found")
+    if not _claim_swap_request(request_id, 'rejected'):
+        db.session.rollback()
+        raise ValueError("Swap request already processed")
+    if reason:
+        swap_request.note = reason
+    publish_event('swap.rejected', swap_id=request_id, shift_id=swap_request.shift_id,
+                  from_user_id=swap_request.from_user_id, to_user_id=swap_request.to_user_id)
+    db.session.commit()
+    return swap_request
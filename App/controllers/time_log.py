@@ -0,0 +1,182 @@
+from datetime import datetime
+from sqlalchemy.dialects import postgresql, sqlite
+
+from App.models import Shift, TimeLog, TableVersion, UserShiftStats
+from App.database import db
+from .roster_cache import get_roster_cache, invalidate_shift_week
+from .events import publish_event
+
+
+class ClockError(ValueError):
+    """A clock in/out that cannot happen, with the HTTP status that describes it"""
+
+    def __init__(self, message, status=409):
+        super().__init__(message)
+        self.status = status
+
+
+def _clock_error(shift_id, user_id, clocking_in):
+    """Work out why a clock in/out changed nothing; only runs on the failure path"""
+    db.session.rollback()
+    shift = db.session.get(Shift, shift_id)
+    if not shift:
+        return ClockError("Shift not found", 404)
+    if shift.user_id != user_id:
+        return ClockError("This shift is not assigned to you", 403)
+    if not clocking_in:
+        return ClockError("Not currently clocked in to this shift")
+    time_log = db.session.scalars(db.select(TimeLog).filter_by(shift_id=shift_id, user_id=user_id)).first()
+    if time_log and time_log.is_open():
+        return ClockError("Already clocked in to this shift")
+    if time_log:
+        return ClockError("Already clocked out of this shift")
+    return ClockError("Shift is already completed")
+
+
+def _time_log(id, shift_id, user_id, clock_in, clock_out=None):
+    # Built from the statement's results rather than loaded again
+    time_log = TimeLog(shift_id, user_id)
+    time_log.id, time_log.clock_in, time_log.clock_out = id, clock_in, clock_out
+    return time_log
+
+
+def _invalidate_roster(shift_id):
+    # The shift's status changed by a Core UPDATE, which the roster
+    # snapshot flush hook never sees
+    if get_roster_cache():
+        invalidate_shift_week(shift_id)
+
+
+def _clock_in_row(shift_id, user_id, now):
+    # The log to insert, at the shift's site, if the shift is the user's and not yet completed
+    return db.select(Shift.id, Shift.user_id, Shift.site_id, db.literal(now)).where(
+        Shift.id == shift_id, Shift.user_id == user_id, Shift.status != 'completed'
+    )
+
+
+def _clock_in_postgresql(shift_id, user_id, now):
+    """Insert the log and move the shift to in_progress in a single statement"""
+    log = (
+        postgresql.insert(TimeLog)
+        .from_select(['shift_id', 'user_id', 'site_id', 'clock_in'], _clock_in_row(shift_id, user_id, now))
+        .on_conflict_do_nothing(index_elements=['shift_id', 'user_id'])
+        .returning(TimeLog.id, TimeLog.clock_in)
+        .cte('log')
+    )
+    moved = (
+        db.update(Shift.__table__).where(Shift.__table__.c.id == shift_id, db.exists(db.select(log.c.id)))
+        .values(status='in_progress', version=Shift.__table__.c.version + 1)
+        .returning(Shift.__table__.c.id)
+        .cte('moved')
+    )
+    # The writes ride in a SELECT, which the table version hooks cannot see
+    TableVersion.changed(db.session, TimeLog, Shift)
+    return db.session.execute(db.select(log.c.id, log.c.clock_in).add_cte(moved)).first()
+
+
+def _clock_in_sqlite(shift_id, user_id, now):
+    result = db.session.execute(
+        sqlite.insert(TimeLog.__table__)
+        .from_select(['shift_id', 'user_id', 'site_id', 'clock_in'], _clock_in_row(shift_id, user_id, now))
+        .on_conflict_do_nothing(index_elements=['shift_id', 'user_id'])
+    )
+    if result.rowcount != 1:
+        return None
+    db.session.execute(
+        db.update(Shift.__table__).where(Shift.__table__.c.id == shift_id)
+        .values(status='in_progress', version=Shift.__table__.c.version + 1)
+    )
+    return result.lastrowid, now
+
+
+def clock_in(shift_id, user_id):
+    """Clock a user in to their open shift, or raise ClockError.
+
+    The log insert and the shift's move to in_progress happen together in
+    one statement on Postgres (two in one transaction on SQLite, which has
+    no data-modifying CTEs), guarded by the unique (shift_id, user_id)
+    log index, so a double tap or a retry can clock in at most once.
+    Shifts already completed cannot be clocked in to again.
+    """
+    now = datetime.now()
+    if db.session.get_bind().dialect.name == 'postgresql':
+        row = _clock_in_postgresql(shift_id, user_id, now)
+    else:
+        row = _clock_in_sqlite(shift_id, user_id, now)
+    if not row:
+        raise _clock_error(shift_id, user_id, clocking_in=True)
+    publish_event('time_log.clock_in', time_log_id=row[0], shift_id=shift_id, user_id=user_id, clock_in=row[1])
+    publish_event('shift.status', shift_id=shift_id, user_id=user_id, status='in_progress')
+    db.session.commit()
+    _invalidate_roster(shift_id)
+    return _time_log(row[0], shift_id, user_id, row[1])
+
+
+def _open_log(shift_id, user_id):
+    return (
+        TimeLog.__table__.c.shift_id == shift_id, TimeLog.__table__.c.user_id == user_id,
+        TimeLog.__table__.c.clock_in.is_not(None), TimeLog.__table__.c.clock_out.is_(None),
+        TimeLog.__table__.c.shift_id.in_(db.select(Shift.id).where(Shift.id == shift_id, Shift.user_id == user_id))
+    )
+
+
+def _clock_out_postgresql(shift_id, user_id, now):
+    """Close the log, complete the shift and count it in the stats rollup in a single statement"""
+    shift, stats = Shift.__table__, UserShiftStats.__table__
+    log = (
+        db.update(TimeLog.__table__).where(*_open_log(shift_id, user_id)).values(clock_out=now)
+        .returning(TimeLog.__table__.c.id, TimeLog.__table__.c.clock_in, TimeLog.__table__.c.clock_out)
+        .cte('log')
+    )
+    moved = (
+        db.update(shift).where(shift.c.id == shift_id, shift.c.status != 'completed', db.exists(db.select(log.c.id)))
+        .values(status='completed', version=shift.c.version + 1)
+        .returning(shift.c.user_id, shift.c.start_time)
+        .cte('moved')
+    )
+    # Flush hooks never see this change, so bump completed_shifts here
+    counted = postgresql.insert(stats).from_select(
+        ['user_id', 'week_start', 'total_shifts', 'completed_shifts', 'total_seconds'],
+        db.select(moved.c.user_id, db.cast(db.func.date_trunc('week', moved.c.start_time), db.Date),
+                  db.literal(0), db.literal(1), db.literal(0))
+    )
+    counted = counted.on_conflict_do_update(
+        index_elements=[stats.c.user_id, stats.c.week_start],
+        set_={'completed_shifts': stats.c.completed_shifts + 1}
+    ).cte('counted')
+    TableVersion.changed(db.session, TimeLog, Shift)
+    return db.session.execute(db.select(log.c.id, log.c.clock_in, log.c.clock_out).add_cte(moved, counted)).first()
+
+
+def _clock_out_sqlite(shift_id, user_id, now):
+    result = db.session.execute(db.update(TimeLog.__table__).where(*_open_log(shift_id, user_id)).values(clock_out=now))
+    if result.rowcount != 1:
+        return None
+    shift = Shift.__table__
+    moved = db.session.execute(
+        db.update(shift).where(shift.c.id == shift_id, shift.c.status != 'completed')
+        .values(status='completed', version=shift.c.version + 1)
+    )
+    if moved.rowcount:
+        shift_user_id, start_time = db.session.execute(db.select(shift.c.user_id, shift.c.start_time).where(shift.c.id == shift_id)).one()
+        UserShiftStats.apply(db.session.connection(), {(shift_user_id, UserShiftStats.week_of(start_time)): [0, 1, 0]})
+    return db.session.execute(
+        db.select(TimeLog.__table__.c.id, TimeLog.__table__.c.clock_in, TimeLog.__table__.c.clock_out)
+        .where(TimeLog.__table__.c.shift_id == shift_id, TimeLog.__table__.c.user_id == user_id)
+    ).one()
+
+
+def clock_out(shift_id, user_id):
+    """Clock a user out of their shift and complete it, or raise ClockError"""
+    now = datetime.now()
+    if db.session.get_bind().dialect.name == 'postgresql':
+        row = _clock_out_postgresql(shift_id, user_id, now)
+    else:
+        row = _clock_out_sqlite(shift_id, user_id, now)
+    if not row:
+        raise _clock_error(shift_id, user_id, clocking_in=False)
+    publish_event('time_log.clock_out', time_log_id=row[0], shift_id=shift_id, user_id=user_id, clock_in=row[1], clock_out=row[2])
+    publish_event('shift.status', shift_id=shift_id, user_id=user_id, status='completed')
+    db.session.commit()
+    _invalidate_roster(shift_id)
+    return _time_log(row[0], shift_id, user_id, row[1], row[2])
@@ -0,0 +1,100 @@
+from datetime import datetime, time, timedelta
+
+from App.models import User, Shift, TimeLog
+from App.database import db, read_replica
+
+TIMESHEET_PERIODS = ('day', 'week', 'month')
+TIMESHEET_COLUMNS = [
+    'user_id', 'username', 'period', 'shifts', 'worked_shifts', 'late_shifts',
+    'scheduled_minutes', 'worked_minutes', 'late_minutes', 'early_leave_minutes',
+    'overtime_minutes', 'variance_minutes'
+]
+
+def _np():
+    # NumPy is only imported by the commands and views that build timesheets
+    import numpy
+    return numpy
+
+def _timesheet_columns(start_date, end_date, user_id=None):
+    """Scheduled and clocked times for every shift starting in the range, fetched in one query"""
+    np = _np()
+    query = (
+        db.select(
+            db.func.coalesce(TimeLog.user_id, Shift.user_id),
+            Shift.start_time, Shift.end_time, TimeLog.clock_in, TimeLog.clock_out
+        )
+        .outerjoin(TimeLog, TimeLog.shift_id == Shift.id)
+        .filter(
+            Shift.start_time >= datetime.combine(start_date, time.min),
+            Shift.start_time < datetime.combine(end_date + timedelta(days=1), time.min)
+        )
+    )
+    if user_id is not None:
+        query = query.filter(db.func.coalesce(TimeLog.user_id, Shift.user_id) == user_id)
+    rows = db.session.execute(query).all()
+    if not rows:
+        return None
+    user_ids, starts, ends, clock_ins, clock_outs = zip(*rows)
+    return (
+        np.array(user_ids, dtype=np.int64),
+        *[np.array(values, dtype='datetime64[s]') for values in (starts, ends, clock_ins, clock_outs)]
+    )
+
+def _period_keys(starts, period):
+    np = _np()
+    if period == 'month':
+        return starts.astype('datetime64[M]').astype(np.int64)
+    days = starts.astype('datetime64[D]').astype(np.int64)
+    if period == 'week':
+        # 1970-01-01 was a Thursday; step back to the Monday of each ISO week
+        days = days - (days + 3) % 7
+    return days
+
+def _period_label(key, period):
+    return str(_np().datetime64(int(key), 'M' if period == 'month' else 'D'))
+
+def _seconds(values):
+    return values.astype(_np().int64)
+
+@read_replica
+def get_timesheet(start_date, end_date, user_id=None, period='week'):
+    """Scheduled vs worked minutes, lateness, early leave and overtime per user and period.
+
+    All arithmetic runs over NumPy arrays of the whole range at once; shifts
+    nobody clocked in to count as scheduled time with nothing worked.
+    """
+    np = _np()
+    columns = _timesheet_columns(start_date, end_date, user_id)
+    if columns is None:
+        return []
+    user_ids, starts, ends, clock_ins, clock_outs = columns
+    clocked_in = ~np.isnat(clock_ins)
+    clocked_out = clocked_in & ~np.isnat(clock_outs)
+    zero = np.zeros(len(user_ids), dtype=np.int64)
+
+    scheduled = _seconds(ends) - _seconds(starts)
+    worked = np.where(clocked_out, _seconds(clock_outs) - _seconds(clock_ins), zero)
+    late = np.where(clocked_in, np.maximum(_seconds(clock_ins) - _seconds(starts), 0), zero)
+    early_leave = np.where(clocked_out, np.maximum(_seconds(ends) - _seconds(clock_outs), 0), zero)
+    overtime = np.where(clocked_out, np.maximum(worked - scheduled, 0), zero)
+
+    groups, inverse = np.unique(
+        np.stack([user_ids, _period_keys(starts, period)], axis=1), axis=0, return_inverse=True
+    )
+    inverse = inverse.ravel()
+    counts = {
+        'shifts': np.ones(len(user_ids)), 'worked_shifts': clocked_out, 'late_shifts': late > 0,
+        'scheduled_minutes': scheduled, 'worked_minutes': worked, 'late_minutes': late,
+        'early_leave_minutes': early_leave, 'overtime_minutes': overtime, 'variance_minutes': worked - scheduled
+    }
+    for name, values in counts.items():
+        totals = np.bincount(inverse, weights=values.astype(np.float64), minlength=len(groups))
+        counts[name] = np.rint(totals / 60 if name.endswith('_minutes') else totals).astype(np.int64)
+
+    usernames = dict(db.session.execute(db.select(User.id, User.username).filter(User.id.in_(np.unique(user_ids).tolist()))).all())
+    timesheet = []
+    for index, (group_user_id, key) in enumerate(groups.tolist()):
+        row = {'user_id': group_user_id, 'username': usernames.get(group_user_id), 'period': _period_label(key, period)}
+        row.update({name: int(values[index]) for name, values in counts.items()})
+        timesheet.append(row)
+    return timesheet
@@ -1,5 +1,6 @@
 from App.models import User
-from App.database import db
+from App.database import db, read_replica
+from .pagination import DEFAULT_PAGE_SIZE, keyset_page
 
 def create_user(username, password, role='staff'):
     newuser = User(username=username, password=password, role=role)
@@ -14,9 +15,11 @@ def get_user_by_username(username):
 def get_user(id):
     return db.session.get(User, id)
 
+@read_replica
 def get_all_users():
     return db.session.scalars(db.select(User)).all()
 
+@read_replica
 def get_all_users_json():
     users = get_all_users()
     if not users:
@@ -24,6 +27,10 @@ def get_all_users_json():
     users = [user.get_json() for user in users]
     return users
 
+@read_replica
+def get_users_page(limit=DEFAULT_PAGE_SIZE, cursor=None):
+    return keyset_page(db.select(User), [User.id], limit, cursor)
+
 def update_user(id, username):
     user = get_user(id)
     if user:
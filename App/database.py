@@ -1,14 +1,277 @@
+import functools
+import inspect
+import threading
+import time
+from contextlib import contextmanager
 from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
+from flask_sqlalchemy.session import Session
+from sqlalchemy import Select, Table, create_engine, exc, inspect as inspect_mapper, text
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.sql.dml import UpdateBase
 
 
-db = SQLAlchemy()
+# The SQLALCHEMY_BINDS key App.config gives REPLICA_DATABASE_URI
+REPLICA_BIND = 'replica'
+# Tables every site shares; they stay on the primary even while the session
+# is scoped to a site with a database of its own
+SHARED_TABLES = frozenset(('site', 'job', 'change_event'))
+
+
+def site_bind(site_id):
+    """The SQLALCHEMY_BINDS key App.config gives a site listed in SITE_DATABASE_URIS"""
+    return f'site_{site_id}'
+
+
+def _shared(mapper, clause):
+    if mapper is not None:
+        return inspect_mapper(mapper).local_table.name in SHARED_TABLES
+    table = clause.table if isinstance(clause, UpdateBase) else clause
+    return isinstance(table, Table) and table.name in SHARED_TABLES
+
+
+class RoutingSession(Session):
+    """Sends the SELECTs of read_replica() calls to the replica bind and everything else to the primary.
+
+    Once the session writes (a flush, or an UPDATE/INSERT/DELETE statement)
+    it reads from the primary too, so a request sees its own writes even
+    before the replica catches up. Each request starts with a new session,
+    or clear_replica_stickiness() where the app context outlives requests.
+
+    While the session is scoped to a site with a database of its own (see
+    set_site), everything but the SHARED_TABLES goes to that database.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        site_id = self.info.get('site_id')
+        if bind is None and site_id is not None:
+            engine = self._db.engines.get(site_bind(site_id))
+            if engine is not None and not _shared(mapper, clause):
+                return engine
+        if (bind is None and self.info.get('read_replica') and not self.info.get('read_your_writes')
+                and not self._flushing and isinstance(clause, Select) and clause._for_update_arg is None):
+            replica = self._db.engines.get(REPLICA_BIND)
+            if replica is not None:
+                return replica
+        if self._flushing or (clause is not None and not isinstance(clause, Select)):
+            self.info['read_your_writes'] = True
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+
+@contextmanager
+def replica_reads():
+    info = db.session.info
+    info['read_replica'] = info.get('read_replica', 0) + 1
+    try:
+        yield
+    finally:
+        info['read_replica'] -= 1
+
+
+def read_replica(func):
+    """Run a read-only controller's queries on the replica when one is configured"""
+    if inspect.isgeneratorfunction(func):
+        @functools.wraps(func)
+        def generator(*args, **kwargs):
+            with replica_reads():
+                yield from func(*args, **kwargs)
+        return generator
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with replica_reads():
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def clear_replica_stickiness():
+    db.session.info.pop('read_your_writes', None)
+
+
+def set_site(site_id):
+    """Scope the session to one site, or to every site with None.
+
+    ORM queries then only see that site's rows, new rows join it, and a
+    site listed in SITE_DATABASE_URIS is read and written in its own
+    database. Each request starts unscoped.
+    """
+    db.session.info['site_id'] = site_id
+
+
+def current_site_id():
+    return db.session.info.get('site_id')
+
+
+@contextmanager
+def site_scope(site_id):
+    previous = current_site_id()
+    set_site(site_id)
+    try:
+        yield
+    finally:
+        set_site(previous)
+
+
+def clear_site():
+    db.session.info.pop('site_id', None)
+
+# Postgres connections the pools of every web worker may hold between them,
+# and how many of max_connections to leave for migrations, psql and cron jobs
+DB_MAX_CONNECTIONS = 100
+DB_RESERVED_CONNECTIONS = 10
+DB_POOL_TIMEOUT = 10
+DB_POOL_RECYCLE = 1800
+DB_STATEMENT_TIMEOUT = 30000
 
 def get_migrate(app):
+    # Alembic is only needed by `flask db`, so it is imported on first use
+    from flask_migrate import Migrate
     return Migrate(app, db)
 
 def create_db():
     db.create_all()
     
 def init_db(app):
-    db.init_app(app)
\ No newline at end of file
+    db.init_app(app)
+    # create_app's app context can outlive a request, and with it the
+    # session and the last request's site
+    app.before_request(clear_site)
+    if REPLICA_BIND in (app.config.get('SQLALCHEMY_BINDS') or {}):
+        # Tests and the CLI keep one app context, and so one session, across requests
+        app.before_request(clear_replica_stickiness)
+
+
+class TimedQueuePool(QueuePool):
+    """A QueuePool that records how long each checkout waited for a connection"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            with self._stats_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - start
+            with self._stats_lock:
+                self.checkouts += 1
+                self.wait_seconds += waited
+                self.max_wait_seconds = max(self.max_wait_seconds, waited)
+
+
+def get_pool_stats(pool):
+    """Pool gauges, plus checkout wait counters when the pool is a TimedQueuePool"""
+    stats = {'pool': pool.__class__.__name__}
+    if isinstance(pool, QueuePool):
+        stats.update(size=pool.size(), checked_out=pool.checkedout(), overflow=max(pool.overflow(), 0))
+    if isinstance(pool, TimedQueuePool):
+        with pool._stats_lock:
+            stats.update(
+                checkouts=pool.checkouts,
+                timeouts=pool.timeouts,
+                wait_seconds_total=round(pool.wait_seconds, 6),
+                wait_seconds_max=round(pool.max_wait_seconds, 6),
+                wait_seconds_avg=round(pool.wait_seconds / pool.checkouts, 6) if pool.checkouts else 0.0
+            )
+    return stats
+
+
+def pool_options(config, workers, greenlets):
+    """Pool sizing for one web worker when `workers` processes each run up to `greenlets` requests.
+
+    Every worker gets an equal share of the Postgres connections left after
+    the reserve, never more than it has greenlets to use them. Half the share
+    stays open in the pool and the rest is overflow that is closed again
+    when idle. Greenlets beyond the share wait for a connection for at most
+    DB_POOL_TIMEOUT seconds, which get_pool_stats reports.
+    """
+    available = config.get('DB_MAX_CONNECTIONS', DB_MAX_CONNECTIONS) - config.get('DB_RESERVED_CONNECTIONS', DB_RESERVED_CONNECTIONS)
+    share = max(min(available // max(workers, 1), greenlets), 1)
+    pool_size = max(share // 2, 1)
+    return {
+        'poolclass': TimedQueuePool,
+        'pool_size': pool_size,
+        'max_overflow': share - pool_size,
+        'pool_timeout': config.get('DB_POOL_TIMEOUT', DB_POOL_TIMEOUT),
+        # Drop connections Postgres or a proxy closed while they sat idle
+        'pool_pre_ping': True,
+        'pool_recycle': config.get('DB_POOL_RECYCLE', DB_POOL_RECYCLE)
+    }
+
+
+def postgres_engine_options(config, workers, greenlets):
+    options = pool_options(config, workers, greenlets)
+    options['connect_args'] = {
+        'options': f"-c statement_timeout={config.get('DB_STATEMENT_TIMEOUT', DB_STATEMENT_TIMEOUT)}"
+    }
+    return options
+
+
+def patch_psycopg2_for_gevent():
+    """Make psycopg2 yield to other greenlets while it waits on the server, as psycogreen does.
+
+    Without this a gevent worker stops serving every request while any one
+    of them waits for a query.
+    """
+    from gevent.socket import wait_read, wait_write
+    from psycopg2 import extensions, OperationalError
+
+    def gevent_wait_callback(conn, timeout=None):
+        while True:
+            state = conn.poll()
+            if state == extensions.POLL_OK:
+                break
+            elif state == extensions.POLL_READ:
+                wait_read(conn.fileno(), timeout=timeout)
+            elif state == extensions.POLL_WRITE:
+                wait_write(conn.fileno(), timeout=timeout)
+            else:
+                raise OperationalError(f"Bad result from poll: {state!r}")
+
+    extensions.set_wait_callback(gevent_wait_callback)
+
+
+def run_pool_load_test(uri, options, concurrency, requests, hold_seconds):
+    """Run `requests` checkouts from `concurrency` threads against a new engine built with options.
+
+    Each checkout holds its connection for hold_seconds (pg_sleep on
+    Postgres, a sleep on SQLite) to stand in for a request's queries.
+    Returns the elapsed time, errors and the pool's wait stats.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    engine = create_engine(uri, **options)
+    postgres = engine.dialect.name == 'postgresql'
+    errors = []
+
+    def checkout(_):
+        try:
+            with engine.connect() as conn:
+                if postgres:
+                    conn.execute(text("SELECT pg_sleep(:seconds)"), {'seconds': hold_seconds})
+                else:
+                    conn.execute(text("SELECT 1"))
+                    time.sleep(hold_seconds)
+        except Exception as e:
+            errors.append(e)
+
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(checkout, range(requests)))
+        stats = get_pool_stats(engine.pool)
+    finally:
+        engine.dispose()
+    stats.update(elapsed_seconds=round(time.perf_counter() - start, 3), requests=requests, concurrency=concurrency, errors=len(errors))
+    return stats
@@ -0,0 +1,205 @@
+import heapq
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import Lock
+
+import click
+from flask import current_app, g, request
+from flask.cli import AppGroup
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from App.database import db, get_pool_stats
+
+# Slowest statements kept per request or command, and how much of each to keep
+SLOWEST_STATEMENTS = 5
+STATEMENT_PREVIEW = 200
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar('query_stats', default=None)
+
+# Per-endpoint totals for /metrics: requests, statements, db seconds,
+# request seconds, most statements in one request, slowest statement
+_endpoints = {}
+_endpoints_lock = Lock()
+
+# Requests that ran more statements than their view's query_budget; only
+# collected while app.testing, for the pytest plugin in App/tests/conftest.py
+budget_violations = []
+
+
+class QueryStats:
+    """Statements run, time spent in the database and the slowest statements, for one request or command"""
+
+    def __init__(self):
+        self.statements = 0
+        self.db_seconds = 0.0
+        self.slowest = []
+        self.started = time.perf_counter()
+
+    def record(self, statement, seconds):
+        self.statements += 1
+        self.db_seconds += seconds
+        entry = (seconds, self.statements, ' '.join(statement.split())[:STATEMENT_PREVIEW])
+        if len(self.slowest) < SLOWEST_STATEMENTS:
+            heapq.heappush(self.slowest, entry)
+        elif seconds > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, entry)
+
+    def slowest_statements(self):
+        return [(seconds, statement) for seconds, _, statement in sorted(self.slowest, reverse=True)]
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+
+@contextmanager
+def query_stats():
+    """Record every statement run in this thread (or greenlet) inside the block"""
+    stats = QueryStats()
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    started = conn.info.get('query_started')
+    if stats is not None and started:
+        stats.record(statement, time.perf_counter() - started.pop())
+
+
+def query_budget(limit):
+    """Declare the most SQL statements one request to the view may run"""
+    def decorator(view):
+        view.query_budget = limit
+        return view
+    return decorator
+
+
+def _start_request():
+    g._query_stats_token = _current.set(QueryStats())
+
+
+def _finish_request(response):
+    stats = _current.get()
+    if stats is None:
+        return response
+    endpoint = request.endpoint or 'unmatched'
+    with _endpoints_lock:
+        totals = _endpoints.setdefault(endpoint, {
+            'requests': 0, 'statements': 0, 'db_seconds': 0.0, 'seconds': 0.0,
+            'max_statements': 0, 'slowest_seconds': 0.0, 'slowest_statement': ''
+        })
+        totals['requests'] += 1
+        totals['statements'] += stats.statements
+        totals['db_seconds'] += stats.db_seconds
+        totals['seconds'] += stats.elapsed()
+        totals['max_statements'] = max(totals['max_statements'], stats.statements)
+        if stats.slowest:
+            seconds, statement = stats.slowest_statements()[0]
+            if seconds > totals['slowest_seconds']:
+                totals['slowest_seconds'], totals['slowest_statement'] = seconds, statement
+    response.headers['Server-Timing'] = f'db;desc="{stats.statements} statements";dur={stats.db_seconds * 1000:.1f}'
+
+    view = current_app.view_functions.get(request.endpoint)
+    budget = getattr(view, 'query_budget', None)
+    if budget is not None and stats.statements > budget:
+        message = f"{request.method} {request.path} ran {stats.statements} SQL statements, over its budget of {budget}"
+        if current_app.testing:
+            budget_violations.append((message, stats.slowest_statements()))
+        logger.warning(message)
+    return response
+
+
+def _end_request(error=None):
+    token = g.pop('_query_stats_token', None)
+    if token is not None:
+        _current.reset(token)
+
+
+def init_instrumentation(app):
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.teardown_request(_end_request)
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' ')
+
+
+def render_metrics():
+    """This worker's request, SQL and connection pool counters in the Prometheus text format"""
+    with _endpoints_lock:
+        endpoints = {endpoint: dict(totals) for endpoint, totals in _endpoints.items()}
+    metrics = [
+        ('roster_requests_total', 'counter', 'Requests served', 'requests'),
+        ('roster_request_seconds_total', 'counter', 'Time spent serving requests', 'seconds'),
+        ('roster_db_statements_total', 'counter', 'SQL statements run by requests', 'statements'),
+        ('roster_db_seconds_total', 'counter', 'Time requests spent waiting on SQL statements', 'db_seconds'),
+        ('roster_db_statements_max', 'gauge', 'Most SQL statements run by one request', 'max_statements'),
+    ]
+    lines = []
+    for name, kind, help_text, key in metrics:
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+        lines += [f'{name}{{endpoint="{_label(endpoint)}"}} {totals[key]}' for endpoint, totals in sorted(endpoints.items())]
+    lines += ['# HELP roster_db_slowest_statement_seconds Slowest SQL statement seen per endpoint',
+              '# TYPE roster_db_slowest_statement_seconds gauge']
+    lines += [
+        f'roster_db_slowest_statement_seconds{{endpoint="{_label(endpoint)}",statement="{_label(totals["slowest_statement"])}"}} {totals["slowest_seconds"]:.6f}'
+        for endpoint, totals in sorted(endpoints.items()) if totals['slowest_statement']
+    ]
+    pool = get_pool_stats(db.engine.pool)
+    for key in ('size', 'checked_out', 'overflow', 'checkouts', 'timeouts', 'wait_seconds_total', 'wait_seconds_max'):
+        if key in pool:
+            kind = 'counter' if key in ('checkouts', 'timeouts', 'wait_seconds_total') else 'gauge'
+            name = f'roster_db_pool_{key}' + ('_total' if key in ('checkouts', 'timeouts') else '')
+            lines += [f'# TYPE {name} {kind}', f'{name} {pool[key]}']
+    from App.controllers import get_roster_cache_stats
+    cache = get_roster_cache_stats()
+    if cache:
+        for key in ('hits', 'misses', 'invalidations'):
+            lines += [f'# TYPE roster_snapshot_cache_{key}_total counter',
+                      f'roster_snapshot_cache_{key}_total{{backend="{cache["backend"]}"}} {cache[key]}']
+    return '\n'.join(lines) + '\n'
+
+
+def _set_profile(ctx, param, value):
+    ctx.meta['profile'] = value
+
+
+class ProfiledGroup(AppGroup):
+    """An AppGroup with a --profile flag that reports the SQL cost of the command it runs"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.params.append(click.Option(
+            ['--profile'], is_flag=True, expose_value=False, is_eager=True, callback=_set_profile,
+            help='Report SQL statements, database time and the slowest statements afterwards'
+        ))
+
+    def invoke(self, ctx):
+        if not ctx.meta.get('profile'):
+            return super().invoke(ctx)
+        with query_stats() as stats:
+            try:
+                return super().invoke(ctx)
+            finally:
+                click.echo(click.style("=" * 60, fg='magenta', bold=True), err=True)
+                click.echo(click.style("PROFILE: ", fg='magenta', bold=True) + click.style(
+                    f"{stats.statements} statements, {stats.db_seconds * 1000:.1f}ms in the database, {stats.elapsed() * 1000:.1f}ms total", fg='white'), err=True)
+                for seconds, statement in stats.slowest_statements():
+                    click.echo(click.style(f"  {seconds * 1000:8.2f}ms ", fg='yellow') + click.style(statement, fg='white', dim=True), err=True)
+                click.echo(click.style("=" * 60, fg='magenta', bold=True), err=True)
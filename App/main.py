@@ -1,41 +1,45 @@
 import os
 from flask import Flask, render_template
-from flask_uploads import DOCUMENTS, IMAGES, TEXT, UploadSet, configure_uploads
-from flask_cors import CORS
-from werkzeug.utils import secure_filename
-from werkzeug.datastructures import  FileStorage
 
 from App.database import init_db
 from App.config import load_config
 
 
-from App.controllers import (
-    setup_jwt,
-    add_auth_context
-)
-
-from App.views import views, setup_admin
-
-
-
 def add_views(app):
+    from App.views import views
     for view in views:
         app.register_blueprint(view)
 
-def create_app(overrides={}):
-    app = Flask(__name__, static_url_path='/static')
-    load_config(app, overrides)
+def setup_web(app):
+    """Everything only the web server needs: CORS, request metrics, uploads, blueprints, JWT and the admin.
+
+    The imports live here so CLI commands, which never serve a request,
+    do not pay for loading Flask-Admin, Flask-Uploads and the views.
+    """
+    from flask_uploads import DOCUMENTS, IMAGES, TEXT, UploadSet, configure_uploads
+    from flask_cors import CORS
+    from App.controllers import setup_jwt, add_auth_context
+    from App.instrumentation import init_instrumentation
+    from App.views import setup_admin
+
     CORS(app)
+    init_instrumentation(app)
     add_auth_context(app)
     photos = UploadSet('photos', TEXT + DOCUMENTS + IMAGES)
     configure_uploads(app, photos)
     add_views(app)
-    init_db(app)
     jwt = setup_jwt(app)
     setup_admin(app)
     @jwt.invalid_token_loader
     @jwt.unauthorized_loader
     def custom_unauthorized_response(error):
         return render_template('401.html', error=error), 401
+
+def create_app(overrides={}, web=True):
+    app = Flask(__name__, static_url_path='/static')
+    load_config(app, overrides)
+    init_db(app)
+    if web:
+        setup_web(app)
     app.app_context().push()
-    return app
\ No newline at end of file
+    return app
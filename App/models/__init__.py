@@ -1,5 +1,11 @@
+from .table_version import *
+from .site import *
 from .user import *
 from .shift import *
 from .leave_request import *
 from .swap_request import *
-from .time_log import *
\ No newline at end of file
+from .time_log import *
+from .user_shift_stats import *
+from .idempotency_key import *
+from .change_event import *
+from .job import *
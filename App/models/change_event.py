@@ -0,0 +1,35 @@
+import json
+from App.database import db
+from .table_version import utcnow
+
+class ChangeEvent(db.Model):
+    """A roster change pushed to /api/events; the id doubles as the SSE event id clients resume from"""
+    __tablename__ = 'change_event'
+    __table_args__ = (
+        db.Index('ix_change_event_created_at', 'created_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(32), nullable=False)  # swap.approved, leave.rejected, time_log.clock_in, ...
+    payload = db.Column(db.Text, nullable=False)
+    # Streams scoped to a site skip other sites' events; None reaches every stream
+    site_id = db.Column(db.Integer, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=utcnow)
+
+    def __init__(self, kind, payload, site_id=None):
+        self.kind = kind
+        self.payload = self.dumps(payload)
+        self.site_id = site_id
+
+    @staticmethod
+    def dumps(payload):
+        return json.dumps(payload, default=str)
+
+    def get_json(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'data': json.loads(self.payload),
+            'site_id': self.site_id,
+            'created_at': self.created_at.isoformat()
+        }
@@ -0,0 +1,24 @@
+from datetime import datetime
+from App.database import db
+
+class IdempotencyKey(db.Model):
+    """The response to a request sent with an Idempotency-Key, replayed when the request is retried"""
+    __tablename__ = 'idempotency_key'
+    __table_args__ = (
+        db.Index('ix_idempotency_key_created_at', 'created_at'),
+    )
+
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    key = db.Column(db.String(255), primary_key=True)
+    request_path = db.Column(db.String(255), nullable=False)
+    # Both NULL while the request that claimed the key is still running
+    status_code = db.Column(db.Integer, nullable=True)
+    response_body = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+
+    def __init__(self, user_id, key, request_path, status_code=None, response_body=None):
+        self.user_id = user_id
+        self.key = key
+        self.request_path = request_path
+        self.status_code = status_code
+        self.response_body = response_body
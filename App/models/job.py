@@ -0,0 +1,56 @@
+import json
+from App.database import db
+from .table_version import utcnow
+
+class Job(db.Model):
+    """Heavy work queued by a request or command and run by `flask jobs worker`"""
+    __tablename__ = 'job'
+    __table_args__ = (
+        # Workers claim the oldest queued job
+        db.Index('ix_job_status_id', 'status', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(32), nullable=False)  # import_shifts, autogenerate, report, initialize
+    params = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, succeeded, failed
+    progress = db.Column(db.Integer, nullable=False, default=0)  # percent
+    result = db.Column(db.Text)
+    error = db.Column(db.Text)
+    # No foreign keys: initialize drops the users and sites but keeps the queue
+    user_id = db.Column(db.Integer, nullable=True)
+    # The site the job's work is scoped to, as the request that queued it was
+    site_id = db.Column(db.Integer, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    # Moved on by every progress report, so a job whose worker died can be spotted
+    updated_at = db.Column(db.DateTime, default=utcnow, onupdate=utcnow)
+
+    def __init__(self, kind, params, user_id=None, site_id=None):
+        self.kind = kind
+        self.params = self.dumps(params)
+        self.user_id = user_id
+        self.site_id = site_id
+        self.status = 'queued'
+        self.progress = 0
+
+    @staticmethod
+    def dumps(value):
+        return json.dumps(value, default=str)
+
+    def get_params(self):
+        return json.loads(self.params)
+
+    def get_json(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'progress': self.progress,
+            'result': json.loads(self.result) if self.result else None,
+            'error': self.error,
+            'created_at': self.created_at.isoformat(),
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
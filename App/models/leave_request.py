@@ -1,7 +1,14 @@
 from App.database import db
+from .table_version import utcnow
+from .site import SiteScoped
 
-class LeaveRequest(db.Model):
+class LeaveRequest(SiteScoped, db.Model):
     __tablename__ = 'leave_request'
+    __table_args__ = (
+        db.Index('ix_leave_request_site_status', 'site_id', 'status'),
+        # Overlap checks for one requester's leave against a date range
+        db.Index('ix_leave_request_requester_dates', 'requester_id', 'start_date', 'end_date'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     requester_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -11,6 +18,7 @@ class LeaveRequest(db.Model):
     type = db.Column(db.String(50), nullable=False)  # vacation, sick, personal, etc.
     status = db.Column(db.String(20), default='pending')  # pending, approved, rejected
     reason = db.Column(db.Text)
+    updated_at = db.Column(db.DateTime, default=utcnow, onupdate=utcnow)
     
     # Relationships
     requester = db.relationship('User', foreign_keys=[requester_id], backref='leave_requests_made')
@@ -1,12 +1,32 @@
 from App.database import db
+from .table_version import utcnow
+from .site import SiteScoped
 from datetime import datetime
 
-class Shift(db.Model):
+class Shift(SiteScoped, db.Model):
+    __table_args__ = (
+        # Conflict checks and per-user listings seek on (user_id, start_time)
+        # and read end_time from the index
+        db.Index('ix_shift_user_start_end', 'user_id', 'start_time', 'end_time'),
+        # Roster, report and API pages scan one site's date range in (start_time, id) order
+        db.Index('ix_shift_site_start_id', 'site_id', 'start_time', 'id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     start_time = db.Column(db.DateTime, nullable=False)
     end_time = db.Column(db.DateTime, nullable=False)
     status = db.Column(db.String(20), default='scheduled')  # scheduled, in_progress, completed
+    # Bumped on every ORM update, which only applies if the row still has the
+    # version that was read (StaleDataError otherwise)
+    version = db.Column(db.Integer, nullable=False, server_default='1')
+    # Set on insert and on every update, ORM or Core
+    updated_at = db.Column(db.DateTime, default=utcnow, onupdate=utcnow)
+    
+    # Relationships
+    user = db.relationship('User', backref='shifts')
+
+    __mapper_args__ = {'version_id_col': version}
     
     def __init__(self, user_id, start_time, end_time, status='scheduled'):
         self.user_id = user_id
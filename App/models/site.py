@@ -0,0 +1,73 @@
+from sqlalchemy import event
+from sqlalchemy.orm import Session, declared_attr, with_loader_criteria
+
+from App.database import db
+from .table_version import utcnow
+
+# Rows written outside a site scope, and every row from before sites existed,
+# belong to this site
+DEFAULT_SITE_ID = 1
+DEFAULT_SITE_NAME = 'main'
+
+class Site(db.Model):
+    """A location with its own staff, roster and requests"""
+    __tablename__ = 'site'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(64), nullable=False, unique=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=utcnow)
+
+    def __init__(self, name):
+        self.name = name
+
+    def get_json(self):
+        return {
+            'id': self.id,
+            'name': self.name
+        }
+
+
+class SiteScoped:
+    """Rows that belong to one site; a session scoped with set_site() only ever sees its own site's"""
+
+    @declared_attr
+    def site_id(cls):
+        return db.Column(db.Integer, db.ForeignKey('site.id'), nullable=False, default=DEFAULT_SITE_ID)
+
+
+def site_id_for(session):
+    """The site new rows written through session belong to"""
+    site_id = session.info.get('site_id')
+    return DEFAULT_SITE_ID if site_id is None else site_id
+
+
+@event.listens_for(Site.__table__, 'after_create')
+def _create_default_site(table, connection, **kw):
+    # The first row of a new table, so it gets id 1 on every database
+    connection.execute(table.insert().values(name=DEFAULT_SITE_NAME, created_at=utcnow()))
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _filter_by_site(orm_execute_state):
+    site_id = orm_execute_state.session.info.get('site_id')
+    if (site_id is None or not orm_execute_state.is_orm_statement
+            or orm_execute_state.execution_options.get('all_sites')):
+        return
+    if not (orm_execute_state.is_select or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    # Relationship and column loads inherit the criteria from the query that loaded the parent
+    if orm_execute_state.is_column_load or orm_execute_state.is_relationship_load:
+        return
+    orm_execute_state.statement = orm_execute_state.statement.options(
+        with_loader_criteria(SiteScoped, lambda cls: cls.site_id == site_id, include_aliases=True)
+    )
+
+
+@event.listens_for(Session, 'before_flush')
+def _assign_site(session, flush_context, instances):
+    site_id = session.info.get('site_id')
+    if site_id is None:
+        return
+    for obj in session.new:
+        if isinstance(obj, SiteScoped) and obj.site_id is None:
+            obj.site_id = site_id
@@ -1,19 +1,29 @@
 from App.database import db
+from .table_version import utcnow
+from .site import SiteScoped
 
-class SwapRequest(db.Model):
+class SwapRequest(SiteScoped, db.Model):
     __tablename__ = 'swap_request'
+    __table_args__ = (
+        db.Index('ix_swap_request_site_status', 'site_id', 'status'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
-    shift_id = db.Column(db.Integer, db.ForeignKey('shift.id'), nullable=False)
+    # NULL once the shift is taken off the roster (leave approval); the request is kept as history
+    shift_id = db.Column(db.Integer, db.ForeignKey('shift.id'), nullable=True)
     from_user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     to_user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     status = db.Column(db.String(20), default='pending')  # pending, approved, rejected
     note = db.Column(db.Text)
+    version = db.Column(db.Integer, nullable=False, server_default='1')
+    updated_at = db.Column(db.DateTime, default=utcnow, onupdate=utcnow)
     
     # Relationships
     shift = db.relationship('Shift', backref='swap_requests')
     from_user = db.relationship('User', foreign_keys=[from_user_id], backref='swap_requests_sent')
     to_user = db.relationship('User', foreign_keys=[to_user_id], backref='swap_requests_received')
+
+    __mapper_args__ = {'version_id_col': version}
     
     def __init__(self, shift_id, from_user_id, to_user_id, note=None):
         self.shift_id = shift_id
@@ -22,17 +32,6 @@ class SwapRequest(db.Model):
         self.note = note
         self.status = 'pending'
     
-    def approve(self):
-        """Approve the swap request and update the shift assignment"""
-        from App.models.shift import Shift
-        
-        self.status = 'approved'
-        
-        # Update the shift assignment
-        shift = Shift.query.get(self.shift_id)
-        if shift:
-            shift.user_id = self.to_user_id
-    
     def reject(self, reason=None):
         """Reject the swap request"""
         self.status = 'rejected'
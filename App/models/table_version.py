@@ -0,0 +1,82 @@
+from datetime import datetime, timezone
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from App.database import db
+
+# Tables whose writes bump their TableVersion row; the API's ETags and
+# Last-Modified headers are built from these
+VERSIONED_TABLES = frozenset(('user', 'shift', 'leave_request', 'swap_request', 'time_log'))
+
+def utcnow():
+    # Naive UTC, so stored times never jump back an hour when the clocks change
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+class TableVersion(db.Model):
+    """A change counter per table, bumped in the same transaction as the writes it counts"""
+
+    __tablename__ = 'table_version'
+
+    name = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=1)
+    changed_at = db.Column(db.DateTime, nullable=False, default=utcnow)
+
+    @staticmethod
+    def changed(session, *tables):
+        """Record writes the session cannot see for itself, e.g. DML inside a CTE"""
+        session.info.setdefault('changed_tables', set()).update(getattr(table, '__tablename__', table) for table in tables)
+
+    @classmethod
+    def bump(cls, connection, names, now=None):
+        """Add one to each table's counter with a single upsert; rows are taken in name order so bumps never deadlock"""
+        table = cls.__table__
+        rows = [dict(name=name, version=1, changed_at=now or utcnow()) for name in sorted(names)]
+        dialect = {'sqlite': sqlite, 'postgresql': postgresql}.get(connection.dialect.name)
+        if dialect:
+            insert = dialect.insert(table).values(rows)
+            connection.execute(insert.on_conflict_do_update(
+                index_elements=[table.c.name],
+                set_={'version': table.c.version + 1, 'changed_at': insert.excluded.changed_at}
+            ))
+            return
+        for row in rows:
+            result = connection.execute(
+                table.update().where(table.c.name == row['name'])
+                .values(version=table.c.version + 1, changed_at=row['changed_at'])
+            )
+            if result.rowcount == 0:
+                connection.execute(table.insert().values(**row))
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_flushed_tables(session, flush_context):
+    names = {
+        obj.__table__.name for obj in (*session.new, *session.deleted, *(obj for obj in session.dirty if session.is_modified(obj)))
+        if obj.__table__.name in VERSIONED_TABLES
+    }
+    if names:
+        TableVersion.changed(session, *names)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _collect_executed_tables(orm_execute_state):
+    # Core and bulk INSERT/UPDATE/DELETE statements never reach the flush
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        name = orm_execute_state.statement.table.name
+        if name in VERSIONED_TABLES:
+            TableVersion.changed(orm_execute_state.session, name)
+
+
+@event.listens_for(Session, 'before_commit')
+def _bump_table_versions(session):
+    # Commit flushes after this hook runs, so flush first to see everything
+    session.flush()
+    names = session.info.pop('changed_tables', None)
+    if names:
+        TableVersion.bump(session.connection(), names)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changed_tables(session):
+    session.info.pop('changed_tables', None)
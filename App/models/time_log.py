@@ -1,14 +1,22 @@
 from App.database import db
+from .table_version import utcnow
+from .site import SiteScoped
 from datetime import datetime
 
-class TimeLog(db.Model):
+class TimeLog(SiteScoped, db.Model):
     __tablename__ = 'time_log'
+    __table_args__ = (
+        # Clock in/out look up the log for (shift, user); one log each, so a
+        # double-tapped clock in cannot create a second
+        db.Index('ix_time_log_shift_user', 'shift_id', 'user_id', unique=True),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     shift_id = db.Column(db.Integer, db.ForeignKey('shift.id'), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     clock_in = db.Column(db.DateTime, nullable=True)
     clock_out = db.Column(db.DateTime, nullable=True)
+    updated_at = db.Column(db.DateTime, default=utcnow, onupdate=utcnow)
     
     # Relationships
     shift = db.relationship('Shift', backref='time_logs')
@@ -1,11 +1,35 @@
+from functools import lru_cache
+from flask import current_app, has_app_context
 from werkzeug.security import check_password_hash, generate_password_hash
 from App.database import db
+from .table_version import utcnow
+from .site import SiteScoped
+
+# werkzeug's own default; override with the PASSWORD_HASH_METHOD setting,
+# e.g. 'scrypt:32768:8:1' or 'pbkdf2:sha256:600000'
+DEFAULT_PASSWORD_HASH_METHOD = 'scrypt'
+
+def password_hash_method():
+    if has_app_context():
+        return current_app.config.get('PASSWORD_HASH_METHOD') or DEFAULT_PASSWORD_HASH_METHOD
+    return DEFAULT_PASSWORD_HASH_METHOD
+
+@lru_cache(maxsize=None)
+def _stored_method(method):
+    """The method prefix werkzeug writes for method, with its default parameters filled in"""
+    return generate_password_hash('', method).split('$', 1)[0]
+
+class User(SiteScoped, db.Model):
+    __table_args__ = (
+        # User listings page through one site in id order
+        db.Index('ix_user_site_id', 'site_id', 'id'),
+    )
 
-class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username =  db.Column(db.String(20), nullable=False, unique=True)
     password = db.Column(db.String(256), nullable=False)
     role = db.Column(db.String(20), nullable=False, default='staff')
+    updated_at = db.Column(db.DateTime, default=utcnow, onupdate=utcnow)
 
     def __init__(self, username, password, role='staff'):
         self.username = username
@@ -19,11 +43,19 @@ class User(db.Model):
             'role': self.role
         }
 
+    @staticmethod
+    def hash_password(password, method=None):
+        """Hash a password without touching any user; safe to run on a worker thread"""
+        return generate_password_hash(password, method or password_hash_method())
+
     def set_password(self, password):
         """Create hashed password."""
-        self.password = generate_password_hash(password)
-    
+        self.password = self.hash_password(password)
+
     def check_password(self, password):
         """Check hashed password."""
         return check_password_hash(self.password, password)
 
+    def needs_rehash(self):
+        """Whether the stored hash was made with a method or cost other than the configured one"""
+        return self.password.split('$', 1)[0] != _stored_method(password_hash_method())
@@ -0,0 +1,94 @@
+from datetime import timedelta
+from sqlalchemy import event, inspect
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from App.database import db
+from .shift import Shift
+
+class UserShiftStats(db.Model):
+    """Per-user, per-ISO-week shift totals, kept in step with the shift table"""
+    __tablename__ = 'user_shift_stats'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    week_start = db.Column(db.Date, primary_key=True)  # Monday of the ISO week
+    total_shifts = db.Column(db.Integer, nullable=False, default=0)
+    completed_shifts = db.Column(db.Integer, nullable=False, default=0)
+    total_seconds = db.Column(db.Integer, nullable=False, default=0)
+
+    def __init__(self, user_id, week_start, total_shifts=0, completed_shifts=0, total_seconds=0):
+        self.user_id = user_id
+        self.week_start = week_start
+        self.total_shifts = total_shifts
+        self.completed_shifts = completed_shifts
+        self.total_seconds = total_seconds
+
+    def total_hours(self):
+        return self.total_seconds / 3600
+
+    @staticmethod
+    def week_of(moment):
+        """Monday of the ISO week containing moment"""
+        return (moment - timedelta(days=moment.weekday())).date()
+
+    @classmethod
+    def add_shift(cls, deltas, user_id, start_time, end_time, status, sign=1):
+        """Add (or with sign=-1 remove) one shift's contribution to a {(user_id, week_start): [...]} delta map"""
+        delta = deltas.setdefault((user_id, cls.week_of(start_time)), [0, 0, 0])
+        delta[0] += sign
+        delta[1] += sign if status == 'completed' else 0
+        delta[2] += sign * int((end_time - start_time).total_seconds())
+
+    @classmethod
+    def apply(cls, connection, deltas):
+        """Add deltas to the stored rows with atomic upserts, so concurrent workers never lose an update"""
+        table = cls.__table__
+        dialects = {'sqlite': sqlite, 'postgresql': postgresql}
+        for (user_id, week_start), (shifts, completed, seconds) in deltas.items():
+            if not (shifts or completed or seconds):
+                continue
+            values = dict(user_id=user_id, week_start=week_start, total_shifts=shifts, completed_shifts=completed, total_seconds=seconds)
+            dialect = dialects.get(connection.dialect.name)
+            if dialect:
+                insert = dialect.insert(table).values(**values)
+                connection.execute(insert.on_conflict_do_update(
+                    index_elements=[table.c.user_id, table.c.week_start],
+                    set_={name: table.c[name] + insert.excluded[name] for name in ('total_shifts', 'completed_shifts', 'total_seconds')}
+                ))
+                continue
+            result = connection.execute(
+                table.update()
+                .where(table.c.user_id == user_id, table.c.week_start == week_start)
+                .values(total_shifts=table.c.total_shifts + shifts, completed_shifts=table.c.completed_shifts + completed, total_seconds=table.c.total_seconds + seconds)
+            )
+            if result.rowcount == 0:
+                connection.execute(table.insert().values(**values))
+
+
+STATS_FIELDS = ('user_id', 'start_time', 'end_time', 'status')
+
+@event.listens_for(Session, 'before_flush')
+def _collect_user_shift_stats(session, flush_context, instances):
+    # Work out what this flush changes while the old rows are still stored
+    deltas = session.info['user_shift_stats'] = {}
+    changed = [
+        shift for shift in session.dirty
+        if isinstance(shift, Shift) and any(inspect(shift).attrs[name].history.has_changes() for name in STATS_FIELDS)
+    ]
+    deleted = [shift for shift in session.deleted if isinstance(shift, Shift)]
+    if changed or deleted:
+        table = Shift.__table__
+        stored = session.connection().execute(
+            db.select(*[table.c[name] for name in STATS_FIELDS])
+            .where(table.c.id.in_([shift.id for shift in changed + deleted]))
+        )
+        for row in stored:
+            UserShiftStats.add_shift(deltas, *row, sign=-1)
+    for shift in changed + [shift for shift in session.new if isinstance(shift, Shift)]:
+        UserShiftStats.add_shift(deltas, *[getattr(shift, name) for name in STATS_FIELDS])
+
+@event.listens_for(Session, 'after_flush')
+def _apply_user_shift_stats(session, flush_context):
+    deltas = session.info.pop('user_shift_stats', None)
+    if deltas:
+        UserShiftStats.apply(session.connection(), deltas)
@@ -1,6 +1,7 @@
 
-async function getUserData(){
-    const response = await fetch('/api/users');
+async function getUserData(cursor){
+    const url = cursor ? `/api/users?cursor=${encodeURIComponent(cursor)}` : '/api/users';
+    const response = await fetch(url);
     return response.json();
 }
 
@@ -15,8 +16,12 @@ function loadTable(users){
 }
 
 async function main(){
-    const users = await getUserData();
-    loadTable(users);
+    let cursor = null;
+    do {
+        const page = await getUserData(cursor);
+        loadTable(page.items);
+        cursor = page.next_cursor;
+    } while (cursor);
 }
 
 main();
\ No newline at end of file
@@ -0,0 +1,27 @@
+import pytest
+
+from App.instrumentation import budget_violations
+
+
+# Query budget plugin: views declare the most SQL statements a request may
+# run with @query_budget(n); a test whose requests go over fails
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', 'ignore_query_budget: do not fail the test when a view goes over its query budget')
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_runtest_setup(item):
+    del budget_violations[:]
+
+
+# Runs after the test itself, and only when it passed
+@pytest.hookimpl(trylast=True)
+def pytest_runtest_call(item):
+    violations, budget_violations[:] = list(budget_violations), []
+    if violations and not item.get_closest_marker('ignore_query_budget'):
+        report = []
+        for message, slowest in violations:
+            report.append(message)
+            report += [f"    {seconds * 1000:.2f}ms  {statement}" for seconds, statement in slowest]
+        pytest.fail("Query budget exceeded:\n" + "\n".join(report), pytrace=False)
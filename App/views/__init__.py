@@ -3,8 +3,15 @@
 from .user import user_views
 from .index import index_views
 from .auth import auth_views
+from .shift import shift_views
+from .leave import leave_views
+from .swap import swap_views
+from .time import time_views
+from .roster import roster_views
+from .events import event_views
+from .jobs import job_views
 from .admin import setup_admin
 
 
-views = [user_views, index_views, auth_views] 
+views = [user_views, index_views, auth_views, shift_views, leave_views, swap_views, time_views, roster_views, event_views, job_views] 
 # blueprints must be added to this list
\ No newline at end of file
@@ -4,17 +4,18 @@ from flask_admin import Admin
 from flask import flash, redirect, url_for, request
 from App.database import db
 from App.models import User
+from App.controllers import get_request_identity
 
 class AdminView(ModelView):
 
-    @jwt_required()
     def is_accessible(self):
-        return current_user is not None
+        # Flask-Admin asks once per menu entry; the identity is resolved once per request
+        return get_request_identity() is not None
 
     def inaccessible_callback(self, name, **kwargs):
         # redirect to login page if user doesn't have access
         flash("Login to access admin")
-        return redirect(url_for('index_page', next=request.url))
+        return redirect(url_for('index_views.index_page', next=request.url))
 
 def setup_admin(app):
     admin = Admin(app, name='FlaskMVC', template_mode='bootstrap3')
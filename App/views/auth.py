@@ -27,7 +27,7 @@ def identify_page():
 @auth_views.route('/login', methods=['POST'])
 def login_action():
     data = request.form
-    token = login(data['username'], data['password'])
+    token = login(data['username'], data['password'], data.get('site') or None)
     response = redirect(request.referrer)
     if not token:
         flash('Bad username or password given'), 401
@@ -50,7 +50,7 @@ API Routes
 @auth_views.route('/api/login', methods=['POST'])
 def user_login_api():
   data = request.json
-  token = login(data['username'], data['password'])
+  token = login(data['username'], data['password'], data.get('site'))
   if not token:
     return jsonify(message='bad username or password given'), 401
   response = jsonify(access_token=token) 
@@ -0,0 +1,27 @@
+from flask import Blueprint, Response, jsonify, request
+from flask_jwt_extended import jwt_required, current_user
+
+from App.controllers import open_event_stream
+
+event_views = Blueprint('event_views', __name__, template_folder='../templates')
+
+'''
+API Routes
+'''
+
+@event_views.route('/api/events', methods=['GET'])
+@jwt_required()
+def events_action():
+    # EventSource sends Last-Event-ID when it reconnects; the query string is for first connects
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        return jsonify(message='Last-Event-ID must be an event id'), 400
+    # Like /api/leave, only supervisors and admins see everyone's leave
+    user_id = None if current_user.role in ('admin', 'supervisor') else current_user.id
+    response = Response(open_event_stream(last_event_id, user_id), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Stop nginx-style proxies from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
@@ -1,5 +1,9 @@
-from flask import Blueprint, redirect, render_template, request, send_from_directory, jsonify
-from App.controllers import create_user, initialize
+from flask import Blueprint, Response, current_app, redirect, render_template, request, send_from_directory, jsonify
+from flask_jwt_extended import jwt_required, current_user
+from App.controllers import create_user, enqueue_initialize
+from App.database import db, get_pool_stats
+from App.instrumentation import render_metrics
+from .jobs import job_accepted
 
 index_views = Blueprint('index_views', __name__, template_folder='../templates')
 
@@ -7,11 +11,30 @@ index_views = Blueprint('index_views', __name__, template_folder='../templates')
 def index_page():
     return render_template('index.html')
 
-@index_views.route('/init', methods=['GET'])
+@index_views.route('/init', methods=['POST'])
+@jwt_required()
 def init():
-    initialize()
-    return jsonify(message='db initialized!')
+    # Wipes and reseeds the database; `flask init` sets up a new one
+    if current_user.role != 'admin':
+        return jsonify(message='admin access required'), 403
+    return job_accepted(enqueue_initialize())
 
 @index_views.route('/health', methods=['GET'])
 def health_check():
-    return jsonify({'status':'healthy'})
\ No newline at end of file
+    return jsonify({'status':'healthy'})
+
+@index_views.route('/api/pool-stats', methods=['GET'])
+@jwt_required()
+def pool_stats_action():
+    if current_user.role != 'admin':
+        return jsonify(message='admin access required'), 403
+    # This worker's pool only; each gunicorn worker keeps its own
+    return jsonify(get_pool_stats(db.engine.pool))
+
+@index_views.route('/metrics', methods=['GET'])
+def metrics_action():
+    # Open like /health unless METRICS_TOKEN is set for the scraper to send as a bearer token
+    token = current_app.config.get('METRICS_TOKEN')
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return jsonify(message='metrics token required'), 401
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,54 @@
+import os
+from flask import Blueprint, jsonify, send_file, url_for
+from flask_jwt_extended import jwt_required, current_user
+
+from App.controllers import get_job, job_result_path
+from App.instrumentation import query_budget
+
+job_views = Blueprint('job_views', __name__, template_folder='../templates')
+
+
+def job_accepted(job):
+    """The 202 for a queued job, pointing at where to poll it"""
+    response = jsonify(job_id=job.id, status=job.status, url=url_for('job_views.get_job_action', job_id=job.id))
+    response.status_code = 202
+    response.headers['Location'] = response.json['url']
+    return response
+
+'''
+API Routes
+'''
+
+def _visible_job(job_id):
+    """(job, None) for a job the current user may follow, else (None, error response)"""
+    job = get_job(job_id)
+    # Another site's jobs are not there as far as this user can tell
+    if not job or job.site_id not in (None, current_user.site_id):
+        return None, (jsonify(message='job not found'), 404)
+    if job.user_id != current_user.id and current_user.role != 'admin':
+        return None, (jsonify(message='you can only view your own jobs'), 403)
+    return job, None
+
+@job_views.route('/api/jobs/<int:job_id>', methods=['GET'])
+@query_budget(2)
+@jwt_required()
+def get_job_action(job_id):
+    job, error = _visible_job(job_id)
+    if error:
+        return error
+    body = job.get_json()
+    if job.kind == 'report' and job.status == 'succeeded':
+        body['download'] = url_for('job_views.get_job_result_action', job_id=job.id)
+    return jsonify(body)
+
+@job_views.route('/api/jobs/<int:job_id>/result.csv', methods=['GET'])
+@query_budget(2)
+@jwt_required()
+def get_job_result_action(job_id):
+    job, error = _visible_job(job_id)
+    if error:
+        return error
+    path = job_result_path(job.id)
+    if job.status != 'succeeded' or not os.path.exists(path):
+        return jsonify(message='job has no result file'), 404
+    return send_file(path, mimetype='text/csv', as_attachment=True, download_name=f'report-{job.id}.csv')
@@ -0,0 +1,27 @@
+from flask import Blueprint, Response, jsonify, request
+from flask_jwt_extended import jwt_required, current_user
+
+from App.controllers import (
+    get_leave_page,
+    iter_page_json,
+    page_filters
+)
+from App.instrumentation import query_budget
+
+leave_views = Blueprint('leave_views', __name__, template_folder='../templates')
+
+'''
+API Routes
+'''
+
+@leave_views.route('/api/leave', methods=['GET'])
+@query_budget(2)
+@jwt_required()
+def get_leave_requests_action():
+    if current_user.role not in ('admin', 'supervisor'):
+        return jsonify(message='supervisor or admin access required'), 403
+    try:
+        items, next_cursor = get_leave_page(**page_filters(request.args))
+    except ValueError as e:
+        return jsonify(message=str(e)), 400
+    return Response(iter_page_json(items, next_cursor), mimetype='application/json')
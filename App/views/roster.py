@@ -0,0 +1,38 @@
+from datetime import date
+from flask import Blueprint, Response, jsonify, render_template, request
+from flask_jwt_extended import jwt_required
+
+from App.controllers import conditional_get, get_roster_snapshot
+from App.instrumentation import query_budget
+from App.models import User, Shift, LeaveRequest
+
+roster_views = Blueprint('roster_views', __name__, template_folder='../templates')
+
+
+def _week_arg():
+    # Any day of the week will do; defaults to this week
+    return date.fromisoformat(request.args['week']) if 'week' in request.args else date.today()
+
+@roster_views.route('/roster', methods=['GET'])
+@jwt_required()
+def get_roster_page():
+    try:
+        week = _week_arg()
+    except ValueError:
+        return jsonify(message='week must be a date (YYYY-MM-DD)'), 400
+    return render_template('roster.html', roster_week=get_roster_snapshot(week, 'html'))
+
+'''
+API Routes
+'''
+
+@roster_views.route('/api/roster', methods=['GET'])
+@query_budget(4)
+@jwt_required()
+@conditional_get(Shift, LeaveRequest, User)
+def get_roster_action():
+    try:
+        week = _week_arg()
+    except ValueError:
+        return jsonify(message='week must be a date (YYYY-MM-DD)'), 400
+    return Response(get_roster_snapshot(week), mimetype='application/json')
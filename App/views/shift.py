@@ -0,0 +1,125 @@
+from datetime import date, datetime, timedelta
+from flask import Blueprint, Response, jsonify, request
+from flask_jwt_extended import jwt_required, current_user
+
+from App.controllers import (
+    check_roster_request,
+    clock_in,
+    clock_out,
+    conditional_get,
+    enqueue_job,
+    ClockError,
+    claim_idempotency_key,
+    release_idempotency_key,
+    save_idempotent_response,
+    get_shifts_page,
+    iter_page_json,
+    page_filters,
+    save_job_upload
+)
+from App.instrumentation import query_budget
+from .jobs import job_accepted
+from App.models import Shift
+
+shift_views = Blueprint('shift_views', __name__, template_folder='../templates')
+
+'''
+API Routes
+'''
+
+@shift_views.route('/api/shifts', methods=['GET'])
+@query_budget(3)
+@jwt_required()
+@conditional_get(Shift)
+def get_shifts_action():
+    try:
+        items, next_cursor = get_shifts_page(**page_filters(request.args))
+    except ValueError as e:
+        return jsonify(message=str(e)), 400
+    return Response(iter_page_json(items, next_cursor), mimetype='application/json')
+
+@shift_views.route('/api/shifts/bulk', methods=['POST'])
+@jwt_required()
+def bulk_import_shifts_action():
+    if current_user.role != 'admin':
+        return jsonify(message='admin access required'), 403
+    formats = {'text/csv': 'csv', 'application/json': 'json', 'application/x-ndjson': 'json'}
+    if request.mimetype not in formats:
+        return jsonify(message='expected a JSON list of shifts or a text/csv body'), 400
+    # Streamed to a file for the job rather than read into memory here
+    path = save_job_upload(request.stream)
+    return job_accepted(enqueue_job('import_shifts', {'path': path, 'format': formats[request.mimetype]}, current_user.id))
+
+@shift_views.route('/api/shifts/autogenerate', methods=['POST'])
+@jwt_required()
+def autogenerate_shifts_action():
+    if current_user.role != 'admin':
+        return jsonify(message='admin access required'), 403
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data.get('requirements'), list):
+        return jsonify(message='expected week_start and a list of requirements'), 400
+    try:
+        week_start = datetime.strptime(str(data.get('week_start')), '%Y-%m-%d').date()
+        check_roster_request(week_start, data['requirements'])
+    except ValueError as e:
+        return jsonify(message=str(e)), 400
+    try:
+        options = {key: float(data[key]) for key in ('max_hours', 'min_rest_hours') if key in data}
+    except (TypeError, ValueError):
+        return jsonify(message='max_hours and min_rest_hours must be numbers'), 400
+    params = dict(options, week_start=week_start.isoformat(), requirements=data['requirements'], dry_run=bool(data.get('dry_run')))
+    return job_accepted(enqueue_job('autogenerate', params, current_user.id))
+
+@shift_views.route('/api/shifts/report', methods=['POST'])
+@jwt_required()
+def shift_report_action():
+    if current_user.role != 'admin':
+        return jsonify(message='admin access required'), 403
+    data = request.get_json(silent=True) or {}
+    try:
+        start_date = date.fromisoformat(str(data.get('from')))
+        end_date = date.fromisoformat(str(data['to'])) if data.get('to') else start_date + timedelta(days=6)
+    except ValueError:
+        return jsonify(message='from (and optionally to) dates (YYYY-MM-DD) are required'), 400
+    params = {'start_date': start_date.isoformat(), 'end_date': end_date.isoformat()}
+    return job_accepted(enqueue_job('report', params, current_user.id))
+
+def _clock_action(action, shift_id):
+    """Run a clock in/out, replaying the stored response for a retried Idempotency-Key.
+
+    The key is claimed before the action runs, so of two requests racing
+    with one key only the first clocks; the other is told it is in progress.
+    """
+    key = request.headers.get('Idempotency-Key')
+    if key:
+        stored = claim_idempotency_key(current_user.id, key, request.path)
+        if stored:
+            request_path, status_code, body = stored
+            if request_path != request.path:
+                return jsonify(message='Idempotency-Key was already used for a different request'), 422
+            if status_code is None:
+                return jsonify(message='A request with this Idempotency-Key is still in progress'), 409
+            return Response(body, status=status_code, mimetype='application/json')
+    try:
+        body, status_code = action(shift_id, current_user.id).get_json(), 200
+    except ClockError as e:
+        body, status_code = {'message': str(e)}, e.status
+    except Exception:
+        if key:
+            release_idempotency_key(current_user.id, key)
+        raise
+    if key:
+        return Response(save_idempotent_response(current_user.id, key, status_code, body), status=status_code, mimetype='application/json')
+    return jsonify(body), status_code
+
+@shift_views.route('/api/shifts/<int:shift_id>/clock-in', methods=['POST'])
+@query_budget(9)
+@jwt_required()
+def clock_in_action(shift_id):
+    return _clock_action(clock_in, shift_id)
+
+@shift_views.route('/api/shifts/<int:shift_id>/clock-out', methods=['POST'])
+@query_budget(12)
+@jwt_required()
+def clock_out_action(shift_id):
+    return _clock_action(clock_out, shift_id)
@@ -0,0 +1,42 @@
+from flask import Blueprint, Response, jsonify, request
+from flask_jwt_extended import jwt_required, current_user
+
+from App.controllers import (
+    get_shift,
+    get_swaps_page,
+    iter_page_json,
+    page_filters,
+    suggest_swap_candidates,
+    SWAP_SUGGESTION_LIMIT
+)
+from App.instrumentation import query_budget
+
+swap_views = Blueprint('swap_views', __name__, template_folder='../templates')
+
+'''
+API Routes
+'''
+
+@swap_views.route('/api/swaps', methods=['GET'])
+@query_budget(2)
+@jwt_required()
+def get_swap_requests_action():
+    if current_user.role not in ('admin', 'supervisor'):
+        return jsonify(message='supervisor or admin access required'), 403
+    try:
+        items, next_cursor = get_swaps_page(**page_filters(request.args))
+    except ValueError as e:
+        return jsonify(message=str(e)), 400
+    return Response(iter_page_json(items, next_cursor), mimetype='application/json')
+
+@swap_views.route('/api/shifts/<int:shift_id>/swap-candidates', methods=['GET'])
+@query_budget(4)
+@jwt_required()
+def swap_candidates_action(shift_id):
+    shift = get_shift(shift_id)
+    if not shift:
+        return jsonify(message='shift not found'), 404
+    if shift.user_id != current_user.id and current_user.role not in ('admin', 'supervisor'):
+        return jsonify(message='you can only swap your own shifts'), 403
+    limit = min(request.args.get('limit', SWAP_SUGGESTION_LIMIT, type=int), 100)
+    return jsonify(suggest_swap_candidates(shift, limit))
@@ -0,0 +1,31 @@
+from datetime import date
+from flask import Blueprint, jsonify, request
+from flask_jwt_extended import jwt_required, current_user
+
+from App.controllers import (
+    get_timesheet,
+    TIMESHEET_PERIODS
+)
+from App.instrumentation import query_budget
+
+time_views = Blueprint('time_views', __name__, template_folder='../templates')
+
+'''
+API Routes
+'''
+
+@time_views.route('/api/timesheet', methods=['GET'])
+@query_budget(3)
+@jwt_required()
+def get_timesheet_action():
+    if current_user.role != 'admin':
+        return jsonify(message='admin access required'), 403
+    try:
+        start_date = date.fromisoformat(request.args['from'])
+        end_date = date.fromisoformat(request.args['to'])
+    except (KeyError, ValueError):
+        return jsonify(message='from and to dates (YYYY-MM-DD) are required'), 400
+    period = request.args.get('period', 'week')
+    if period not in TIMESHEET_PERIODS:
+        return jsonify(message=f"period must be one of {', '.join(TIMESHEET_PERIODS)}"), 400
+    return jsonify(get_timesheet(start_date, end_date, request.args.get('user_id', type=int), period))
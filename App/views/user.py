@@ -1,4 +1,4 @@
-from flask import Blueprint, render_template, jsonify, request, send_from_directory, flash, redirect, url_for
+from flask import Blueprint, Response, render_template, jsonify, request, send_from_directory, flash, redirect, url_for
 from flask_jwt_extended import jwt_required, current_user as jwt_current_user
 
 from.index import index_views
@@ -7,12 +7,20 @@ from App.controllers import (
     create_user,
     get_all_users,
     get_all_users_json,
+    get_users_page,
+    conditional_get,
+    iter_page_json,
     jwt_required
 )
+from App.instrumentation import query_budget
+from App.models import User
 
 user_views = Blueprint('user_views', __name__, template_folder='../templates')
 
+# Users are listed to logged-in users only; the token scopes the list to their site
+
 @user_views.route('/users', methods=['GET'])
+@jwt_required()
 def get_user_page():
     users = get_all_users()
     return render_template('users.html', users=users)
@@ -25,9 +33,15 @@ def create_user_action():
     return redirect(url_for('user_views.get_user_page'))
 
 @user_views.route('/api/users', methods=['GET'])
+@query_budget(3)
+@jwt_required()
+@conditional_get(User)
 def get_users_action():
-    users = get_all_users_json()
-    return jsonify(users)
+    try:
+        items, next_cursor = get_users_page(request.args.get('limit', type=int), request.args.get('cursor'))
+    except ValueError as e:
+        return jsonify(message=str(e)), 400
+    return Response(iter_page_json(items, next_cursor), mimetype='application/json')
 
 @user_views.route('/api/users', methods=['POST'])
 def create_user_endpoint():
@@ -1,4 +1,5 @@
 # gunicorn_config.py
+import os
 import multiprocessing
 
 # The socket to bind.
@@ -6,14 +7,29 @@ import multiprocessing
 bind = "0.0.0.0:8080"
 
 # The number of worker processes for handling requests.
-workers = 4
+# App/config.py sizes each worker's database pool from these two settings.
+workers = int(os.environ.get('WEB_CONCURRENCY', 4))
+
+# Every worker must see the others' roster snapshot invalidations, so
+# share the cache through a SQLite file rather than keep one per process.
+os.environ.setdefault('FLASK_ROSTER_CACHE', 'sqlite' if workers > 1 else 'memory')
 
 # Use the 'gevent' worker type for async performance.
 worker_class = 'gevent'
 
+# Requests (greenlets) each gevent worker runs at once.
+worker_connections = int(os.environ.get('WORKER_CONNECTIONS', 1000))
+
 # Log level
 loglevel = 'info'
 
 # Where to log to
 accesslog = '-'  # '-' means log to stdout
-errorlog = '-'  # '-' means log to stderr
\ No newline at end of file
+errorlog = '-'  # '-' means log to stderr
+
+def post_worker_init(worker):
+    # gevent has patched the standard library by now; psycopg2 talks to
+    # Postgres in C, so it needs its own wait callback to stop blocking
+    if worker_class == 'gevent':
+        from App.database import patch_psycopg2_for_gevent
+        patch_psycopg2_for_gevent()
@@ -1,42 +1,105 @@
-import click, pytest, sys, json, os
+import click, sys, json, os, csv, io, shlex, socket, socketserver, threading
+from contextlib import redirect_stdout, redirect_stderr
+from flask import current_app
 from flask.cli import with_appcontext, AppGroup
 from datetime import datetime, date, time, timedelta
+from time import perf_counter
 
-from App.database import db, get_migrate
-from App.models import User, Shift, LeaveRequest, SwapRequest, TimeLog
+from App.database import db, get_migrate, pool_options, postgres_engine_options, run_pool_load_test, set_site, site_scope
+from App.config import WEB_CONCURRENCY
+from App.instrumentation import ProfiledGroup
+from App.models import User, Shift, LeaveRequest, SwapRequest, TimeLog, DEFAULT_SITE_ID
 from App.main import create_app
-from App.controllers import ( create_user, get_all_users_json, get_all_users, initialize )
+from App.controllers import (
+    create_user, get_all_users_json, get_all_users, initialize, verify_password,
+    schedule_shift, find_conflicting_shift, import_shifts, read_shift_rows,
+    get_roster_shifts, get_leave_requests, get_swap_requests,
+    get_report_summary, iter_report_rows, iter_report_json, write_report_csv,
+    get_user_stats, rebuild_user_shift_stats,
+    get_timesheet, TIMESHEET_COLUMNS, TIMESHEET_PERIODS,
+    explain_hot_queries,
+    autogenerate_roster, MAX_WEEKLY_HOURS, MIN_REST_HOURS,
+    approve_leave, reject_leave, iter_leave_impact, LEAVE_IMPACT_COLUMNS,
+    suggest_swap_candidates, SWAP_SUGGESTION_LIMIT,
+    approve_swap, reject_swap, clock_in, clock_out,
+    iter_job_worker, get_job, JOBS_PROCESSES, JOBS_POLL_INTERVAL,
+    create_site, get_site_by_name, get_all_sites, has_own_database, create_site_database
+)
 
 
 # This commands file allow you to create convenient CLI commands for testing controllers
 
-app = create_app()
-migrate = get_migrate(app)
+# Flask commands that serve or inspect the web app; every other command gets
+# an app without the admin, uploads, CORS, JWT or blueprints
+WEB_COMMANDS = ('run', 'routes', 'shell')
+
+_app = None
+
+def serving_web():
+    """True unless this process is running one of our own flask CLI commands"""
+    if os.environ.get('FLASK_RUN_FROM_CLI') != 'true':
+        return True
+    ctx = click.get_current_context(silent=True)
+    return ctx is not None and ctx.info_name in WEB_COMMANDS
+
+def get_app():
+    """Build the app on first use, with the web extensions only when serving"""
+    global _app
+    if _app is None:
+        _app = create_app(web=serving_web())
+        get_migrate(_app)
+        for command in commands:
+            _app.cli.add_command(command)
+    return _app
+
+def __getattr__(name):
+    # gunicorn's wsgi:app and the flask CLI both look the app up by name,
+    # so importing this file alone creates nothing
+    if name == 'app':
+        return get_app()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # Session management for CLI authentication
 SESSION_FILE = 'cli_session.json'
+# Where `flask shell-session --serve` listens for batches of commands
+SESSION_SOCKET = 'cli_session.sock'
+
+# The session file's contents, read at most once per process so a
+# shell-session runs every command as the same user without rereading it
+_session_data = None
+
+def read_session():
+    global _session_data
+    if _session_data is None:
+        _session_data = {}
+        if os.path.exists(SESSION_FILE):
+            try:
+                with open(SESSION_FILE, 'r') as f:
+                    _session_data = json.load(f)
+            except:
+                pass
+    return _session_data
 
 def get_current_user():
-    """Get currently logged in user from session file"""
-    if not os.path.exists(SESSION_FILE):
-        return None
-    try:
-        with open(SESSION_FILE, 'r') as f:
-            session_data = json.load(f)
-            user_id = session_data.get('user_id')
-            if user_id:
-                return User.query.get(user_id)
-    except:
-        pass
+    """Get currently logged in user from session file; the command then only sees that user's site"""
+    session = read_session()
+    user_id = session.get('user_id')
+    if user_id:
+        set_site(session.get('site_id', DEFAULT_SITE_ID))
+        return User.query.get(user_id)
     return None
 
 def set_current_user(user):
     """Set current user in session file"""
+    global _session_data
+    _session_data = {'user_id': user.id, 'username': user.username, 'role': user.role, 'site_id': user.site_id}
     with open(SESSION_FILE, 'w') as f:
-        json.dump({'user_id': user.id, 'username': user.username, 'role': user.role}, f)
+        json.dump(_session_data, f)
 
 def clear_session():
     """Clear current session"""
+    global _session_data
+    _session_data = {}
     if os.path.exists(SESSION_FILE):
         os.remove(SESSION_FILE)
 
@@ -70,24 +133,77 @@ def require_role(required_roles):
 
 
 # This command creates and initializes the database
-@app.cli.command("init", help="Creates and initializes the database")
+@click.command("init", help="Creates and initializes the database")
+@with_appcontext
 def init():
     initialize()
     print('database intialized')
 
+# Flask resolves the Flask-Migrate `db` group before this file is imported,
+# so this lives at the top level rather than as `flask db explain`
+@click.command("explain", help="Show the database's query plans for the main CLI and API queries")
+@with_appcontext
+def explain_command():
+    try:
+        click.echo(click.style(f"Database: ", fg='yellow', bold=True) + click.style(f"{db.engine.dialect.name}", fg='white'))
+        for label, sql, plan in explain_hot_queries():
+            click.echo(click.style("=" * 60, fg='cyan', bold=True))
+            click.echo(click.style(label.upper(), fg='cyan', bold=True))
+            click.echo(click.style(sql, fg='white', dim=True))
+            for line in plan:
+                click.echo(click.style("  " + line, fg='green' if 'INDEX' in line.upper() else 'yellow'))
+        click.echo(click.style("=" * 60, fg='cyan', bold=True))
+        
+    except Exception as e:
+        click.echo(click.style("ERROR: ", fg='red', bold=True) + click.style(f"Error explaining queries: {e}", fg='white'))
+
+@click.command("loadtest", help="Check one web worker's connection pool for starvation under concurrent requests")
+@click.option("--workers", type=int, default=lambda: int(os.environ.get('WEB_CONCURRENCY', WEB_CONCURRENCY)), help="Web workers sharing the database (default: WEB_CONCURRENCY)")
+@click.option("--greenlets", type=int, default=100, show_default=True, help="Requests the worker runs at once")
+@click.option("--requests", "total", type=int, default=2000, show_default=True, help="Connection checkouts to make")
+@click.option("--hold-ms", type=float, default=20, show_default=True, help="How long each request keeps its connection")
+@with_appcontext
+def loadtest_command(workers, greenlets, total, hold_ms):
+    try:
+        uri = current_app.config['SQLALCHEMY_DATABASE_URI']
+        if db.engine.dialect.name == 'postgresql':
+            options = postgres_engine_options(current_app.config, workers, greenlets)
+        else:
+            options = pool_options(current_app.config, workers, greenlets)
+        click.echo(click.style("Database: ", fg='yellow', bold=True) + click.style(f"{db.engine.dialect.name}", fg='white'))
+        click.echo(click.style("Pool: ", fg='yellow', bold=True) + click.style(f"{options['pool_size']} + {options['max_overflow']} overflow, {options['pool_timeout']}s timeout, for {workers} workers x {greenlets} greenlets", fg='white'))
+        stats = run_pool_load_test(uri, options, greenlets, total, hold_ms / 1000)
+        click.echo("=" * 60)
+        for key, value in stats.items():
+            click.echo(f"{key:<20} {value}")
+        click.echo("=" * 60)
+        if stats['timeouts'] or stats['errors']:
+            click.echo(click.style("STARVED: ", fg='red', bold=True) + click.style(f"{stats['timeouts']} checkouts timed out, {stats['errors']} requests failed", fg='white'))
+        else:
+            click.echo(click.style("OK: ", fg='green', bold=True) + click.style(f"no checkout waited more than {stats['wait_seconds_max']:.3f}s", fg='white'))
+    except Exception as e:
+        click.echo(click.style("ERROR: ", fg='red', bold=True) + click.style(f"Error running load test: {e}", fg='white'))
+
 '''
 Authentication Commands
 '''
-auth_cli = AppGroup('auth', help='Authentication commands')
+auth_cli = ProfiledGroup('auth', help='Authentication commands')
 
 @auth_cli.command("login", help="Login to the system")
 @click.argument("username")
 @click.argument("password")
-def login_command(username, password):
+@click.option("--site", help="Site name; needed for sites with a database of their own")
+def login_command(username, password, site):
+    if site:
+        found = get_site_by_name(site)
+        if not found:
+            click.echo(click.style("ERROR: ", fg='red', bold=True) + click.style(f"Site {site} not found", fg='white'))
+            return
+        set_site(found.id)
     user = User.query.filter_by(username=username).first()
     
     # If user exists, check password normally
-    if user and user.check_password(password):
+    if user and verify_password(user, password):
         set_current_user(user)
         role_color = 'red' if user.role == 'admin' else 'green' if user.role == 'supervisor' else 'blue'
         click.echo(click.style("SUCCESS: ", fg='green', bold=True) + 
@@ -120,11 +236,10 @@ def logout_command():
 def whoami_command():
     user = get_current_user()
     if user:
-        click.echo(f"Current User: {user.username} ({user.role})")
+        click.echo(f"Current User: {user.username} ({user.role}) at site {user.site_id}")
     else:
         click.echo("ERROR: Not logged in")
 
-app.cli.add_command(auth_cli)
 
 
 
@@ -136,7 +251,7 @@ User Commands
 
 # create a group, it would be the first argument of the comand
 # eg : flask user <command>
-user_cli = AppGroup('user', help='User object commands') 
+user_cli = ProfiledGroup('user', help='User object commands') 
 
 # Then define the command and any parameters and annotate it with the group (@)
 @user_cli.command("create", help="Creates a user (Admin only)")
@@ -177,12 +292,11 @@ def list_user_command():
     except Exception as e:
         click.echo(f"ERROR: Error listing users: {e}")
 
-app.cli.add_command(user_cli) # add the group to the cli
 
 '''
 Shift Commands
 '''
-shift_cli = AppGroup('shift', help='Shift management commands')
+shift_cli = ProfiledGroup('shift', help='Shift management commands')
 
 @shift_cli.command("schedule", help="Schedule a staff member shift for the week (Admin only)")
 @click.argument("user_id", type=int)
@@ -212,35 +326,16 @@ def schedule_shift_command(user_id, shift_date, start_time, end_time):
             click.echo(click.style("ERROR: ", fg='red', bold=True) + click.style(f"User with ID {user_id} not found", fg='white'))
             return
             
-        # Check for scheduling conflicts
+        # Combine date and time
         start_datetime = datetime.combine(shift_date_obj, start_time_obj)
         end_datetime = datetime.combine(shift_date_obj, end_time_obj)
         
-        conflicting_shift = Shift.query.filter(
-            Shift.user_id == user_id,
-            Shift.start_time <= end_datetime,
-            Shift.end_time >= start_datetime
-        ).first()
-        
-        if conflicting_shift:
+        # Create shift, unless it conflicts with one already scheduled
+        shift = schedule_shift(user_id, start_datetime, end_datetime)
+        if not shift:
             click.echo(click.style("ERROR: ", fg='red', bold=True) + click.style(f"User already has a shift scheduled during this time", fg='white'))
             return
         
-        # Combine date and time
-        start_datetime = datetime.combine(shift_date_obj, start_time_obj)
-        end_datetime = datetime.combine(shift_date_obj, end_time_obj)
-        
-        # Create shift
-        shift = Shift(
-            user_id=user_id,
-            start_time=start_datetime,
-            end_time=end_datetime,
-            status='scheduled'
-        )
-        
-        db.session.add(shift)
-        db.session.commit()
-        
         user = User.query.get(user_id)
         click.echo("=" * 50)
         click.echo("SHIFT SCHEDULED")
@@ -253,11 +348,33 @@ def schedule_shift_command(user_id, shift_date, start_time, end_time):
     except Exception as e:
         click.echo(f"ERROR: Error scheduling shift: {e}")
 
+@shift_cli.command("import", help="Import many shifts from a CSV or JSON file (Admin only)")
+@click.argument("file", type=click.File('r'))
+@click.option("--format", "file_format", type=click.Choice(['csv', 'json']), help="File format (default: from file extension)")
+@require_role(['admin'])
+def import_shifts_command(file, file_format):
+    try:
+        if not file_format:
+            file_format = 'json' if file.name.endswith(('.json', '.jsonl')) else 'csv'
+        created, errors = import_shifts(read_shift_rows(file, file_format))
+        
+        click.echo(click.style("=" * 50, fg='green', bold=True))
+        click.echo(click.style("SHIFT IMPORT", fg='green', bold=True))
+        click.echo(click.style("=" * 50, fg='green', bold=True))
+        for row_number, error in errors:
+            click.echo(click.style(f"Row {row_number}: ", fg='red', bold=True) + click.style(f"{error}", fg='white'))
+        click.echo(click.style(f"Shifts Created: ", fg='yellow', bold=True) + click.style(f"{created}", fg='green', bold=True))
+        click.echo(click.style(f"Rows Rejected: ", fg='yellow', bold=True) + click.style(f"{len(errors)}", fg='red' if errors else 'white', bold=True))
+        click.echo(click.style("=" * 50, fg='green', bold=True))
+        
+    except Exception as e:
+        click.echo(click.style("ERROR: ", fg='red', bold=True) + click.style(f"Error importing shifts: {e}", fg='white'))
+
 @shift_cli.command("view", help="View combined roster of all staff")
 @require_login
 def view_roster_command():
     try:
-        shifts = Shift.query.all()
+        shifts = get_roster_shifts()
         if not shifts:
             click.echo("No shifts scheduled")
             return
@@ -267,7 +384,7 @@ def view_roster_command():
         click.echo(click.style("=" * 60, fg='magenta', bold=True))
         
         for shift in shifts:
-            user = User.query.get(shift.user_id)
+            user = shift.user
             click.echo(click.style(f"Date: ", fg='yellow', bold=True) + click.style(f"{shift.start_time.strftime('%Y-%m-%d')}", fg='white'))
             click.echo(click.style(f"Time: ", fg='yellow', bold=True) + click.style(f"{shift.start_time.strftime('%H:%M')} - {shift.end_time.strftime('%H:%M')}", fg='white'))
             role_color = 'red' if user.role == 'admin' else 'green' if user.role == 'supervisor' else 'blue'
@@ -281,21 +398,29 @@ def view_roster_command():
 
 @shift_cli.command("report", help="View shift report for the week (Admin only)")
 @click.argument("week_start")
+@click.option("--to", "end", help="Last day of the report (default: 6 days after week_start)")
+@click.option("--format", "output_format", type=click.Choice(['text', 'csv', 'json']), default='text', help="Output format")
 @require_role(['admin'])
-def shift_report_command(week_start):
+def shift_report_command(week_start, end, output_format):
     try:
         # Parse week start date
         start_date = datetime.strptime(week_start, '%Y-%m-%d').date()
         
-        # Calculate week end (6 days later)
-        from datetime import timedelta
-        end_date = start_date + timedelta(days=6)
+        # Calculate week end (6 days later) unless given
+        end_date = datetime.strptime(end, '%Y-%m-%d').date() if end else start_date + timedelta(days=6)
+        
+        # Totals are aggregated by the database; detail rows are streamed
+        summary = get_report_summary(start_date, end_date)
+        rows = iter_report_rows(start_date, end_date)
         
-        # Query shifts for the week
-        shifts = Shift.query.filter(
-            Shift.start_time >= datetime.combine(start_date, time.min),
-            Shift.start_time <= datetime.combine(end_date, time.max)
-        ).all()
+        if output_format == 'csv':
+            write_report_csv(rows, click.get_text_stream('stdout'))
+            return
+        if output_format == 'json':
+            for chunk in iter_report_json(rows, summary):
+                click.echo(chunk, nl=False)
+            click.echo()
+            return
         
         click.echo(click.style("=" * 60, fg='green', bold=True))
         click.echo(click.style("WEEKLY SHIFT REPORT", fg='green', bold=True))
@@ -303,37 +428,67 @@ def shift_report_command(week_start):
         click.echo(click.style(f"Report Period: ", fg='yellow', bold=True) + click.style(f"{start_date} to {end_date}", fg='white'))
         click.echo(click.style("=" * 60, fg='green', bold=True))
         
-        if not shifts:
+        if not summary['total_shifts']:
             click.echo(click.style("No shifts scheduled for this week", fg='yellow'))
             return
             
-        total_hours = 0
-        for shift in shifts:
-            user = User.query.get(shift.user_id)
-            duration = (shift.end_time - shift.start_time).total_seconds() / 3600
-            total_hours += duration
-            click.echo(click.style(f"Date: ", fg='yellow', bold=True) + click.style(f"{shift.start_time.strftime('%Y-%m-%d')}", fg='white'))
-            click.echo(click.style(f"Time: ", fg='yellow', bold=True) + click.style(f"{shift.start_time.strftime('%H:%M')} - {shift.end_time.strftime('%H:%M')}", fg='white'))
-            click.echo(click.style(f"Employee: ", fg='yellow', bold=True) + click.style(f"{user.username}", fg='cyan', bold=True))
-            click.echo(click.style(f"Duration: ", fg='yellow', bold=True) + click.style(f"{duration:.1f} hours", fg='magenta', bold=True))
+        for row in rows:
+            click.echo(click.style(f"Date: ", fg='yellow', bold=True) + click.style(f"{row['date']}", fg='white'))
+            click.echo(click.style(f"Time: ", fg='yellow', bold=True) + click.style(f"{row['start_time']} - {row['end_time']}", fg='white'))
+            click.echo(click.style(f"Employee: ", fg='yellow', bold=True) + click.style(f"{row['username']}", fg='cyan', bold=True))
+            click.echo(click.style(f"Duration: ", fg='yellow', bold=True) + click.style(f"{row['hours']:.1f} hours", fg='magenta', bold=True))
             click.echo(click.style("-" * 60, fg='white', dim=True))
             
         click.echo(click.style("=" * 60, fg='green', bold=True))
         click.echo(click.style("SUMMARY", fg='green', bold=True))
         click.echo(click.style("=" * 60, fg='green', bold=True))
-        click.echo(click.style(f"Total Scheduled Hours: ", fg='yellow', bold=True) + click.style(f"{total_hours:.1f}", fg='magenta', bold=True))
-        click.echo(click.style(f"Total Shifts: ", fg='yellow', bold=True) + click.style(f"{len(shifts)}", fg='magenta', bold=True))
+        for label, group in (("Employee", 'by_user'), ("Day", 'by_day'), ("Status", 'by_status')):
+            for key, (shifts, hours) in summary[group].items():
+                click.echo(click.style(f"{label} {key}: ", fg='yellow', bold=True) + click.style(f"{hours:.1f} hours", fg='magenta') + click.style(f" ({shifts} shifts)", fg='white'))
+            click.echo(click.style("-" * 60, fg='white', dim=True))
+        click.echo(click.style(f"Total Scheduled Hours: ", fg='yellow', bold=True) + click.style(f"{summary['total_hours']:.1f}", fg='magenta', bold=True))
+        click.echo(click.style(f"Total Shifts: ", fg='yellow', bold=True) + click.style(f"{summary['total_shifts']}", fg='magenta', bold=True))
         click.echo(click.style("=" * 60, fg='green', bold=True))
         
     except Exception as e:
         click.echo(f"ERROR: Error generating report: {e}")
 
-app.cli.add_command(shift_cli)
+@shift_cli.command("autogenerate", help="Generate a week of shifts from coverage requirements (Admin only)")
+@click.argument("week_start")
+@click.argument("requirements", type=click.File('r'))
+@click.option("--max-hours", type=float, default=MAX_WEEKLY_HOURS, show_default=True, help="Most hours anyone may work that week")
+@click.option("--min-rest", type=float, default=MIN_REST_HOURS, show_default=True, help="Fewest hours between two shifts")
+@click.option("--dry-run", is_flag=True, help="Show what would be scheduled without saving it")
+@require_role(['admin'])
+def autogenerate_command(week_start, requirements, max_hours, min_rest, dry_run):
+    try:
+        start_date = datetime.strptime(week_start, '%Y-%m-%d').date()
+        result = autogenerate_roster(start_date, json.load(requirements), max_hours, min_rest, dry_run=dry_run)
+        
+        click.echo(click.style("=" * 60, fg='green', bold=True))
+        click.echo(click.style("ROSTER AUTOGENERATE" + (" (DRY RUN)" if dry_run else ""), fg='green', bold=True))
+        click.echo(click.style("=" * 60, fg='green', bold=True))
+        click.echo(click.style(f"Week: ", fg='yellow', bold=True) + click.style(f"{start_date} to {start_date + timedelta(days=6)}", fg='white'))
+        click.echo(click.style(f"Slots Required: ", fg='yellow', bold=True) + click.style(f"{result['required']}", fg='white'))
+        click.echo(click.style(f"Shifts Generated: ", fg='yellow', bold=True) + click.style(f"{len(result['shifts'])}", fg='green', bold=True))
+        click.echo(click.style(f"Shifts Created: ", fg='yellow', bold=True) + click.style(f"{result['created']}", fg='green', bold=True))
+        if result['shortfall']:
+            click.echo(click.style("-" * 60, fg='white', dim=True))
+            click.echo(click.style("SHORTFALL", fg='red', bold=True))
+            for gap in result['shortfall']:
+                click.echo(click.style(f"{gap['date']} {gap['start_time']}-{gap['end_time']} ", fg='yellow', bold=True) +
+                          click.style(f"{gap['role']}: ", fg='white') +
+                          click.style(f"{gap['filled']}/{gap['required']} filled, {gap['missing']} missing", fg='red'))
+        click.echo(click.style("=" * 60, fg='green', bold=True))
+        
+    except Exception as e:
+        click.echo(click.style("ERROR: ", fg='red', bold=True) + click.style(f"Error generating roster: {e}", fg='white'))
+
 
 '''
 Time Tracking Commands  
 '''
-time_cli = AppGroup('time', help='Time tracking commands')
+time_cli = ProfiledGroup('time', help='Time tracking commands')
 
 @time_cli.command("in", help="Time in at start of shift (Staff)")
 @click.argument("shift_id", type=int)
@@ -341,34 +496,7 @@ time_cli = AppGroup('time', help='Time tracking commands')
 def time_in_command(shift_id):
     try:
         user = get_current_user()
-        shift = Shift.query.get(shift_id)
-        
-        if not shift:
-            click.echo(click.style("ERROR: ", fg='red', bold=True) + click.style("Shift not found", fg='white'))
-            return
-            
-        if shift.user_id != user.id:
-            click.echo(click.style("ERROR: ", fg='red', bold=True) + click.style("This shift is not assigned to you", fg='white'))
-            return
-        
-        # Check if already clocked in
-        existing_log = TimeLog.query.filter_by(shift_id=shift_id, user_id=user.id).first()
-        if existing_log and existing_log.is_open():
-            click.echo(click.style("ERROR: ", fg='red', bold=True) + click.style("Already clocked in to this shift", fg='white'))
-            return
-        
-        # Create or update time log
-        if not existing_log:
-            time_log = TimeLog(shift_id=shift_id, user_id=user.id)
-            db.session.add(time_log)
-        else:
-            time_log = existing_log
-            
-        time_log.clock_in_now()
-        
-        # Update shift status
-        shift.status = 'in_progress'
-        db.session.commit()
+        time_log = clock_in(shift_id, user.id)
         
         click.echo(click.style("=" * 40, fg='green', bold=True))
         click.echo(click.style("CLOCK IN SUCCESSFUL", fg='green', bold=True))
@@ -378,6 +506,8 @@ def time_in_command(shift_id):
         click.echo(click.style(f"Employee: ", fg='yellow', bold=True) + click.style(f"{user.username}", fg='white'))
         click.echo(click.style("=" * 40, fg='green', bold=True))
         
+    except ValueError as e:
+        click.echo(click.style("ERROR: ", fg='red', bold=True) + click.style(f"{e}", fg='white'))
     except Exception as e:
         click.echo(click.style("ERROR: ", fg='red', bold=True) + click.style(f"Error clocking in: {e}", fg='white'))
 
@@ -387,27 +517,7 @@ def time_in_command(shift_id):
 def time_out_command(shift_id):
     try:
         user = get_current_user()
-        shift = Shift.query.get(shift_id)
-        
-        if not shift:
-            click.echo(click.style("ERROR: ", fg='red', bold=True) + click.style("Shift not found", fg='white'))
-            return
-            
-        if shift.user_id != user.id:
-            click.echo(click.style("ERROR: ", fg='red', bold=True) + click.style("This shift is not assigned to you", fg='white'))
-            return
-        
-        # Find the time log
-        time_log = TimeLog.query.filter_by(shift_id=shift_id, user_id=user.id).first()
-        if not time_log or not time_log.is_open():
-            click.echo(click.style("ERROR: ", fg='red', bold=True) + click.style("Not currently clocked in to this shift", fg='white'))
-            return
-            
-        time_log.clock_out_now()
-        
-        # Update shift status
-        shift.status = 'completed'
-        db.session.commit()
+        time_log = clock_out(shift_id, user.id)
         
         # Calculate worked time
         worked_minutes = time_log.worked_minutes()
@@ -422,15 +532,70 @@ def time_out_command(shift_id):
         click.echo(click.style(f"Time Worked: ", fg='yellow', bold=True) + click.style(f"{worked_hours:.2f} hours", fg='magenta', bold=True))
         click.echo(click.style("=" * 40, fg='red', bold=True))
         
+    except ValueError as e:
+        click.echo(click.style("ERROR: ", fg='red', bold=True) + click.style(f"{e}", fg='white'))
     except Exception as e:
         click.echo(click.style("ERROR: ", fg='red', bold=True) + click.style(f"Error clocking out: {e}", fg='white'))
 
-app.cli.add_command(time_cli)
+@time_cli.command("timesheet", help="Scheduled vs worked time per staff member (Admin only)")
+@click.argument("start_date")
+@click.argument("end_date")
+@click.option("--user", "username", help="Only this staff member")
+@click.option("--period", type=click.Choice(TIMESHEET_PERIODS), default='week', help="Group totals by day, week or month")
+@click.option("--format", "output_format", type=click.Choice(['text', 'csv', 'json']), default='text', help="Output format")
+@require_role(['admin'])
+def timesheet_command(start_date, end_date, username, period, output_format):
+    try:
+        start_date_obj = datetime.strptime(start_date, '%Y-%m-%d').date()
+        end_date_obj = datetime.strptime(end_date, '%Y-%m-%d').date()
+        
+        user_id = None
+        if username:
+            user = User.query.filter_by(username=username).first()
+            if not user:
+                click.echo(click.style("ERROR: ", fg='red', bold=True) + click.style(f"User '{username}' not found", fg='white'))
+                return
+            user_id = user.id
+            
+        timesheet = get_timesheet(start_date_obj, end_date_obj, user_id, period)
+        
+        if output_format == 'csv':
+            writer = csv.DictWriter(click.get_text_stream('stdout'), fieldnames=TIMESHEET_COLUMNS)
+            writer.writeheader()
+            writer.writerows(timesheet)
+            return
+        if output_format == 'json':
+            click.echo(json.dumps(timesheet))
+            return
+        
+        click.echo(click.style("=" * 60, fg='blue', bold=True))
+        click.echo(click.style("TIMESHEET", fg='blue', bold=True))
+        click.echo(click.style("=" * 60, fg='blue', bold=True))
+        click.echo(click.style(f"Period: ", fg='yellow', bold=True) + click.style(f"{start_date_obj} to {end_date_obj}", fg='white'))
+        click.echo(click.style("=" * 60, fg='blue', bold=True))
+        
+        if not timesheet:
+            click.echo(click.style("No shifts in this period", fg='yellow'))
+            return
+            
+        for row in timesheet:
+            click.echo(click.style(f"Employee: ", fg='yellow', bold=True) + click.style(f"{row['username']}", fg='cyan', bold=True) + click.style(f" ({period} of {row['period']})", fg='white'))
+            click.echo(click.style(f"Shifts Worked: ", fg='yellow', bold=True) + click.style(f"{row['worked_shifts']}/{row['shifts']}", fg='white'))
+            click.echo(click.style(f"Scheduled / Worked: ", fg='yellow', bold=True) + click.style(f"{row['scheduled_minutes'] / 60:.2f} / {row['worked_minutes'] / 60:.2f} hours", fg='magenta', bold=True))
+            click.echo(click.style(f"Late: ", fg='yellow', bold=True) + click.style(f"{row['late_minutes']} min ({row['late_shifts']} shifts)", fg='red' if row['late_minutes'] else 'white'))
+            click.echo(click.style(f"Early Leave: ", fg='yellow', bold=True) + click.style(f"{row['early_leave_minutes']} min", fg='red' if row['early_leave_minutes'] else 'white'))
+            click.echo(click.style(f"Overtime: ", fg='yellow', bold=True) + click.style(f"{row['overtime_minutes']} min", fg='white'))
+            click.echo(click.style(f"Variance: ", fg='yellow', bold=True) + click.style(f"{row['variance_minutes']:+d} min", fg='green' if row['variance_minutes'] >= 0 else 'red'))
+            click.echo(click.style("-" * 60, fg='white', dim=True))
+        
+    except Exception as e:
+        click.echo(click.style("ERROR: ", fg='red', bold=True) + click.style(f"Error generating timesheet: {e}", fg='white'))
+
 
 '''
 Statistics Commands
 '''
-stats_cli = AppGroup('stats', help='Staff statistics and analytics')
+stats_cli = ProfiledGroup('stats', help='Staff statistics and analytics')
 
 @stats_cli.command("staff", help="Show statistics for a specific staff member")
 @click.argument("username")
@@ -443,17 +608,17 @@ def staff_stats_command(username):
             click.echo(click.style("ERROR: ", fg='red', bold=True) + click.style(f"User '{username}' not found", fg='white'))
             return
             
-        # Get all shifts for this user
-        shifts = Shift.query.filter_by(user_id=user.id).all()
+        # Totals come from the per-week rollup rather than every shift
+        stats = get_user_stats(user.id)
         
-        if not shifts:
+        if not stats['total_shifts']:
             click.echo(click.style("No shifts found for this staff member", fg='yellow'))
             return
             
         # Calculate statistics
-        total_shifts = len(shifts)
-        completed_shifts = len([s for s in shifts if s.status == 'completed'])
-        total_hours = sum([(s.end_time - s.start_time).total_seconds() / 3600 for s in shifts])
+        total_shifts = stats['total_shifts']
+        completed_shifts = stats['completed_shifts']
+        total_hours = stats['total_hours']
         avg_shift_hours = total_hours / total_shifts if total_shifts > 0 else 0
         
         # Display statistics
@@ -472,12 +637,21 @@ def staff_stats_command(username):
     except Exception as e:
         click.echo(click.style("ERROR: ", fg='red', bold=True) + click.style(f"Error generating stats: {e}", fg='white'))
 
-app.cli.add_command(stats_cli)
+@stats_cli.command("rebuild", help="Recompute the weekly statistics rollup from all shifts (Admin only)")
+@require_role(['admin'])
+def rebuild_stats_command():
+    try:
+        rows = rebuild_user_shift_stats()
+        click.echo(click.style("SUCCESS: ", fg='green', bold=True) + click.style(f"Statistics rebuilt ({rows} user-weeks)", fg='white'))
+        
+    except Exception as e:
+        click.echo(click.style("ERROR: ", fg='red', bold=True) + click.style(f"Error rebuilding stats: {e}", fg='white'))
+
 
 '''
 Leave Request Commands
 '''
-leave_cli = AppGroup('leave', help='Leave request management commands')
+leave_cli = ProfiledGroup('leave', help='Leave request management commands')
 
 @leave_cli.command("request", help="Request leave (Staff)")
 @click.argument("start_date")
@@ -525,10 +699,7 @@ def request_leave_command(start_date, end_date, leave_type, reason):
 @require_role(['admin', 'supervisor'])
 def list_leave_requests_command(status):
     try:
-        if status == "all":
-            requests = LeaveRequest.query.all()
-        else:
-            requests = LeaveRequest.query.filter_by(status=status).all()
+        requests = get_leave_requests(None if status == "all" else status)
             
         if not requests:
             click.echo(click.style("No leave requests found", fg='yellow'))
@@ -539,7 +710,7 @@ def list_leave_requests_command(status):
         click.echo(click.style("=" * 70, fg='green', bold=True))
         
         for req in requests:
-            requester = User.query.get(req.requester_id)
+            requester = req.requester
             status_color = 'green' if req.status == 'approved' else 'red' if req.status == 'rejected' else 'yellow'
             
             click.echo(click.style(f"ID: ", fg='yellow', bold=True) + click.style(f"{req.id}", fg='white'))
@@ -570,8 +741,16 @@ def approve_leave_command(request_id):
             click.echo(click.style("ERROR: ", fg='red', bold=True) + click.style("Leave request already processed", fg='white'))
             return
             
-        leave_request.approve(user.id)
-        db.session.commit()
+        approved, impacts = approve_leave(leave_request, user.id)
+        
+        for shift, action in impacts:
+            action_color = 'red' if action == 'block' else 'yellow' if action == 'swap' else 'cyan'
+            click.echo(click.style(f"Shift {shift.id} ", fg='yellow', bold=True) +
+                      click.style(f"{shift.start_time.strftime('%Y-%m-%d %H:%M')} - {shift.end_time.strftime('%H:%M')} ({shift.status}): ", fg='white') +
+                      click.style(f"{action.upper()}", fg=action_color, bold=True))
+        if not approved:
+            click.echo(click.style("ERROR: ", fg='red', bold=True) + click.style("Leave overlaps shifts already worked or in progress", fg='white'))
+            return
         
         click.echo(click.style("SUCCESS: ", fg='green', bold=True) + click.style(f"Leave request {request_id} approved", fg='white'))
         
@@ -595,20 +774,58 @@ def reject_leave_command(request_id, reason):
             click.echo(click.style("ERROR: ", fg='red', bold=True) + click.style("Leave request already processed", fg='white'))
             return
             
-        leave_request.reject(user.id, reason)
-        db.session.commit()
+        reject_leave(leave_request, user.id, reason)
         
         click.echo(click.style("SUCCESS: ", fg='red', bold=True) + click.style(f"Leave request {request_id} rejected", fg='white'))
         
     except Exception as e:
         click.echo(click.style("ERROR: ", fg='red', bold=True) + click.style(f"Error rejecting request: {e}", fg='white'))
 
-app.cli.add_command(leave_cli)
+@leave_cli.command("impact", help="Shifts that fall on approved leave (Supervisor/Admin)")
+@click.option("--from", "start_date", required=True, help="First day (YYYY-MM-DD)")
+@click.option("--to", "end_date", required=True, help="Last day (YYYY-MM-DD)")
+@click.option("--format", "output_format", type=click.Choice(['text', 'csv', 'json']), default='text', help="Output format")
+@require_role(['admin', 'supervisor'])
+def leave_impact_command(start_date, end_date, output_format):
+    try:
+        start_date_obj = datetime.strptime(start_date, '%Y-%m-%d').date()
+        end_date_obj = datetime.strptime(end_date, '%Y-%m-%d').date()
+        rows = iter_leave_impact(start_date_obj, end_date_obj)
+        
+        if output_format == 'csv':
+            writer = csv.DictWriter(click.get_text_stream('stdout'), fieldnames=LEAVE_IMPACT_COLUMNS)
+            writer.writeheader()
+            writer.writerows(rows)
+            return
+        if output_format == 'json':
+            click.echo(json.dumps(list(rows)))
+            return
+        
+        click.echo(click.style("=" * 70, fg='green', bold=True))
+        click.echo(click.style("LEAVE IMPACT", fg='green', bold=True))
+        click.echo(click.style("=" * 70, fg='green', bold=True))
+        click.echo(click.style(f"Period: ", fg='yellow', bold=True) + click.style(f"{start_date_obj} to {end_date_obj}", fg='white'))
+        click.echo(click.style("=" * 70, fg='green', bold=True))
+        
+        count = 0
+        for row in rows:
+            count += 1
+            action_color = 'red' if row['action'] == 'block' else 'yellow' if row['action'] == 'swap' else 'cyan'
+            click.echo(click.style(f"Employee: ", fg='yellow', bold=True) + click.style(f"{row['username']}", fg='cyan', bold=True) + click.style(f" (leave {row['leave_id']})", fg='white'))
+            click.echo(click.style(f"Shift {row['shift_id']}: ", fg='yellow', bold=True) + click.style(f"{row['start_time']} - {row['end_time']} ({row['status']})", fg='white'))
+            click.echo(click.style(f"Action: ", fg='yellow', bold=True) + click.style(f"{row['action'].upper()}", fg=action_color, bold=True))
+            click.echo(click.style("-" * 70, fg='white', dim=True))
+        if not count:
+            click.echo(click.style("No shifts fall on approved leave", fg='yellow'))
+        
+    except Exception as e:
+        click.echo(click.style("ERROR: ", fg='red', bold=True) + click.style(f"Error building leave impact report: {e}", fg='white'))
+
 
 '''
 Swap Request Commands
 '''
-swap_cli = AppGroup('swap', help='Shift swap request management commands')
+swap_cli = ProfiledGroup('swap', help='Shift swap request management commands')
 
 @swap_cli.command("request", help="Request to swap a shift with another user (Staff)")
 @click.argument("shift_id", type=int)
@@ -652,15 +869,49 @@ def request_swap_command(shift_id, target_username, note):
     except Exception as e:
         click.echo(click.style("ERROR: ", fg='red', bold=True) + click.style(f"Error submitting swap request: {e}", fg='white'))
 
+@swap_cli.command("suggest", help="Suggest colleagues who are free to take a shift")
+@click.argument("shift_id", type=int)
+@click.option("--limit", type=int, default=SWAP_SUGGESTION_LIMIT, show_default=True, help="Most suggestions to show")
+@require_login
+def suggest_swap_command(shift_id, limit):
+    try:
+        user = get_current_user()
+        shift = Shift.query.get(shift_id)
+        if not shift:
+            click.echo(click.style("ERROR: ", fg='red', bold=True) + click.style("Shift not found", fg='white'))
+            return
+            
+        if shift.user_id != user.id and user.role not in ('admin', 'supervisor'):
+            click.echo(click.style("ERROR: ", fg='red', bold=True) + click.style("You can only swap your own shifts", fg='white'))
+            return
+        
+        candidates = suggest_swap_candidates(shift, limit)
+        
+        click.echo(click.style("=" * 60, fg='magenta', bold=True))
+        click.echo(click.style("SWAP SUGGESTIONS", fg='magenta', bold=True))
+        click.echo(click.style("=" * 60, fg='magenta', bold=True))
+        click.echo(click.style(f"Shift: ", fg='yellow', bold=True) + click.style(f"{shift.start_time.strftime('%Y-%m-%d %H:%M')} - {shift.end_time.strftime('%H:%M')}", fg='white'))
+        click.echo(click.style("-" * 60, fg='white', dim=True))
+        
+        if not candidates:
+            click.echo(click.style("Nobody with the same role is free for this shift", fg='yellow'))
+            return
+            
+        for rank, candidate in enumerate(candidates, start=1):
+            click.echo(click.style(f"{rank}. ", fg='yellow', bold=True) + click.style(f"{candidate['username']}", fg='cyan', bold=True) +
+                      click.style(f" ({candidate['week_hours']:.1f} hours that week)", fg='white'))
+        click.echo(click.style("=" * 60, fg='magenta', bold=True))
+        click.echo(click.style("Request one with: ", fg='white', dim=True) + click.style(f"flask swap request {shift_id} <username>", fg='white'))
+        
+    except Exception as e:
+        click.echo(click.style("ERROR: ", fg='red', bold=True) + click.style(f"Error suggesting swaps: {e}", fg='white'))
+
 @swap_cli.command("list", help="List swap requests (Supervisor/Admin)")
 @click.option("--status", default="all", help="Filter by status: pending, approved, rejected, all")
 @require_role(['admin', 'supervisor'])
 def list_swap_requests_command(status):
     try:
-        if status == "all":
-            requests = SwapRequest.query.all()
-        else:
-            requests = SwapRequest.query.filter_by(status=status).all()
+        requests = get_swap_requests(None if status == "all" else status)
             
         if not requests:
             click.echo(click.style("No swap requests found", fg='yellow'))
@@ -671,13 +922,15 @@ def list_swap_requests_command(status):
         click.echo(click.style("=" * 70, fg='magenta', bold=True))
         
         for req in requests:
-            from_user = User.query.get(req.from_user_id)
-            to_user = User.query.get(req.to_user_id)
-            shift = Shift.query.get(req.shift_id)
+            from_user = req.from_user
+            to_user = req.to_user
+            shift = req.shift
             status_color = 'green' if req.status == 'approved' else 'red' if req.status == 'rejected' else 'yellow'
             
             click.echo(click.style(f"ID: ", fg='yellow', bold=True) + click.style(f"{req.id}", fg='white'))
-            click.echo(click.style(f"Shift: ", fg='yellow', bold=True) + click.style(f"{shift.start_time.strftime('%Y-%m-%d %H:%M')}", fg='white'))
+            # Requests outlive shifts taken off the roster for leave
+            shift_time = shift.start_time.strftime('%Y-%m-%d %H:%M') if shift else "(unassigned)"
+            click.echo(click.style(f"Shift: ", fg='yellow', bold=True) + click.style(shift_time, fg='white'))
             click.echo(click.style(f"From: ", fg='yellow', bold=True) + click.style(f"{from_user.username}", fg='cyan'))
             click.echo(click.style(f"To: ", fg='yellow', bold=True) + click.style(f"{to_user.username}", fg='cyan'))
             click.echo(click.style(f"Status: ", fg='yellow', bold=True) + click.style(f"{req.status.upper()}", fg=status_color, bold=True))
@@ -693,34 +946,13 @@ def list_swap_requests_command(status):
 @require_role(['admin', 'supervisor'])
 def approve_swap_command(request_id):
     try:
-        swap_request = SwapRequest.query.get(request_id)
-        
-        if not swap_request:
-            click.echo(click.style("ERROR: ", fg='red', bold=True) + click.style("Swap request not found", fg='white'))
-            return
-            
-        if swap_request.status != 'pending':
-            click.echo(click.style("ERROR: ", fg='red', bold=True) + click.style("Swap request already processed", fg='white'))
-            return
-            
-        # Check for conflicts before approving
-        shift = Shift.query.get(swap_request.shift_id)
-        conflicting_shift = Shift.query.filter(
-            Shift.user_id == swap_request.to_user_id,
-            Shift.start_time <= shift.end_time,
-            Shift.end_time >= shift.start_time,
-            Shift.id != shift.id
-        ).first()
-        
-        if conflicting_shift:
-            click.echo(click.style("ERROR: ", fg='red', bold=True) + click.style("Target user has conflicting shift", fg='white'))
-            return
-            
-        swap_request.approve()
-        db.session.commit()
+        # Claims the request, locks the shift and checks conflicts in one transaction
+        approve_swap(request_id)
         
         click.echo(click.style("SUCCESS: ", fg='green', bold=True) + click.style(f"Swap request {request_id} approved", fg='white'))
         
+    except ValueError as e:
+        click.echo(click.style("ERROR: ", fg='red', bold=True) + click.style(f"{e}", fg='white'))
     except Exception as e:
         click.echo(click.style("ERROR: ", fg='red', bold=True) + click.style(f"Error approving swap: {e}", fg='white'))
 
@@ -730,35 +962,257 @@ def approve_swap_command(request_id):
 @require_role(['admin', 'supervisor'])
 def reject_swap_command(request_id, reason):
     try:
-        swap_request = SwapRequest.query.get(request_id)
-        
-        if not swap_request:
-            click.echo(click.style("ERROR: ", fg='red', bold=True) + click.style("Swap request not found", fg='white'))
-            return
-            
-        if swap_request.status != 'pending':
-            click.echo(click.style("ERROR: ", fg='red', bold=True) + click.style("Swap request already processed", fg='white'))
-            return
-            
-        swap_request.reject(reason)
-        db.session.commit()
+        reject_swap(request_id, reason)
         
         click.echo(click.style("SUCCESS: ", fg='red', bold=True) + click.style(f"Swap request {request_id} rejected", fg='white'))
         
+    except ValueError as e:
+        click.echo(click.style("ERROR: ", fg='red', bold=True) + click.style(f"{e}", fg='white'))
     except Exception as e:
         click.echo(click.style("ERROR: ", fg='red', bold=True) + click.style(f"Error rejecting swap: {e}", fg='white'))
 
-app.cli.add_command(swap_cli)
+
+'''
+Site Commands
+'''
+site_cli = ProfiledGroup('site', help='Site (location) management commands')
+
+@site_cli.command("create", help="Create a site, optionally with its first admin (Admin only)")
+@click.argument("name")
+@click.option("--admin", "admin_username", help="Username of the site's first admin")
+@click.option("--password", "admin_password", help="Password of the site's first admin")
+@require_role(['admin'])
+def create_site_command(name, admin_username, admin_password):
+    try:
+        if admin_username and not admin_password:
+            click.echo(click.style("ERROR: ", fg='red', bold=True) + click.style("--admin needs a --password", fg='white'))
+            return
+        if get_site_by_name(name):
+            click.echo(click.style("ERROR: ", fg='red', bold=True) + click.style(f"Site {name} already exists", fg='white'))
+            return
+        site = create_site(name)
+        click.echo(click.style("SUCCESS: ", fg='green', bold=True) + click.style(f"Site {site.name} created with id {site.id}", fg='white'))
+        if has_own_database(site.id):
+            create_site_database(site)
+            click.echo(click.style("SUCCESS: ", fg='green', bold=True) + click.style(f"Schema created in the site's own database", fg='white'))
+        if admin_username:
+            with site_scope(site.id):
+                create_user(admin_username, admin_password, 'admin')
+            click.echo(click.style("SUCCESS: ", fg='green', bold=True) + click.style(f"Admin {admin_username} created at site {site.name}", fg='white'))
+
+    except Exception as e:
+        click.echo(click.style("ERROR: ", fg='red', bold=True) + click.style(f"Error creating site: {e}", fg='white'))
+
+@site_cli.command("init-db", help="Create the schema in a site's own database from SITE_DATABASE_URIS (Admin only)")
+@click.argument("name")
+@require_role(['admin'])
+def init_site_database_command(name):
+    try:
+        site = get_site_by_name(name)
+        if not site:
+            click.echo(click.style("ERROR: ", fg='red', bold=True) + click.style(f"Site {name} not found", fg='white'))
+            return
+        create_site_database(site)
+        click.echo(click.style("SUCCESS: ", fg='green', bold=True) + click.style(f"Schema created in the database of site {site.name}", fg='white'))
+
+    except Exception as e:
+        click.echo(click.style("ERROR: ", fg='red', bold=True) + click.style(f"Error creating site database: {e}", fg='white'))
+
+@site_cli.command("list", help="List sites")
+@require_login
+def list_sites_command():
+    try:
+        click.echo(click.style(f"{'ID':<6} {'Name':<24} {'Database':<10}", fg='cyan', bold=True))
+        click.echo("-" * 42)
+        for site in get_all_sites():
+            database = 'own' if has_own_database(site.id) else 'primary'
+            click.echo(f"{site.id:<6} {site.name:<24} {database:<10}")
+
+    except Exception as e:
+        click.echo(click.style("ERROR: ", fg='red', bold=True) + click.style(f"Error listing sites: {e}", fg='white'))
+
+
+'''
+Job Commands
+'''
+jobs_cli = ProfiledGroup('jobs', help='Background job queue commands')
+
+@jobs_cli.command("worker", help="Run queued jobs (imports, autogenerate, reports, init) until interrupted")
+@click.option("--processes", default=JOBS_PROCESSES, type=click.IntRange(min=1), show_default=True, help="Jobs to run at once, one process each")
+@click.option("--poll", "poll_interval", default=JOBS_POLL_INTERVAL, type=float, show_default=True, help="Seconds between checks for new jobs when idle")
+@click.option("--once", is_flag=True, help="Exit once the queue is empty")
+def jobs_worker_command(processes, poll_interval, once):
+    click.echo(click.style("Job worker started ", fg='cyan', bold=True) + click.style(f"({processes} processes)", fg='white'))
+    try:
+        for job_id, kind, status in iter_job_worker(processes, poll_interval, once):
+            color = 'green' if status == 'succeeded' else 'red'
+            click.echo(click.style(f"{status.upper()}: ", fg=color, bold=True) + click.style(f"Job {job_id} ({kind})", fg='white'))
+    except KeyboardInterrupt:
+        click.echo(click.style("Job worker stopped", fg='yellow'))
+
+@jobs_cli.command("show", help="Show a job's status, progress and result")
+@click.argument("job_id", type=int)
+def jobs_show_command(job_id):
+    user = get_current_user()
+    if not user:
+        click.echo("ERROR: You must login first. Use: flask auth login")
+        return
+    job = get_job(job_id)
+    # As for GET /api/jobs/<id>: another site's jobs are not there, and only the owner or an admin may look
+    if not job or job.site_id not in (None, user.site_id):
+        click.echo(click.style("ERROR: ", fg='red', bold=True) + click.style(f"Job {job_id} not found", fg='white'))
+        return
+    if job.user_id != user.id and user.role != 'admin':
+        click.echo(click.style("ERROR: ", fg='red', bold=True) + click.style("You can only view your own jobs", fg='white'))
+        return
+    details = job.get_json()
+    click.echo(click.style(f"Job {job.id} ({job.kind}): ", fg='cyan', bold=True) + click.style(f"{job.status}, {job.progress}%", fg='white'))
+    if details['error']:
+        click.echo(click.style("Error: ", fg='red', bold=True) + click.style(details['error'], fg='white'))
+    if details['result'] is not None:
+        click.echo(json.dumps(details['result'], indent=2))
+
+
+'''
+Session Commands
+'''
+
+def run_session_line(line):
+    """Run one command line, e.g. `shift schedule 2 2030-01-07 09:00 17:00`; False ends the session"""
+    try:
+        args = shlex.split(line, comments=True)
+    except ValueError as e:
+        click.echo(click.style("ERROR: ", fg='red', bold=True) + click.style(f"{e}", fg='white'))
+        return True
+    if args[:1] == ['flask']:
+        args = args[1:]
+    if not args:
+        return True
+    if args[0] in ('exit', 'quit'):
+        return False
+    session_cli = click.Group('flask', commands=[command for command in commands if command is not shell_session_command])
+    try:
+        session_cli.main(args, prog_name='flask', standalone_mode=False)
+    except click.ClickException as e:
+        click.echo(click.style("ERROR: ", fg='red', bold=True) + click.style(e.format_message(), fg='white'))
+    except (click.exceptions.Exit, click.Abort, SystemExit):
+        pass
+    finally:
+        # Hand the connection back to the pool and start the next command
+        # with an empty identity map, as a fresh `flask` process would
+        db.session.remove()
+    return True
+
+def run_session(lines):
+    """Run command lines in this process until they run out or one says exit; returns how many ran"""
+    count = 0
+    for line in lines:
+        if not run_session_line(line):
+            break
+        count += 1
+    return count
+
+def iter_prompt():
+    while True:
+        try:
+            yield input(click.style('roster> ', fg='cyan', bold=True))
+        except EOFError:
+            click.echo()
+            return
+
+class SessionRequestHandler(socketserver.StreamRequestHandler):
+    """Runs each line a client sends and streams the output back until the client closes"""
+
+    def handle(self):
+        output = io.TextIOWrapper(self.wfile, encoding='utf-8', write_through=True)
+        try:
+            with self.server.app.app_context(), redirect_stdout(output), redirect_stderr(output):
+                run_session(io.TextIOWrapper(self.rfile, encoding='utf-8'))
+        finally:
+            output.detach()
+
+class SessionServer(socketserver.UnixStreamServer):
+    """Serves one client at a time, so commands never share a database session"""
+
+    def __init__(self, socket_path, app):
+        self.app = app
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        # Commands run as the logged-in user, so only this account may connect
+        umask = os.umask(0o077)
+        try:
+            super().__init__(socket_path, SessionRequestHandler)
+        finally:
+            os.umask(umask)
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+
+def send_session(lines, socket_path, out):
+    """Send command lines to a running daemon and copy its output to out"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(socket_path)
+
+        def send():
+            # Sent from a second thread so a long batch's output can be
+            # read while the rest of the commands are still going out
+            for line in lines:
+                client.sendall((line.rstrip('\n') + '\n').encode('utf-8'))
+            client.shutdown(socket.SHUT_WR)
+
+        sender = threading.Thread(target=send, daemon=True)
+        sender.start()
+        while True:
+            chunk = client.recv(65536)
+            if not chunk:
+                break
+            out.write(chunk.decode('utf-8', errors='replace'))
+        sender.join()
+
+@click.command("shell-session", help="Run many commands in one process: at a prompt, from FILE or stdin, or through a local socket daemon")
+@click.argument("file", type=click.File('r'), default='-')
+@click.option("--serve", is_flag=True, help="Keep this app warm and run the commands clients send to the socket")
+@click.option("--connect", is_flag=True, help="Send the commands to a running --serve daemon instead")
+@click.option("--socket", "socket_path", default=SESSION_SOCKET, show_default=True, help="Socket the daemon listens on")
+@with_appcontext
+def shell_session_command(file, serve, connect, socket_path):
+    try:
+        if serve:
+            with SessionServer(socket_path, current_app._get_current_object()) as server:
+                click.echo(click.style("Listening on ", fg='green', bold=True) + click.style(socket_path, fg='yellow') + click.style(" (Ctrl+C to stop)", fg='white', dim=True))
+                try:
+                    server.serve_forever()
+                except KeyboardInterrupt:
+                    click.echo()
+            return
+        if connect:
+            send_session(file, socket_path, sys.stdout)
+            return
+        interactive = file is sys.stdin and sys.stdin.isatty()
+        if interactive:
+            click.echo(click.style("Rostering shell", fg='cyan', bold=True) + click.style(" - type commands without `flask`, `exit` to leave", fg='white', dim=True))
+        start = perf_counter()
+        count = run_session(iter_prompt() if interactive else file)
+        if not interactive:
+            click.echo(click.style(f"Ran {count} commands in {perf_counter() - start:.2f}s", fg='cyan', bold=True))
+
+    except OSError as e:
+        click.echo(click.style("ERROR: ", fg='red', bold=True) + click.style(f"Socket {socket_path}: {e}", fg='white'))
+    except Exception as e:
+        click.echo(click.style("ERROR: ", fg='red', bold=True) + click.style(f"Error running session: {e}", fg='white'))
 
 '''
 Test Commands
 '''
 
-test = AppGroup('test', help='Testing commands') 
+test = ProfiledGroup('test', help='Testing commands') 
 
 @test.command("user", help="Run User tests")
 @click.argument("type", default="all")
 def user_tests_command(type):
+    import pytest
     if type == "unit":
         sys.exit(pytest.main(["-k", "UserUnitTests"]))
     elif type == "int":
@@ -767,4 +1221,5 @@ def user_tests_command(type):
         sys.exit(pytest.main(["-k", "App"]))
     
 
-app.cli.add_command(test)
\ No newline at end of file
+# commands must be added to this list
+commands = [init, explain_command, loadtest_command, auth_cli, user_cli, shift_cli, time_cli, stats_cli, leave_cli, swap_cli, site_cli, jobs_cli, shell_session_command, test]